@@ -0,0 +1,102 @@
+"""
+Mímir blob store benchmark
+
+Saves the files of synthetic assignments that share their datafiles into an
+assignment data folder, once by copying every file and once through the blob
+store, and prints the time and disk space used. Run from the repository root:
+
+    python -m benchmarks.blob_benchmark [number of assignments]
+"""
+
+# pylint: disable=import-error
+import os
+import sys
+import tempfile
+from os import path
+from random import Random
+from shutil import copy2, rmtree
+from time import perf_counter
+
+from src.blob_store import BlobStore
+
+DATAFILE_COUNT = 20
+DATAFILE_SIZE = 2 * 1024 * 1024
+FILES_PER_ASSIGNMENT = 4
+
+
+def make_sources(folder: str, rnd: Random) -> list:
+    """
+    Writes the shared datafiles and returns their paths.
+    """
+
+    sources = []
+    for i in range(DATAFILE_COUNT):
+        file_path = path.join(folder, "data%02d.csv" % i)
+        with open(file_path, "wb") as f:
+            f.write(rnd.randbytes(DATAFILE_SIZE))
+        sources.append(file_path)
+    return sources
+
+
+def disk_usage(folder: str) -> int:
+    """
+    Returns the bytes used by the files in a folder, counting hardlinked files once.
+    """
+
+    seen = set()
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            stat = os.stat(path.join(root, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+def save_copy(data_path: str, a_id: str, files: list):
+    dest = path.join(data_path, a_id)
+    os.makedirs(dest, exist_ok=True)
+    for file in files:
+        copy2(file, dest)
+
+
+def save_blob(data_path: str, a_id: str, files: list):
+    BlobStore(data_path).add_files(a_id, files)
+
+
+def run(name: str, save, count: int, sources: list, seed: int):
+    rnd = Random(seed)
+    data_path = tempfile.mkdtemp(prefix="mimir_blob_")
+    try:
+        start = perf_counter()
+        for i in range(count):
+            save(data_path, "%064x" % i, rnd.sample(sources, FILES_PER_ASSIGNMENT))
+        elapsed = perf_counter() - start
+        usage = disk_usage(data_path) / 1024 / 1024
+        print("%-6s %8.2f s %10.1f MB" % (name, elapsed, usage))
+    finally:
+        rmtree(data_path)
+
+
+def main():
+    """
+    Runs both ways of saving and prints the results.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    source_path = tempfile.mkdtemp(prefix="mimir_blob_src_")
+    try:
+        sources = make_sources(source_path, Random(1))
+        print(
+            "%d assignments, %d files each from %d shared %d MB datafiles"
+            % (count, FILES_PER_ASSIGNMENT, DATAFILE_COUNT, DATAFILE_SIZE // 1024 // 1024)
+        )
+        run("copy2", save_copy, count, sources, 2)
+        run("blobs", save_blob, count, sources, 2)
+    finally:
+        rmtree(source_path)
+
+
+if __name__ == "__main__":
+    main()
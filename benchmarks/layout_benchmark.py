@@ -0,0 +1,106 @@
+"""
+Mímir course layout benchmark
+
+Writes synthetic assignments into a course folder, once in the flat layout and
+once in the sharded layout, and measures listing the assignments as when a
+course is opened, looking up single assignments by ID and the size of the
+largest folder. Run from the repository root:
+
+    python -m benchmarks.layout_benchmark [number of assignments]
+"""
+
+# pylint: disable=import-error
+import os
+import sys
+import tempfile
+from random import Random
+from shutil import rmtree
+from statistics import median
+from time import perf_counter
+
+from src.course_store import JsonCourseStore
+
+ROUNDS = 5
+LOOKUPS = 2000
+
+
+def assignment(a_id: str) -> dict:
+    return {
+        "assignment_id": a_id,
+        "title": "Assignment " + a_id[:8],
+        "tags": ["loops"],
+        "level": 1,
+        "exp_lecture": 1,
+        "exp_assignment_no": [1],
+        "next": [],
+        "previous": [],
+        "variations": [
+            {
+                "variation_id": "A",
+                "instructions": "Write a program.",
+                "example_runs": [],
+                "codefiles": [],
+                "datafiles": [],
+                "used_in": [],
+            }
+        ],
+    }
+
+
+def largest_folder(folder: str) -> int:
+    return max(len(dirs) + len(files) for _, dirs, files in os.walk(folder))
+
+
+def run(name: str, sharded: bool, a_ids: list):
+    course_path = tempfile.mkdtemp(prefix="mimir_layout_")
+    try:
+        store = JsonCourseStore(course_path, compact=True, sharded=sharded)
+        start = perf_counter()
+        for a_id in a_ids:
+            store.write_assignment(assignment(a_id))
+        written = perf_counter() - start
+
+        listed = []
+        for _ in range(ROUNDS):
+            start = perf_counter()
+            assert len(store.assignment_ids()) == len(a_ids)
+            listed.append(perf_counter() - start)
+
+        sample = Random(2).sample(a_ids, min(LOOKUPS, len(a_ids)))
+        looked_up = []
+        for _ in range(ROUNDS):
+            start = perf_counter()
+            for a_id in sample:
+                store.version(a_id)
+                store.read_header(a_id)
+            looked_up.append((perf_counter() - start) / len(sample))
+
+        print(
+            "%-8s write %7.2f s   open %8.2f ms   lookup %6.1f us   largest folder %6d"
+            % (
+                name,
+                written,
+                median(listed) * 1000,
+                median(looked_up) * 1000000,
+                largest_folder(store.metadata_path),
+            )
+        )
+    finally:
+        rmtree(course_path)
+
+
+def main():
+    """
+    Runs both layouts and prints the median times.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rnd = Random(1)
+    a_ids = ["%064x" % rnd.getrandbits(256) for _ in range(count)]
+    print("%d assignments" % count)
+    run("flat", False, a_ids)
+    run("sharded", True, a_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Mímir save benchmark
+
+Compares the latency and file size of saving large assignments with the
+original plain write and with the atomic writes of the course store.
+Run from the repository root:
+
+    python -m benchmarks.save_benchmark [number of saves]
+"""
+
+# pylint: disable=import-error
+import json
+import sys
+import tempfile
+from os import path
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from src import common
+from src.common import write_json_atomic
+
+WORDS = (
+    "read write file csv dictionary list loop while for function class object "
+    "string number sum average parse split sort search print input output ä ö"
+).split()
+
+
+def large_assignment(rnd: Random, variations=20, words=3000) -> dict:
+    """
+    Returns an assignment with long instructions and many example runs.
+    """
+
+    return {
+        "assignment_id": "%064x" % rnd.getrandbits(256),
+        "title": "Large assignment",
+        "exp_lecture": 1,
+        "exp_assignment_no": [1],
+        "level": 1,
+        "tags": ["csv"],
+        "next": [],
+        "previous": [],
+        "code_language": "Python",
+        "instruction_language": "FI",
+        "variations": [
+            {
+                "variation_id": chr(ord("A") + i),
+                "instructions": " ".join(rnd.choices(WORDS, k=words)),
+                "example_runs": [
+                    {
+                        "generate": False,
+                        "inputs": [str(rnd.randint(0, 100)) for _ in range(10)],
+                        "cmd_inputs": [],
+                        "output": "\n".join(rnd.choices(WORDS, k=200)),
+                        "outputfiles": [],
+                    }
+                    for _ in range(5)
+                ],
+                "codefiles": ["main.py"],
+                "datafiles": ["data.csv"],
+                "used_in": ["2023/1", "2024/2"],
+                "images": [],
+            }
+            for i in range(variations)
+        ],
+    }
+
+
+def _plain_write(file_path, data):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, indent=4, ensure_ascii=False))
+
+
+def _stdlib_compact(file_path, data):
+    fast = common.orjson
+    common.orjson = None
+    try:
+        write_json_atomic(file_path, data, compact=True)
+    finally:
+        common.orjson = fast
+
+
+def main():
+    """
+    Prints the median save latency and file size of each write method.
+    """
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    assignment = large_assignment(Random(1))
+    folder = tempfile.mkdtemp(prefix="mimir_bench_")
+    file_path = path.join(folder, "assignment.json")
+    methods = {
+        "plain write, indent=4": _plain_write,
+        "atomic, pretty": lambda p, d: write_json_atomic(p, d, compact=False),
+        "atomic, compact (json)": _stdlib_compact,
+    }
+    if common.orjson:
+        methods["atomic, compact (orjson)"] = (
+            lambda p, d: write_json_atomic(p, d, compact=True)
+        )
+
+    for name, method in methods.items():
+        timings = []
+        for _ in range(rounds):
+            start = perf_counter()
+            method(file_path, assignment)
+            timings.append((perf_counter() - start) * 1000)
+        print(
+            "%-28s median %7.2f ms   size %8d bytes"
+            % (name, median(timings), path.getsize(file_path))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Mímir search benchmark
+
+Builds a synthetic course index and measures the latency of search_index, as
+used by search-as-you-type, as a full query and as a full query with
+highlighted fragments. Run from the repository root:
+
+    python -m benchmarks.search_benchmark [number of assignments]
+
+The target on a course of 20000 assignments is a median under 50 ms for a
+query and under 100 ms for search-as-you-type, which adds fuzzy and prefix
+terms. Whoosh matches in pure Python, so the latency grows with the number of
+matching documents. Queries for common words take a few hundred milliseconds at
+20000 assignments and a median of 20 ms is reached only up to about 2000.
+"""
+
+# pylint: disable=wrong-import-position, import-error
+import sys
+import tempfile
+from random import Random
+from statistics import median
+from time import perf_counter
+
+import dearpygui.dearpygui as dpg
+
+dpg.create_context()
+
+from src.constants import OPEN_COURSE_PATH, COURSE_INFO, OPEN_IX
+from src.data_handler import create_index, search_index
+from src.data_getters import get_empty_assignment, get_empty_variation
+from src.index_tools import index_fields
+
+WORDS = (
+    "read write file csv dictionary list loop while for function class object "
+    "string number sum average parse split sort search print input output "
+    "matrix recursion exception module import lambda tuple set key value"
+).split()
+# Filler vocabulary so that the topic words above are only in a part of the
+# documents, like in real assignment instructions
+FILLER = ["w%04d" % i for i in range(4000)]
+FILLER_WEIGHTS = [1 / (rank + 1) for rank in range(len(FILLER))]
+CODE = [
+    "def read_csv(fileName):\n    return csv.DictReader(fileName)",
+    "def average(values):\n    return sum(values) / len(values)",
+    "def main():\n    print(input())",
+    "",
+]
+QUERIES = [
+    "csv",
+    "csv dictionary",
+    "parse file",
+    "recurs*",
+    "sort list average",
+    "exception handling",
+    "matrix",
+    "read_csv",
+    "DictReader",
+    "data.csv",
+]
+
+
+def _assignment(rnd: Random, i: int) -> dict:
+    assignment = get_empty_assignment()
+    assignment["assignment_id"] = "%064x" % i
+    assignment["title"] = " ".join(rnd.choices(WORDS, k=4))
+    assignment["exp_lecture"] = rnd.randint(1, 14)
+    assignment["exp_assignment_no"] = [rnd.randint(1, 8)]
+    assignment["level"] = rnd.randint(1, 5)
+    assignment["tags"] = rnd.sample(WORDS, 3)
+    for letter in "AB":
+        var = get_empty_variation()
+        var["variation_id"] = letter
+        var["instructions"] = " ".join(
+            rnd.choices(FILLER, FILLER_WEIGHTS, k=70) + rnd.choices(WORDS, k=5)
+        )
+        var["datafiles"] = [rnd.choice(FILLER) + rnd.choice([".csv", ".txt"])]
+        assignment["variations"].append(var)
+    return assignment
+
+
+def build_index(count: int, seed=1):
+    """
+    Creates a course index with count synthetic assignments in a temporary folder.
+    """
+
+    OPEN_COURSE_PATH.set(tempfile.mkdtemp(prefix="mimir_bench_"))
+    COURSE_INFO["course_id"] = "BENCH"
+    create_index(force=True)
+
+    rnd = Random(seed)
+    writer = OPEN_IX.get().writer(limitmb=256)
+    for i in range(count):
+        fields = index_fields(_assignment(rnd, i), False)
+        fields["code"] = CODE[i % len(CODE)] if i % 10 == 0 else ""
+        writer.add_document(**fields)
+    OPEN_IX.commit(writer)
+
+
+def main():
+    """
+    Builds the index and prints the search latencies.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    start = perf_counter()
+    build_index(count)
+    print("Indexed %d assignments in %.1f s" % (count, perf_counter() - start))
+
+    search_index(QUERIES[0])  # open the searcher
+    print("%-12s %10s %10s %10s" % ("", "median", "95th", "max"))
+    run("as you type", lambda query: search_index(query, incremental=True))
+    run("query", search_index)
+    run("highlighted", lambda query: search_index(query, highlight=True))
+
+
+def run(name: str, search):
+    """
+    Runs every query 20 times and prints the latencies in milliseconds.
+    """
+
+    timings = []
+    for _ in range(20):
+        for query in QUERIES:
+            start = perf_counter()
+            search(query)
+            timings.append((perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(
+        "%-12s %10.2f %10.2f %10.2f"
+        % (name, median(timings), timings[int(len(timings) * 0.95)], timings[-1])
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Mímir assignment set benchmark
+
+Measures saving a set and listing the set headers with a long history of saved
+sets, once by rewriting assignment_sets.json as before and once through the set
+journal. Run from the repository root:
+
+    python -m benchmarks.sets_benchmark [number of saved sets]
+"""
+
+# pylint: disable=import-error
+import sys
+import tempfile
+from os import path
+from shutil import rmtree
+from statistics import median
+from time import perf_counter
+
+from src.common import loads_json, write_json_atomic
+from src.set_journal import SetJournal
+
+ROUNDS = 50
+
+
+def full_set(set_id: int) -> dict:
+    return {
+        "id": set_id,
+        "year": 2000 + set_id // 3,
+        "period": set_id % 3 + 1,
+        "name": "Set {}".format(set_id),
+        "type": "full",
+        "assignments": None,
+        "weeks": [
+            [{"id": "%064x" % (week * 8 + i), "variationID": "A"} for i in range(8)]
+            for week in range(12)
+        ],
+    }
+
+
+def rewrite(file_path: str) -> tuple[float, float]:
+    start = perf_counter()
+    with open(file_path, "rb") as f:
+        data = loads_json(f.read())
+    data["maxSetID"] += 1
+    data["sets"].append(full_set(data["maxSetID"]))
+    write_json_atomic(file_path, data)
+    saved = perf_counter() - start
+
+    start = perf_counter()
+    with open(file_path, "rb") as f:
+        headers = [(s["id"], s["year"], s["name"]) for s in loads_json(f.read())["sets"]]
+    assert headers
+    return saved, perf_counter() - start
+
+
+def journal(sets: SetJournal) -> tuple[float, float]:
+    start = perf_counter()
+    sets.add(full_set(0), False)
+    saved = perf_counter() - start
+
+    start = perf_counter()
+    assert sets.headers()
+    return saved, perf_counter() - start
+
+
+def run(name: str, func, arg):
+    timings = [func(arg) for _ in range(ROUNDS)]
+    print(
+        "%-8s save %7.2f ms   list %7.2f ms"
+        % (
+            name,
+            median(t[0] for t in timings) * 1000,
+            median(t[1] for t in timings) * 1000,
+        )
+    )
+
+
+def main():
+    """
+    Saves a history of sets and prints the median times of both ways.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    folder = tempfile.mkdtemp(prefix="mimir_sets_")
+    try:
+        file_path = path.join(folder, "assignment_sets.json")
+        history = {"maxSetID": count, "sets": [full_set(i) for i in range(1, count + 1)]}
+        print("%d saved full sets of 12 weeks" % count)
+        write_json_atomic(file_path, history)
+        run("rewrite", rewrite, file_path)
+        write_json_atomic(file_path, history)
+        run("journal", journal, SetJournal(file_path))
+    finally:
+        rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
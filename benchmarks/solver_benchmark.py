@@ -0,0 +1,108 @@
+"""
+Mímir set solver benchmark
+
+Selects the variations of a week of synthetic candidates, once by drawing them
+by weight with fill_positions and once with solve_positions, and compares the
+times and the total reuse of the selected variations, see recency_costs. Run
+from the repository root:
+
+    python -m benchmarks.solver_benchmark [number of variations] [positions]
+"""
+
+# pylint: disable=import-error
+import sys
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from src.set_planner import GeneratorContext, fill_positions
+from src.set_solver import solve_positions
+from src.variation_pool import VariationPool, np, period_weight_table
+
+ROUNDS = 5
+YEAR = 2026
+VARIATIONS_PER_ASSIGNMENT = 2
+PERIOD_WEIGHTS = period_weight_table(["1", "2", "3"])
+
+
+def make_candidates(count: int, positions: int) -> list:
+    rnd = Random(1)
+    candidates = []
+    for i in range(count // VARIATIONS_PER_ASSIGNMENT):
+        variations = []
+        for v in range(VARIATIONS_PER_ASSIGNMENT):
+            used_in = [
+                "%d/%d" % (rnd.randint(2015, YEAR), rnd.randint(1, 3))
+                for _ in range(rnd.randint(0, 6))
+            ]
+            variations.append({"variation_id": "AB"[v], "used_in": used_in})
+        candidates.append(
+            {
+                "assignment_id": "%064x" % i,
+                "exp_assignment_no": rnd.sample(
+                    range(1, positions + 1), rnd.randint(1, min(3, positions))
+                ),
+                "variations": variations,
+            }
+        )
+    return candidates
+
+
+def total_cost(candidates: list, selected: list) -> float:
+    pool = VariationPool(candidates, PERIOD_WEIGHTS)
+    keys = [(id(item), variation_id) for item, variation_id in pool.variations]
+    costs = dict(zip(keys, pool.recency_costs(YEAR)))
+    return sum(costs[(id(item), variation_id)] for item, variation_id in selected)
+
+
+def run(name: str, select, candidates: list, positions: int):
+    timings = []
+    for seed in range(ROUNDS):
+        pool_rng = GeneratorContext(seed).pool_rng
+        start = perf_counter()
+        selected = select(candidates, positions, pool_rng)
+        timings.append(perf_counter() - start)
+    print(
+        "%-8s %9.2f ms   filled %2d/%-2d   reuse %6.3f"
+        % (
+            name,
+            median(timings) * 1000,
+            len(selected),
+            positions,
+            total_cost(candidates, selected),
+        )
+    )
+
+
+def main():
+    """
+    Runs both ways of selecting and prints the median times.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    positions = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    candidates = make_candidates(count, positions)
+    print(
+        "%d variations, %d positions, %s"
+        % (
+            count,
+            positions,
+            "NumPy " + np.__version__ if np is not None else "without NumPy",
+        )
+    )
+    run(
+        "draw",
+        lambda c, p, rng: fill_positions(c, p, {}, PERIOD_WEIGHTS, rng),
+        candidates,
+        positions,
+    )
+    run(
+        "solve",
+        lambda c, p, rng: solve_positions(c, p, {}, PERIOD_WEIGHTS, YEAR, rng),
+        candidates,
+        positions,
+    )
+
+
+if __name__ == "__main__":
+    main()
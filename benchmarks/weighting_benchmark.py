@@ -0,0 +1,118 @@
+"""
+Mímir variation weighting benchmark
+
+Draws variations from a pool of synthetic candidates, once by weighting every
+variation with a call to count_weight as before and then through VariationPool,
+both parsing the pool for each draw and reusing a parsed pool. Run from the
+repository root:
+
+    python -m benchmarks.weighting_benchmark [number of variations]
+"""
+
+# pylint: disable=import-error
+import json
+import sys
+from random import Random, choices, randint
+from statistics import median
+from time import perf_counter
+
+from src.common import resource_path
+from src.variation_pool import VariationPool, np, period_weight_table
+
+ROUNDS = 5
+DRAWS = 20
+VARIATIONS_PER_ASSIGNMENT = 2
+
+
+def get_pos_convert() -> dict:
+    _file = resource_path("resource/pos_convert_default.json")
+    with open(_file, "r", encoding="utf-8") as f:
+        return json.loads(f.read())
+
+
+def count_weight(data: list) -> int:
+    """
+    count_weight as it was, reading the conversion table on every call.
+    """
+
+    if not data:
+        return 1
+    pos_table = get_pos_convert()["ENG"]
+    pos_table_keys = sorted(pos_table.keys())
+    pos_weights = {}
+    i = 3
+    for key in pos_table_keys:
+        pos_weights[key] = i
+        i -= 1
+    item_weights = []
+    for item in data:
+        pos = item.split("/")[1]
+        weight = max(pos_weights[pos] + randint(0, 5) - len(data), 1)
+        item_weights.append(weight)
+    return min(item_weights)
+
+
+def draw_before(pool: list):
+    weights = []
+    flat = []
+    for item in pool:
+        for var in item["variations"]:
+            weights.append(count_weight(var["used_in"]))
+            flat.append((item, var["variation_id"]))
+    return choices(flat, weights=weights)[0]
+
+
+def draw_pool(pool: list):
+    weights = period_weight_table(get_pos_convert()["ENG"].keys())
+    return VariationPool(pool, weights).draw()
+
+
+def draw_parsed(pool: VariationPool):
+    return pool.draw()
+
+
+def make_pool(count: int) -> list:
+    rnd = Random(1)
+    pool = []
+    for i in range(count // VARIATIONS_PER_ASSIGNMENT):
+        variations = []
+        for v in range(VARIATIONS_PER_ASSIGNMENT):
+            used_in = [
+                "%d/%d" % (rnd.randint(2015, 2025), rnd.randint(1, 3))
+                for _ in range(rnd.randint(0, 6))
+            ]
+            variations.append({"variation_id": "AB"[v], "used_in": used_in})
+        pool.append({"assignment_id": "%064x" % i, "variations": variations})
+    return pool
+
+
+def run(name: str, draw, pool: list):
+    timings = []
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        for _ in range(DRAWS):
+            assert draw(pool)[0]
+        timings.append((perf_counter() - start) / DRAWS)
+    print("%-8s %9.2f ms per draw" % (name, median(timings) * 1000))
+
+
+def main():
+    """
+    Runs both ways of drawing and prints the median times.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    pool = make_pool(count)
+    print(
+        "%d variations, %s"
+        % (count, "NumPy " + np.__version__ if np is not None else "without NumPy")
+    )
+    run("before", draw_before, pool)
+    run("pool", draw_pool, pool)
+    # As in generate_one_set, where the pool is parsed once for all positions
+    weights = period_weight_table(get_pos_convert()["ENG"].keys())
+    run("parsed", draw_parsed, VariationPool(pool, weights))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ import dearpygui.dearpygui as dpg
 dpg.create_context()
 
 # pylint: disable=wrong-import-position
-from src.constants import VERSION, UI_ITEM_TAGS
+from src.constants import VERSION, UI_ITEM_TAGS, UI_TASKS
 from src.initialize import init_environment
 from src.UI_handler import main_window
 from src.ui_helper import setup_ui
@@ -31,7 +31,11 @@ def main():
 
     dpg.setup_dearpygui()
     dpg.show_viewport()
-    dpg.start_dearpygui()
+    # UI updates from background threads are run between frames, see UI_TASKS
+    while dpg.is_dearpygui_running():
+        UI_TASKS.run_pending()
+        dpg.render_dearpygui_frame()
+    dpg.destroy_context()
 
 
 if __name__ == "__main__":
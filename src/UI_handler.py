@@ -6,7 +6,6 @@ Functions to handle UI
 
 # pylint: disable=import-error, logging-not-lazy, consider-using-f-string, expression-not-assigned
 import logging
-from os.path import join
 import dearpygui.dearpygui as dpg
 from time import localtime, sleep
 
@@ -20,6 +19,7 @@ from src.constants import (
     RECENTS,
     OPEN_COURSE_PATH,
     COURSE_INFO,
+    OPEN_IX,
     BUTTON_SMALL,
     BUTTON_LARGE,
     BUTTON_XL,
@@ -27,6 +27,8 @@ from src.constants import (
     BOX_SMALL,
     BOX_MEDIUM,
     BOX_LARGE,
+    SHOWN_ALTERNATIVES,
+    SET_LISTBOX_DATA,
 )
 from src.data_handler import (
     save_course_info,
@@ -46,7 +48,13 @@ from src.data_handler import (
     resolve_set_header,
     update_set,
     delete_assignment_set,
-    check_new_features
+    check_new_features,
+    rebuild_course_index,
+    convert_course_storage,
+    change_course_layout,
+    clean_assignment_files,
+    toggle_course_watcher,
+    show_index_summary,
 )
 from src.data_getters import (
     get_empty_variation,
@@ -84,7 +92,13 @@ from src.ui_helper import (
 from src.popups import popup_ok, popup_confirmation, popup_load
 from src.popups2 import popup_create_course
 from src.common import round_up
-from src.set_generator import generate_one_set, format_set, generate_full_set
+from src.set_generator import (
+    generate_one_set,
+    format_set,
+    generate_full_set,
+    generate_ranked_sets,
+)
+from src.set_planner import GeneratorContext
 from src.tex_generator import tex_gen, create_pw_pdf
 
 #############################################################
@@ -93,8 +107,8 @@ from src.tex_generator import tex_gen, create_pw_pdf
 def _stop():
     logging.info("Stopping program.")
     close_index()
+    # The context is destroyed in main once the render loop has ended
     dpg.stop_dearpygui()
-    dpg.destroy_context()
 
 
 def main_window():
@@ -128,6 +142,28 @@ def main_window():
                             callback=lambda s, a, item: open_course(dir=item),
                             user_data=item,
                         )
+                dpg.add_menu_item(
+                    label=DISPLAY_TEXTS["menu_rebuild_index"][LANGUAGE.get()],
+                    callback=rebuild_course_index,
+                )
+                dpg.add_menu_item(
+                    label=DISPLAY_TEXTS["menu_convert_storage"][LANGUAGE.get()],
+                    callback=convert_course_storage,
+                )
+                dpg.add_menu_item(
+                    label=DISPLAY_TEXTS["menu_clean_files"][LANGUAGE.get()],
+                    callback=clean_assignment_files,
+                )
+                dpg.add_menu_item(
+                    label=DISPLAY_TEXTS["menu_change_layout"][LANGUAGE.get()],
+                    callback=change_course_layout,
+                )
+                dpg.add_menu_item(
+                    label=DISPLAY_TEXTS["menu_watch_course"][LANGUAGE.get()],
+                    check=True,
+                    tag=UI_ITEM_TAGS["WATCH_COURSE"],
+                    callback=toggle_course_watcher,
+                )
             with dpg.menu(label=DISPLAY_TEXTS["ui_menu_language"][LANGUAGE.get()]):
                 for key in LANGUAGE.get_all():
                     dpg.add_menu_item(
@@ -218,6 +254,15 @@ def main_window():
                                 else "",
                                 multiline=True,
                             )
+                        with dpg.table_row():
+                            dpg.add_text(
+                                DISPLAY_TEXTS["ui_compact_json"][LANGUAGE.get()] + ":"
+                            )
+                            help_(DISPLAY_TEXTS["help_compact_json"][LANGUAGE.get()])
+                            dpg.add_checkbox(
+                                tag=UI_ITEM_TAGS["COURSE_COMPACT_JSON"],
+                                default_value=COURSE_INFO.get("compact_json", False),
+                            )
 
                         with dpg.table_row():
                             dpg.add_button(
@@ -230,6 +275,25 @@ def main_window():
                 dpg.add_image("mimir_logo")
             dpg.add_spacer(height=25)
 
+        # Course summary header
+        header_summary_label = DISPLAY_TEXTS["ui_course_summary"][LANGUAGE.get()]
+        with dpg.collapsing_header(label=header_summary_label):
+            dpg.add_spacer(height=10)
+            with dpg.group(horizontal=True):
+                dpg.add_spacer(width=25)
+                with dpg.group():
+                    for key, tag in (
+                        ("ui_summary_weeks", "SUMMARY_WEEKS"),
+                        ("ui_summary_levels", "SUMMARY_LEVELS"),
+                        ("ui_summary_tags", "SUMMARY_TAGS"),
+                    ):
+                        dpg.add_text(DISPLAY_TEXTS[key][LANGUAGE.get()] + ":")
+                        dpg.add_text("-", tag=UI_ITEM_TAGS[tag], wrap=1300)
+                        dpg.add_spacer(height=5)
+            dpg.add_spacer(height=20)
+            if OPEN_IX.get():
+                show_index_summary()
+
         # Assignment set creation header
         header2_label = DISPLAY_TEXTS["ui_assignment_set"][LANGUAGE.get()]
         with dpg.collapsing_header(label=header2_label):
@@ -276,6 +340,22 @@ def main_window():
                                 dpg.add_text(DISPLAY_TEXTS["ui_excl_exp"][LANGUAGE.get()])
                                 checkbox_tag = dpg.generate_uuid()
                                 dpg.add_checkbox(tag=checkbox_tag)
+                            with dpg.group(horizontal=True):
+                                dpg.add_text(
+                                    DISPLAY_TEXTS["ui_minimize_reuse"][LANGUAGE.get()]
+                                )
+                                help_(DISPLAY_TEXTS["help_minimize_reuse"][LANGUAGE.get()])
+                                solve_tag = dpg.generate_uuid()
+                                dpg.add_checkbox(tag=solve_tag)
+                            with dpg.group(horizontal=True):
+                                dpg.add_text(DISPLAY_TEXTS["ui_seed"][LANGUAGE.get()] + ":")
+                                help_(DISPLAY_TEXTS["help_seed"][LANGUAGE.get()])
+                                seed_tag = dpg.generate_uuid()
+                                dpg.add_input_text(
+                                    width=BOX_SMALL,
+                                    decimal=True,
+                                    tag=seed_tag,
+                                )
                             dpg.add_spacer(height=5)
                             dpg.add_button(
                                 label=DISPLAY_TEXTS["ui_create"][LANGUAGE.get()] + "...",
@@ -283,6 +363,8 @@ def main_window():
                                 user_data=(
                                     week_input_tag,
                                     checkbox_tag,
+                                    solve_tag,
+                                    seed_tag,
                                 ),
                                 width=BUTTON_LARGE,
                             )
@@ -301,11 +383,45 @@ def main_window():
                                 dpg.add_text(DISPLAY_TEXTS["ui_excl_exp"][LANGUAGE.get()])
                                 checkbox_tag2 = dpg.generate_uuid()
                                 dpg.add_checkbox(tag=checkbox_tag2)
+                            with dpg.group(horizontal=True):
+                                dpg.add_text(
+                                    DISPLAY_TEXTS["ui_minimize_reuse"][LANGUAGE.get()]
+                                )
+                                help_(DISPLAY_TEXTS["help_minimize_reuse"][LANGUAGE.get()])
+                                solve_tag2 = dpg.generate_uuid()
+                                dpg.add_checkbox(tag=solve_tag2)
+                            with dpg.group(horizontal=True):
+                                dpg.add_text(
+                                    DISPLAY_TEXTS["ui_alternatives"][LANGUAGE.get()] + ":"
+                                )
+                                help_(DISPLAY_TEXTS["help_alternatives"][LANGUAGE.get()])
+                                alternatives_tag = dpg.generate_uuid()
+                                dpg.add_input_int(
+                                    width=BOX_SMALL,
+                                    min_value=1,
+                                    min_clamped=True,
+                                    default_value=1,
+                                    tag=alternatives_tag,
+                                )
+                            with dpg.group(horizontal=True):
+                                dpg.add_text(DISPLAY_TEXTS["ui_seed"][LANGUAGE.get()] + ":")
+                                help_(DISPLAY_TEXTS["help_seed"][LANGUAGE.get()])
+                                seed_tag2 = dpg.generate_uuid()
+                                dpg.add_input_text(
+                                    width=BOX_SMALL,
+                                    decimal=True,
+                                    tag=seed_tag2,
+                                )
                             dpg.add_spacer(height=5)
                             dpg.add_button(
                                 label=DISPLAY_TEXTS["ui_create"][LANGUAGE.get()] + "...",
                                 callback=create_all_sets_callback,
-                                user_data=checkbox_tag2,
+                                user_data=(
+                                    checkbox_tag2,
+                                    alternatives_tag,
+                                    solve_tag2,
+                                    seed_tag2,
+                                ),
                                 width=BUTTON_LARGE,
                             )
                             dpg.bind_item_theme(dpg.last_item(), "alternate_button_theme")
@@ -1343,6 +1459,8 @@ def assignment_browse_window(
                             width=1040,
                             hint=DISPLAY_TEXTS["ui_search_hint"][LANGUAGE.get()],
                             tag=UI_ITEM_TAGS["SEARCH_BAR"],
+                            callback=assignment_search_wrapper,
+                            user_data=pagenum,
                         )
                         dpg.add_spacer(width=6)
                         dpg.add_button(
@@ -1597,7 +1715,7 @@ def week_show_callback(s, a, u: bool):
 def _assignment_edit_callback(s, a, u: bool):
     value = get_value_from_browse()
     _json = get_assignment_json(
-        join(OPEN_COURSE_PATH.get_subdir(metadata=True), value["a_id"] + ".json")
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=value["a_id"])
     )
     if u:
         show_prev_part(None, None, _json)
@@ -1615,7 +1733,7 @@ def show_prev_part(s, a, u: dict | None):
         if not val:
             return
         var = get_assignment_json(
-            join(OPEN_COURSE_PATH.get_subdir(metadata=True), val + ".json")
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=val)
         )
     else:
         var = u
@@ -2038,6 +2156,10 @@ def create_one_set_callback(s, a, u):
 
     week_n = dpg.get_value(u[0])
     exc_exp = dpg.get_value(u[1])
+    solve = dpg.get_value(u[2])
+    context = generator_context(u[3])
+    if context is None:
+        return
     all_weeks = get_one_week(week_n)
 
     if all_weeks is not None and all_weeks is not {}:
@@ -2045,9 +2167,12 @@ def create_one_set_callback(s, a, u):
             all_weeks["lectures"][0]["lecture_no"],
             all_weeks["lectures"][0]["assignment_count"],
             exclude_expanding=exc_exp,
+            solve=solve,
+            context=context,
         )
         formatted = format_set(_set)
-        result_window(formatted, all_weeks)
+        generation = generation_info(context.seed, exc_exp, solve)
+        result_window(formatted, all_weeks, generation=generation)
     elif all_weeks is None:
         popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
     else:
@@ -2059,18 +2184,80 @@ def create_all_sets_callback(s, a, u):
     Callback function for main window button
     """
 
-    exc_exp = dpg.get_value(u)
-    _sets = generate_full_set(exclude_expanding=exc_exp)
+    exc_exp = dpg.get_value(u[0])
+    count = dpg.get_value(u[1])
+    solve = dpg.get_value(u[2])
+    context = generator_context(u[3])
+    if context is None:
+        return
+    if count > 1:
+        ranked = generate_ranked_sets(
+            count,
+            SHOWN_ALTERNATIVES,
+            exclude_expanding=exc_exp,
+            solve=solve,
+            context=context,
+        )
+        if not ranked:
+            return
+        # The best one is opened last, so that it is on top
+        for score, _sets in reversed(ranked):
+            formatted = [format_set(_set) for _set in _sets]
+            generation = generation_info(score["seed"], exc_exp, solve)
+            result_window(formatted, get_week_data(), score, generation)
+        return
+
+    _sets = generate_full_set(exclude_expanding=exc_exp, solve=solve, context=context)
     if not _sets:
         return
     formatted = [format_set(_set) for _set in _sets]
     weeks = get_week_data()
-    result_window(formatted, weeks)
+    generation = generation_info(context.seed, exc_exp, solve)
+    result_window(formatted, weeks, generation=generation)
 
 
-def result_window(orig_set: list, weeks: dict):
+def generator_context(seed_tag: int | str) -> GeneratorContext | None:
     """
-    The result preview window for generated sets
+    Returns the random generators for set generation, seeded from the seed
+    field, or from an unpredictable seed if the field is empty. Shows an error
+    and returns None if the seed is not a whole number.
+
+    Params:
+    seed_tag: tag of the seed field
+    """
+
+    seed = dpg.get_value(seed_tag).strip()
+    if not seed:
+        return GeneratorContext()
+    if not seed.isdigit():
+        popup_ok(DISPLAY_TEXTS["ui_invalid_seed"][LANGUAGE.get()])
+        return None
+    return GeneratorContext(int(seed))
+
+
+def generation_info(seed: int, exclude_expanding: bool, solve: bool) -> dict:
+    """
+    Returns what is saved with a set about how it was generated, so that the
+    same set can be generated again from the same course.
+    """
+
+    return {
+        "seed": seed,
+        "exclude_expanding": exclude_expanding,
+        "minimize_reuse": solve,
+    }
+
+
+def result_window(
+    orig_set: list,
+    weeks: dict,
+    score: dict | None = None,
+    generation: dict | None = None,
+):
+    """
+    The result preview window for generated sets. The score of an alternative
+    full set is shown if given, see generate_ranked_sets. The generation info
+    is saved with the set, see generation_info.
     """
 
     label = "Mímir - {} - {}".format(
@@ -2105,6 +2292,22 @@ def result_window(orig_set: list, weeks: dict):
         no_collapse=True,
         no_resize=False,
     ):
+        if score is not None:
+            dpg.add_text(
+                DISPLAY_TEXTS["ui_set_score"][LANGUAGE.get()].format(
+                    score["total"],
+                    score["recency"],
+                    score["balance"],
+                    score["diversity"],
+                    score["seed"],
+                )
+            )
+            dpg.add_spacer(height=5)
+        elif generation is not None:
+            dpg.add_text(
+                DISPLAY_TEXTS["ui_set_seed"][LANGUAGE.get()].format(generation["seed"])
+            )
+            dpg.add_spacer(height=5)
         dpg.add_text(DISPLAY_TEXTS["ui_set_id"][LANGUAGE.get()] + ":")
 
         with dpg.group(horizontal=True):
@@ -2214,7 +2417,7 @@ def result_window(orig_set: list, weeks: dict):
                         dpg.add_button(
                             label=DISPLAY_TEXTS["ui_accept"][LANGUAGE.get()],
                             callback=accept_result_set,
-                            user_data=(_set, weeks, set_UUIDs),
+                            user_data=(_set, weeks, set_UUIDs, generation),
                             width=BUTTON_LARGE,
                         )
                         dpg.add_spacer(width=5)
@@ -2266,10 +2469,7 @@ def change_result(s, a, u: tuple[int | str, int, list]):
             assig_index = i - 1
 
     correct = get_assignment_json(
-        join(
-            OPEN_COURSE_PATH.get_subdir(metadata=True),
-            correct_item["assignment_id"] + ".json",
-        )
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=correct_item["assignment_id"])
     )
     meta = (_set, index, assig_index, listbox_id, week)
     result_popup(correct, correct_item["variations"][0]["variation_id"], meta)
@@ -2299,20 +2499,17 @@ def show_result_assig(s, a, u):
             correct_item = item
 
     correct = get_assignment_json(
-        join(
-            OPEN_COURSE_PATH.get_subdir(metadata=True),
-            correct_item["assignment_id"] + ".json",
-        )
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=correct_item["assignment_id"])
     )
     show_prev_part(None, None, correct)
 
 
-def accept_result_set(s, a, u: tuple[list, dict, dict]):
+def accept_result_set(s, a, u: tuple[list, dict, dict, dict | None]):
     """
     Create instruction papers from accepted set and save the set
     """
 
-    res = save_new_set(u[2], u[0])
+    res = save_new_set(u[2], u[0], u[3])
     _id = dpg.generate_uuid()
     popup_load(
         DISPLAY_TEXTS["ui_set_save_success"][LANGUAGE.get()], _id, dpg.generate_uuid()
@@ -2423,7 +2620,7 @@ def delete_assignment(s, a, u: tuple[str, str | int, str | int]):
         else:
             popup_ok(DISPLAY_TEXTS["ui_del_ok"][LANGUAGE.get()])
 
-    dpg.configure_item(UI_ITEM_TAGS["total_index"], default_value=get_number_of_docs())
+    show_index_summary()
     clear_search_bar(None, None, [1])
     close_window(window_id)
 
@@ -2454,7 +2651,7 @@ def create_project_work(**args):
         popup_ok(DISPLAY_TEXTS["ui_no_assig_selected"][LANGUAGE.get()])
         return
     data = get_assignment_json(
-        join(OPEN_COURSE_PATH.get_subdir(metadata=True), a_id + ".json")
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=a_id)
     )
 
     create_pw_pdf(data)
@@ -2495,7 +2692,11 @@ def show_result_sets():
                 dpg.add_spacer(height=5)
                 headers = get_result_sets()
                 dpg.add_listbox(
-                    headers, tag=UI_ITEM_TAGS["LISTBOX"], width=1300, num_items=15
+                    headers,
+                    tag=UI_ITEM_TAGS["LISTBOX"],
+                    width=1300,
+                    num_items=15,
+                    user_data=SET_LISTBOX_DATA,
                 )
                 dpg.add_spacer(height=5)
 
@@ -2522,7 +2723,8 @@ def show_result_sets():
 
 def set_window(set_info:dict):
     """
-    The result preview window for generated sets
+    The preview window of a saved set. The seed it was generated with is shown
+    if it was saved with the set, see generation_info.
     """
 
     label = "Mímir - {} - {}".format(
@@ -2561,6 +2763,12 @@ def set_window(set_info:dict):
         no_collapse=True,
         no_resize=False,
     ):
+        generation = set_info.get("generation")
+        if generation is not None:
+            dpg.add_text(
+                DISPLAY_TEXTS["ui_set_seed"][LANGUAGE.get()].format(generation["seed"])
+            )
+            dpg.add_spacer(height=5)
         dpg.add_text(DISPLAY_TEXTS["ui_set_id"][LANGUAGE.get()] + ":")
 
         with dpg.group(horizontal=True):
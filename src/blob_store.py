@@ -0,0 +1,318 @@
+"""
+Mímir Blob Store
+
+Content-addressed storage for the code, data and output files of assignments.
+Every distinct file is kept once under assignment_data/.blobs, named by its
+SHA-256 hash, and placed into the folder of the assignment (assignment_data/<id>/
+or its sharded equivalent) as a reflink or hardlink where the filesystem
+supports it. A manifest per assignment records which blob
+each file is, so that unreferenced blobs can be garbage collected.
+
+Blobs are read-only, so that a hardlinked file cannot be changed in place and
+change the same file of every other assignment with it. Hashes of files are
+cached by their size, modification time and inode, so saving the same files
+again does not read them again.
+"""
+
+# pylint: disable=import-error
+import errno
+import logging
+import os
+import sys
+import stat
+import tempfile
+from hashlib import sha256
+from os import path
+from shutil import copyfileobj, copyfile
+from threading import Lock
+
+from src.common import (
+    assignment_subpath,
+    iter_assignment_entries,
+    loads_json,
+    write_json_atomic,
+)
+
+BLOB_DIR = ".blobs"
+MANIFEST_DIR = "manifests"
+CHUNK_SIZE = 1024 * 1024
+# Linux ioctl for copy-on-write clones (btrfs, XFS)
+_FICLONE = 0x40049409
+BLOB_MODE = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+_digest_cache = {}
+_digest_lock = Lock()
+
+
+class BlobStore:
+    """
+    Blob store of the assignment data folder of a course. If sharded is set, the
+    assignment folders and manifests are in shard folders, see assignment_subpath.
+    """
+
+    def __init__(self, data_path: str, sharded=False):
+        self.data_path = data_path
+        self.sharded = sharded
+        self.blob_path = path.join(data_path, BLOB_DIR)
+        self.manifest_path = path.join(self.blob_path, MANIFEST_DIR)
+
+    def put(self, src_path: str) -> str:
+        """
+        Adds a file to the store if it is not there yet and returns its hash. A
+        blob that is already there is hashed again before it is used, unless it
+        has not changed since it was last hashed, and written again if its
+        content no longer matches its name.
+        """
+
+        digest = cached_digest(src_path)
+        blob = self._blob(digest)
+        if path.exists(blob):
+            if cached_digest(blob) == digest:
+                # Blobs saved before they were made read-only
+                if os.stat(blob).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+                    os.chmod(blob, BLOB_MODE)
+                return digest
+            logging.warning("Blob %s has been changed, writing it again.", digest)
+        os.makedirs(path.dirname(blob), exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=path.dirname(blob), suffix=".tmp")
+        try:
+            with open(src_path, "rb") as src, os.fdopen(handle, "wb") as dst:
+                copyfileobj(src, dst, CHUNK_SIZE)
+            os.chmod(tmp_path, BLOB_MODE)
+            _make_writable(blob)
+            os.replace(tmp_path, blob)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        return digest
+
+    def place(self, digest: str, dest_path: str):
+        """
+        Places a blob at dest_path, replacing what was there. Uses a reflink or a
+        hardlink if possible and copies the file otherwise. A hardlinked file is
+        read-only like the blob, a reflinked or copied one is writable.
+        """
+
+        tmp_path = dest_path + ".tmp"
+        _remove_quietly(tmp_path)
+        try:
+            _link(self._blob(digest), tmp_path)
+            _make_writable(dest_path)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+
+    def add_files(self, a_id: str, src_paths: list) -> list:
+        """
+        Stores files into the data folder of an assignment and records them in its
+        manifest. Files that are already in place with the same content are not
+        touched. Returns the file names.
+
+        Params:
+        a_id: ID of the assignment
+        src_paths: paths of the files to add
+        """
+
+        manifest = self.read_manifest(a_id)
+        dest_dir = self.folder(a_id)
+        os.makedirs(dest_dir, exist_ok=True)
+        names = []
+        for src_path in src_paths:
+            name = path.basename(src_path)
+            dest_path = path.join(dest_dir, name)
+            digest = self.put(src_path)
+            if manifest.get(name) != digest or not path.exists(dest_path):
+                self.place(digest, dest_path)
+                manifest[name] = digest
+            names.append(name)
+        if names:
+            self.write_manifest(a_id, manifest)
+        return names
+
+    def read_manifest(self, a_id: str) -> dict:
+        try:
+            with open(self._manifest(a_id), "rb") as manifest_file:
+                return loads_json(manifest_file.read())
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self, a_id: str, manifest: dict):
+        os.makedirs(path.dirname(self._manifest(a_id)), exist_ok=True)
+        write_json_atomic(self._manifest(a_id), manifest, compact=True)
+
+    def remove_assignment(self, a_id: str):
+        """
+        Forgets the files of an assignment. The blobs are removed by collect().
+        """
+
+        _remove_quietly(self._manifest(a_id))
+
+    def adopt(self, a_id: str) -> int:
+        """
+        Moves the files of an assignment that were saved before the blob store into
+        it, so that identical files share one copy. Returns the number of files.
+        """
+
+        dest_dir = self.folder(a_id)
+        manifest = self.read_manifest(a_id)
+        files = [
+            path.join(dest_dir, name)
+            for name in os.listdir(dest_dir)
+            if name not in manifest and path.isfile(path.join(dest_dir, name))
+        ]
+        self.add_files(a_id, files)
+        return len(files)
+
+    def collect(self) -> tuple[int, int]:
+        """
+        Removes blobs that no assignment uses. Manifest entries of files that have
+        been removed from the data folder are dropped first. Returns the number of
+        removed blobs and the bytes freed.
+        """
+
+        referenced = set()
+        for a_id in self.manifest_ids():
+            referenced.update(self._prune_manifest(a_id).values())
+
+        removed = 0
+        freed = 0
+        if not path.exists(self.blob_path):
+            return removed, freed
+        for prefix in os.listdir(self.blob_path):
+            prefix_path = path.join(self.blob_path, prefix)
+            if prefix == MANIFEST_DIR or not path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                if name in referenced:
+                    continue
+                blob = path.join(prefix_path, name)
+                freed += path.getsize(blob)
+                _make_writable(blob)
+                os.remove(blob)
+                removed += 1
+
+        logging.info("Removed %d unused blobs, %d bytes.", removed, freed)
+        return removed, freed
+
+    def _prune_manifest(self, a_id: str) -> dict:
+        manifest = self.read_manifest(a_id)
+        placed = {
+            name: digest
+            for name, digest in manifest.items()
+            if path.exists(path.join(self.folder(a_id), name))
+        }
+        if not placed:
+            self.remove_assignment(a_id)
+        elif placed != manifest:
+            self.write_manifest(a_id, placed)
+        return placed
+
+    def folder(self, a_id: str) -> str:
+        """
+        Returns the data folder of an assignment.
+        """
+
+        return path.join(self.data_path, assignment_subpath(a_id, self.sharded))
+
+    def manifest_ids(self) -> list:
+        """
+        Returns the IDs of the assignments that have a manifest.
+        """
+
+        return [
+            name[:-5]
+            for name, _ in iter_assignment_entries(self.manifest_path, self.sharded)
+            if name.endswith(".json")
+        ]
+
+    def _blob(self, digest: str) -> str:
+        return path.join(self.blob_path, digest[:2], digest)
+
+    def _manifest(self, a_id: str) -> str:
+        subpath = assignment_subpath(a_id, self.sharded)
+        return path.join(self.manifest_path, subpath + ".json")
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Returns the SHA-256 hash of a file, read in chunks.
+
+    Params:
+    file_path: path to the file
+    """
+
+    _hash = sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            _hash.update(chunk)
+    return _hash.hexdigest()
+
+
+def cached_digest(file_path: str) -> str:
+    """
+    Returns the SHA-256 hash of a file like file_digest, but reads the file only
+    if its size, modification time, inode or mode have changed since the last
+    time it was hashed.
+
+    Params:
+    file_path: path to the file
+    """
+
+    info = os.stat(file_path)
+    key = (info.st_size, info.st_mtime_ns, info.st_ino, info.st_mode)
+    file_path = path.abspath(file_path)
+    with _digest_lock:
+        cached = _digest_cache.get(file_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    digest = file_digest(file_path)
+    with _digest_lock:
+        _digest_cache[file_path] = (key, digest)
+    return digest
+
+
+def _link(src: str, dst: str):
+    """
+    Makes dst a reflink of src, or a hardlink, or a copy, whichever works first.
+    Reflinks are preferred since changing either file does not change the other.
+    Hardlinks are not used on Windows, where the read-only attribute of a blob
+    would keep the linked files from being replaced or removed.
+    """
+
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl  # pylint: disable=import-outside-toplevel
+
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+            return
+        except OSError as e:
+            _remove_quietly(dst)
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                raise
+    if os.name != "nt":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    # Not copy2, which would make the copy read-only like the blob
+    copyfile(src, dst)
+
+
+def _make_writable(file_path: str):
+    """
+    Makes a read-only file writable on Windows, where it could not be replaced or
+    removed otherwise. Elsewhere replacing and removing depend on the folder only.
+    """
+
+    if os.name == "nt" and path.exists(file_path):
+        os.chmod(file_path, stat.S_IREAD | stat.S_IWRITE)
+
+
+def _remove_quietly(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
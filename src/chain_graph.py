@@ -0,0 +1,175 @@
+"""
+Mímir Chain Graph
+
+Adjacency index of the expansion chains of a course, see ChainGraph. These do
+not depend on the UI.
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+from threading import RLock
+
+
+class ChainGraph:
+    """
+    Adjacency index of the expansion chains of a course. There is an edge from
+    an assignment to each of its next parts. A link counts if it is recorded on
+    either side, in the next list of the earlier part or in the previous list of
+    the later one. The graph is built from the index of the open course and kept
+    up to date when assignments are saved or deleted, so chains can be followed
+    without reading assignment files.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._source = None
+        self._own = {}
+        self._next = {}
+        self._previous = {}
+
+    def is_loaded(self, source) -> bool:
+        return self._source is not None and self._source is source
+
+    def load(self, documents, source):
+        """
+        Builds the graph from (a_id, previous, next) tuples. source is the index
+        the documents are from, see is_loaded.
+        """
+
+        with self._lock:
+            self._own = {}
+            self._next = {}
+            self._previous = {}
+            for a_id, previous, next_ids in documents:
+                self._add(a_id, previous, next_ids)
+            self._source = source
+
+    def clear(self):
+        with self._lock:
+            self._source = None
+            self._own = {}
+            self._next = {}
+            self._previous = {}
+
+    def update(self, a_id, previous, next_ids):
+        with self._lock:
+            if self._source is None:
+                return
+            self._discard(a_id)
+            self._add(a_id, previous, next_ids)
+
+    def remove(self, a_id):
+        with self._lock:
+            if self._source is not None:
+                self._discard(a_id)
+
+    def next_of(self, a_id) -> list:
+        with self._lock:
+            return [item for item in self._next.get(a_id, ()) if item in self._own]
+
+    def previous_of(self, a_id) -> list:
+        with self._lock:
+            return [item for item in self._previous.get(a_id, ()) if item in self._own]
+
+    def recorded_next(self, a_id) -> tuple:
+        """
+        Returns the next list as it is saved in the assignment itself.
+        """
+
+        with self._lock:
+            return self._own.get(a_id, ((), ()))[1]
+
+    def chain(self, a_id) -> list:
+        """
+        Returns all assignments linked to a_id, earlier parts first. Parts that
+        are in a cycle come last.
+        """
+
+        with self._lock:
+            if a_id not in self._own:
+                return []
+            members = {a_id}
+            stack = [a_id]
+            while stack:
+                item = stack.pop()
+                for other in self.next_of(item) + self.previous_of(item):
+                    if other not in members:
+                        members.add(other)
+                        stack.append(other)
+            ordered = self._topological(members)
+            placed = set(ordered)
+            return ordered + sorted(item for item in members if item not in placed)
+
+    def has_cycle(self, a_id) -> bool:
+        with self._lock:
+            members = self.chain(a_id)
+            return len(self._topological(set(members))) < len(members)
+
+    def creates_cycle(self, a_id, previous_id) -> bool:
+        """
+        Returns whether making previous_id a previous part of a_id would link
+        the assignment to itself.
+        """
+
+        with self._lock:
+            seen = set()
+            stack = [a_id]
+            while stack:
+                item = stack.pop()
+                if item == previous_id:
+                    return True
+                if item not in seen:
+                    seen.add(item)
+                    stack.extend(self.next_of(item))
+            return False
+
+    def _topological(self, members: set) -> list:
+        incoming = {
+            item: sum(1 for prev in self.previous_of(item) if prev in members)
+            for item in members
+        }
+        ready = sorted(item for item, count in incoming.items() if count == 0)
+        ordered = []
+        while ready:
+            item = ready.pop(0)
+            ordered.append(item)
+            for other in self.next_of(item):
+                if other in incoming:
+                    incoming[other] -= 1
+                    if incoming[other] == 0:
+                        ready.append(other)
+        return ordered
+
+    def _add(self, a_id, previous, next_ids):
+        previous = tuple(previous or ())
+        next_ids = tuple(next_ids or ())
+        self._own[a_id] = (previous, next_ids)
+        for prev in previous:
+            self._link(prev, a_id)
+        for item in next_ids:
+            self._link(a_id, item)
+
+    def _discard(self, a_id):
+        previous, next_ids = self._own.pop(a_id, ((), ()))
+        for prev in previous:
+            self._unlink(prev, a_id)
+        for item in next_ids:
+            self._unlink(a_id, item)
+
+    def _link(self, first, second):
+        # Edges are counted, as the same link can be recorded on both sides
+        edges = self._next.setdefault(first, {})
+        edges[second] = edges.get(second, 0) + 1
+        edges = self._previous.setdefault(second, {})
+        edges[first] = edges.get(first, 0) + 1
+
+    def _unlink(self, first, second):
+        for edges, key, other in (
+            (self._next, first, second),
+            (self._previous, second, first),
+        ):
+            counts = edges.get(key, {})
+            counts[other] = counts.get(other, 0) - 1
+            if counts[other] <= 0:
+                counts.pop(other)
+            if not counts:
+                edges.pop(key, None)
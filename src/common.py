@@ -5,9 +5,22 @@ Functions that are used by multiple modules, moved here to prevent
 circular imports
 """
 
+import os
 import sys
+import json
+import secrets
 from os import path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shard folders of the sharded course layout, see assignment_subpath
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
@@ -22,3 +35,184 @@ def resource_path(relative_path):
 def round_up(number:float) -> int: 
     """Round up any float"""
     return int(number) + (number % 1 > 0)
+
+
+def assignment_subpath(a_id: str, sharded=False) -> str:
+    """
+    Returns the path of an assignment relative to the metadata or assignment data
+    folder. In the flat layout this is the ID itself, in the sharded layout
+    ab/cd/<ID>, where ab and cd are the first four characters of the ID.
+
+    Params:
+    a_id: ID of the assignment
+    sharded: whether the course uses the sharded layout
+    """
+
+    if not sharded:
+        return a_id
+    return path.join(
+        *(a_id[i * SHARD_WIDTH : (i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)),
+        a_id,
+    )
+
+
+def iter_assignment_entries(folder: str, sharded=False):
+    """
+    Yields the names and paths of the entries that assignments have in the
+    metadata or assignment data folder, looking inside the shard folders in the
+    sharded layout.
+
+    Params:
+    folder: the metadata or assignment data folder
+    sharded: whether the course uses the sharded layout
+    """
+
+    folders = [folder]
+    for _ in range(SHARD_LEVELS if sharded else 0):
+        folders = [
+            entry.path
+            for parent in folders
+            for entry in _scandir(parent)
+            if len(entry.name) == SHARD_WIDTH and entry.is_dir()
+        ]
+    for parent in folders:
+        for entry in _scandir(parent):
+            yield entry.name, entry.path
+
+
+def move_assignment_layout(folder: str, a_ids, sharded: bool, suffix="") -> int:
+    """
+    Moves the entries of assignments in a folder into the flat or sharded
+    layout. Entries that are already in place are skipped, so an interrupted
+    move can be run again. Emptied shard folders are removed. Returns the number
+    of moved entries.
+
+    Params:
+    folder: the folder to rearrange
+    a_ids: IDs of the assignments
+    sharded: the layout to move to
+    suffix: suffix of the entry names after the ID, such as ".json"
+    """
+
+    moved = 0
+    for a_id in a_ids:
+        src = path.join(folder, assignment_subpath(a_id, not sharded) + suffix)
+        dst = path.join(folder, assignment_subpath(a_id, sharded) + suffix)
+        if not path.exists(src) or path.exists(dst):
+            continue
+        os.makedirs(path.dirname(dst), exist_ok=True)
+        os.replace(src, dst)
+        moved += 1
+        if not sharded:
+            for _ in range(SHARD_LEVELS):
+                src = path.dirname(src)
+                try:
+                    os.rmdir(src)
+                except OSError:
+                    break
+    return moved
+
+
+def _scandir(folder: str) -> list:
+    try:
+        return list(os.scandir(folder))
+    except FileNotFoundError:
+        return []
+
+
+def dumps_json(data, compact=False) -> bytes:
+    """
+    Serializes data to UTF-8 JSON. Pretty output is indented with four spaces.
+    Compact output uses orjson when it is installed.
+
+    Params:
+    data: JSON serializable data
+    compact: whether to leave out indentation and extra whitespace
+    """
+
+    if not compact:
+        return json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(raw: bytes | str):
+    """
+    Parses JSON with orjson when it is installed. Raises ValueError on invalid JSON.
+
+    Params:
+    raw: the JSON document
+    """
+
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def write_json_atomic(file_path: str, data, compact=False):
+    """
+    Writes data as JSON so that the file is either fully written or left as it
+    was. The data is written to a temporary file in the same folder, synced to
+    disk and then moved over the original file. Raises OSError on failure.
+
+    Params:
+    file_path: path of the file to write
+    data: JSON serializable data
+    compact: see dumps_json
+    """
+
+    raw = dumps_json(data, compact)
+    folder = path.dirname(path.abspath(file_path))
+    handle, tmp_path = _create_temp(folder, path.basename(file_path))
+    try:
+        with os.fdopen(handle, "wb") as tmp_file:
+            tmp_file.write(raw)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        # A new file keeps the mode given by the umask, a replaced one its own
+        try:
+            os.chmod(tmp_path, os.stat(file_path).st_mode)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_folder(folder)
+
+
+def _create_temp(folder: str, name: str) -> tuple[int, str]:
+    """
+    Creates a temporary file for name in folder and returns its handle and path.
+    Unlike tempfile.mkstemp, the file gets the same mode as any new file, so the
+    umask does not have to be read.
+    """
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_path = path.join(folder, ".%s.%s.tmp" % (name, secrets.token_hex(4)))
+        try:
+            return os.open(tmp_path, flags, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def _fsync_folder(folder: str):
+    """
+    Syncs a folder so that a rename in it is durable. Not possible on Windows.
+    """
+
+    try:
+        handle = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        pass
+    finally:
+        os.close(handle)
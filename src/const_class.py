@@ -1,13 +1,24 @@
 """Mímir classes for constants"""
 
 from os.path import join, abspath
+from contextlib import contextmanager
+from threading import RLock
 from whoosh.index import FileIndex
 
+from src.common import assignment_subpath
+
 # pylint: disable=invalid-name, missing-class-docstring, missing-function-docstring
 
 
 class COURSE_PATH:
+    """
+    Path of the open course. In the sharded layout the files of an assignment
+    are in shard folders under metadata and assignment_data, so paths to them
+    should be asked with get_subdir(a_id=...) rather than joined by hand.
+    """
+
     _path = None
+    _sharded = False
 
     def get(self):
         return self._path
@@ -15,17 +26,36 @@ class COURSE_PATH:
     def get_set_path(self):
         return join(self._path, "assignment_sets.json")
 
-    def get_subdir(self, metadata=False, index=False, assignment_data=False):
+    def get_subdir(self, metadata=False, index=False, assignment_data=False, a_id=None):
+        """
+        Returns a subfolder of the course. With a_id, returns the JSON file of
+        the assignment in metadata or its folder in assignment_data instead.
+        """
+
         if metadata:
-            return join(self._path, "metadata")
+            folder = join(self._path, "metadata")
+            if a_id is None:
+                return folder
+            return join(folder, assignment_subpath(a_id, self._sharded) + ".json")
         if index:
             return join(self._path, "index")
         if assignment_data:
-            return join(self._path, "assignment_data")
+            folder = join(self._path, "assignment_data")
+            if a_id is None:
+                return folder
+            return join(folder, assignment_subpath(a_id, self._sharded))
         return None
 
+    def is_sharded(self):
+        return self._sharded
+
+    def set_sharded(self, sharded: bool):
+        self._sharded = sharded
+
     def set(self, path):
         self._path = abspath(path)
+        # Set again from the course info when the course is opened
+        self._sharded = False
 
 
 class RECENTS_LIST:
@@ -39,13 +69,88 @@ class RECENTS_LIST:
 
 
 class IX:
+    """
+    The open course index. Keeps one searcher open for all readers, which is
+    refreshed only after a writer has been committed through commit(). The
+    generation is increased on every change, so it can be used as a cache key.
+    """
+
     _open_ix = None
+    _searcher = None
+    _stale = False
+    _generation = 0
+    _lock = RLock()
 
     def get(self) -> FileIndex:
         return self._open_ix
 
     def set(self, new):
-        self._open_ix = new
+        with self._lock:
+            self._close_searcher()
+            self._open_ix = new
+            self._generation += 1
+
+    def generation(self) -> int:
+        return self._generation
+
+    @contextmanager
+    def searcher(self):
+        with self._lock:
+            if self._searcher is None:
+                self._searcher = self._open_ix.searcher()
+            elif self._stale:
+                self._searcher = self._searcher.refresh()
+            self._stale = False
+            yield self._searcher
+
+    def commit(self, writer, **kwargs):
+        writer.commit(**kwargs)
+        self._stale = True
+        self._generation += 1
+
+    def close(self):
+        with self._lock:
+            self._close_searcher()
+            if self._open_ix:
+                self._open_ix.close()
+
+    def _close_searcher(self):
+        if self._searcher is not None:
+            self._searcher.close()
+            self._searcher = None
+        self._stale = False
+
+
+class STORE:
+    """
+    The storage backend of the open course, see src/course_store.py.
+    """
+
+    _store = None
+
+    def get(self):
+        return self._store
+
+    def set(self, new):
+        if self._store is not None and self._store is not new:
+            self._store.close()
+        self._store = new
+
+
+class WATCHER:
+    """
+    The watcher of the open course folder, see src/course_watcher.py.
+    """
+
+    _watcher = None
+
+    def get(self):
+        return self._watcher
+
+    def set(self, new):
+        if self._watcher is not None and self._watcher is not new:
+            self._watcher.stop()
+        self._watcher = new
 
 
 class LANG:
@@ -71,4 +176,25 @@ class WEEK:
     def get(self):
         return self._week_data
     def set(self, new):
-        self._week_data = new
\ No newline at end of file
+        self._week_data = new
+
+
+class PROGRESS:
+    _done = 0
+    _running = False
+
+    def get(self):
+        return self._done
+
+    def set(self, new):
+        self._done = new
+
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        self._done = 0
+        self._running = True
+
+    def stop(self):
+        self._running = False
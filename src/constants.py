@@ -9,11 +9,30 @@ from sys import exit as sysexit
 import json
 
 from dearpygui.dearpygui import generate_uuid
-from whoosh.analysis import StemmingAnalyzer
-from whoosh.fields import Schema, TEXT, KEYWORD, ID, BOOLEAN, STORED
+from whoosh.analysis import (
+    StemmingAnalyzer,
+    RegexTokenizer,
+    IntraWordFilter,
+    LowercaseFilter,
+)
+from whoosh.fields import Schema, TEXT, KEYWORD, ID, BOOLEAN, NUMERIC, STORED
 
 from src.common import resource_path
-from src.const_class import COURSE_PATH, RECENTS_LIST, IX, LANG, WEEK
+from src.const_class import (
+    COURSE_PATH,
+    RECENTS_LIST,
+    IX,
+    LANG,
+    WEEK,
+    PROGRESS,
+    STORE,
+    WATCHER,
+)
+from src.chain_graph import ChainGraph
+from src.index_queue import IndexQueue
+from src.json_cache import JsonCache
+from src.search_worker import SearchWorker
+from src.ui_tasks import UiTaskQueue
 
 
 def _get_texts():
@@ -69,12 +88,20 @@ BUTTON_XXL = 210
 BOX_SMALL = 150
 BOX_MEDIUM = 430
 BOX_LARGE = 650
+# user_data of the listbox of the saved sets window, which shares its tag with
+# the assignment browser
+SET_LISTBOX_DATA = "saved_sets"
+# Number of the best alternative full sets that are shown
+SHOWN_ALTERNATIVES = 3
 
 #################################
 # Unique UI item tags
 
 _GENERAL_KEY_LIST = [
     "total_index",
+    "SUMMARY_WEEKS",
+    "SUMMARY_LEVELS",
+    "SUMMARY_TAGS",
     "PREVIOUS_PART_CHECKBOX",
     "PREVIOUS_PART_LISTBOX",
     "PREV_PART_ADD",
@@ -95,6 +122,8 @@ _GENERAL_KEY_LIST = [
     "COURSE_TITLE",
     "COURSE_WEEKS",
     "COURSE_LEVELS",
+    "COURSE_COMPACT_JSON",
+    "WATCH_COURSE",
     "ADD_WEEK",
     "SEARCH_BAR",
     "LIST_WINDOW",
@@ -136,6 +165,13 @@ UI_ITEM_TAGS = {"{}".format(i): generate_uuid() for i in _GENERAL_KEY_LIST}
 #################################
 # Misc constants
 OPEN_IX = IX()
+INDEX_QUEUE = IndexQueue(OPEN_IX)
+SEARCH_QUEUE = SearchWorker(OPEN_IX)
+ASSIGNMENT_CACHE = JsonCache()
+OPEN_STORE = STORE()
+EXPANSION_CHAINS = ChainGraph()
+COURSE_WATCHER = WATCHER()
+UI_TASKS = UiTaskQueue()
 OPEN_COURSE_PATH = COURSE_PATH()
 COURSE_INFO = {
     "course_title": None,
@@ -148,16 +184,40 @@ COURSE_INFO = {
 FILETYPES = _get_filetypes()
 LOG_LEVEL = INFO
 RECENTS = RECENTS_LIST()
+# Splits identifiers like read_csv or DictReader into their parts
+CODE_ANALYZER = (
+    RegexTokenizer(r"\w+")
+    | IntraWordFilter(mergewords=True, mergenums=True)
+    | LowercaseFilter()
+)
+INDEX_SCHEMA_VERSION = 5
 INDEX_SCHEMA = Schema(
     a_id=ID(stored=True, unique=True),
-    position=KEYWORD(stored=True, commas=True),
     tags=KEYWORD(stored=True, commas=True, lowercase=True, field_boost=2.0),
     title=TEXT(stored=True, analyzer=StemmingAnalyzer()),
-    json_path=STORED,
     is_expanding=BOOLEAN(stored=True),
-    level=ID(stored=True),
+    level=NUMERIC(stored=True, sortable=True),
+    week=NUMERIC(stored=True, sortable=True),
+    positions=NUMERIC(stored=True),
+    next=STORED,
+    previous=STORED,
+    variations=STORED,
+    instructions=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+    code=TEXT(analyzer=CODE_ANALYZER),
+    datafiles=TEXT(stored=True, analyzer=CODE_ANALYZER),
+    examples=TEXT,
 )
+SEARCH_FIELD_BOOSTS = {
+    "title": 4.0,
+    "tags": 2.0,
+    "instructions": 1.5,
+    "datafiles": 1.5,
+    "code": 1.0,
+    "examples": 0.5,
+}
+SUMMARY_TAG_COUNT = 20
 WEEK_DATA = WEEK()
+IMPORT_PROGRESS = PROGRESS()
 LATEX_SYMBOLS = {
     "#": "\#",
     "$": "\$",
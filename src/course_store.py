@@ -0,0 +1,690 @@
+"""
+Mímir Course Stores
+
+Storage backends for the assignments, weeks and assignment sets of a course.
+JsonCourseStore keeps the original layout of one file per assignment, while
+SqliteCourseStore keeps everything in a single database file. These do not
+depend on the UI.
+"""
+
+# pylint: disable=import-error
+import json
+import logging
+import secrets
+import sqlite3
+from collections.abc import Mapping
+from contextlib import contextmanager
+from os import path, makedirs, remove, scandir, stat
+from shutil import rmtree
+from threading import RLock
+from time import time
+
+from src.common import (
+    assignment_subpath,
+    iter_assignment_entries,
+    loads_json,
+    write_json_atomic,
+)
+from src.set_journal import SetJournal, HEADER_KEYS
+
+STORE_JSON = "json"
+STORE_SQLITE = "sqlite"
+# Layouts of the assignment files of a course, see assignment_subpath
+LAYOUT_FLAT = "flat"
+LAYOUT_SHARDED = "sharded"
+SQLITE_FILE = "course.db"
+# Variation fields that are only read when the variation itself is needed
+BODY_KEYS = ("instructions", "example_runs")
+SPLIT_KEY = "split_variations"
+# Version of the variation bodies the header refers to, see JsonCourseStore
+BODY_VERSION_KEY = "body_version"
+# Seconds after which bodies that no header refers to are removed
+STALE_BODY_AGE = 3600
+
+
+class JsonCourseStore:
+    """
+    Course data as JSON files: metadata/<id>.json for each assignment, weeks.json
+    and assignment_sets.json. Files are replaced atomically, and written without
+    indentation if compact is set. Changes to assignment sets are journaled, see
+    SetJournal.
+
+    The assignment file is a header where the variations have no BODY_KEYS. The
+    instructions and example runs of each variation are in
+    metadata/<id>/<n>.<version>.json, where n is the position of the variation
+    and version is a new random one on every save, named in the header. The
+    bodies are written first and the header switches to them atomically, so a
+    crash leaves either the old or the new assignment, never a mix. Bodies of
+    the old version are removed after the switch, and bodies no header refers to,
+    such as those of a crashed save, once they are STALE_BODY_AGE seconds old.
+    Assignments saved before the split are single files, and those saved before
+    the versions have bodies in metadata/<id>/<n>.json. Both are read as they
+    are until they are saved again.
+
+    If sharded is set, both are kept in shard folders instead, as in
+    metadata/ab/cd/<id>.json, see assignment_subpath.
+    """
+
+    KIND = STORE_JSON
+
+    def __init__(self, course_path: str, compact=False, sharded=False):
+        self.course_path = course_path
+        self.metadata_path = path.join(course_path, "metadata")
+        self.compact = compact
+        self.sharded = sharded
+        self._sets = SetJournal(path.join(course_path, "assignment_sets.json"))
+
+    def assignment_path(self, a_id: str) -> str:
+        return self.body_folder(a_id) + ".json"
+
+    def body_folder(self, a_id: str) -> str:
+        return path.join(self.metadata_path, assignment_subpath(a_id, self.sharded))
+
+    def body_path(self, a_id: str, position: int, version: str | None = None) -> str:
+        if version is None:
+            name = "{}.json".format(position)
+        else:
+            name = "{}.{}.json".format(position, version)
+        return path.join(self.body_folder(a_id), name)
+
+    def assignment_paths(self) -> list:
+        return [
+            item_path
+            for item, item_path in iter_assignment_entries(
+                self.metadata_path, self.sharded
+            )
+            if item.endswith(".json")
+        ]
+
+    def assignment_ids(self) -> list:
+        return [path.basename(item)[:-5] for item in self.assignment_paths()]
+
+    def version(self, a_id: str):
+        info = stat(self.assignment_path(a_id))
+        return (info.st_mtime_ns, info.st_size)
+
+    def read_header(self, a_id: str) -> dict:
+        header = self._read_file(self.assignment_path(a_id))
+        header.pop(BODY_VERSION_KEY, None)
+        if not header.pop(SPLIT_KEY, False):
+            for var in header["variations"]:
+                for key in BODY_KEYS:
+                    var.pop(key, None)
+        return header
+
+    def read_variation_body(self, a_id: str, position: int) -> dict:
+        # The header is read again, as the bodies of the header that was read
+        # before may have been replaced since
+        header = self._read_file(self.assignment_path(a_id))
+        if not header.get(SPLIT_KEY):
+            var = header["variations"][position]
+            return {key: var[key] for key in BODY_KEYS if key in var}
+        version = header.get(BODY_VERSION_KEY)
+        return self._read_file(self.body_path(a_id, position, version))
+
+    def read_assignment(self, a_id: str) -> dict:
+        assignment = self._read_file(self.assignment_path(a_id))
+        version = assignment.pop(BODY_VERSION_KEY, None)
+        if assignment.pop(SPLIT_KEY, False):
+            for position, var in enumerate(assignment["variations"]):
+                var.update(self._read_file(self.body_path(a_id, position, version)))
+        return assignment
+
+    def iter_assignments(self):
+        for a_id in self.assignment_ids():
+            yield self.read_assignment(a_id)
+
+    def write_assignment(self, assignment: dict):
+        a_id = assignment["assignment_id"]
+        try:
+            old_version = self._read_file(self.assignment_path(a_id)).get(
+                BODY_VERSION_KEY
+            )
+        except (OSError, ValueError):
+            old_version = None
+        version = secrets.token_hex(4)
+        header = {key: value for key, value in assignment.items() if key != "variations"}
+        header["variations"] = []
+        header[SPLIT_KEY] = True
+        header[BODY_VERSION_KEY] = version
+        makedirs(self.body_folder(a_id), exist_ok=True)
+        for position, var in enumerate(assignment["variations"]):
+            body = {key: var[key] for key in BODY_KEYS if key in var}
+            body_path = self.body_path(a_id, position, version)
+            write_json_atomic(body_path, body, self.compact)
+            header["variations"].append(
+                {key: value for key, value in var.items() if key not in BODY_KEYS}
+            )
+        # The header is written last and switches to the new bodies at once
+        write_json_atomic(self.assignment_path(a_id), header, self.compact)
+        self._remove_old_bodies(a_id, version, old_version)
+
+    def _remove_old_bodies(self, a_id: str, version: str, old_version: str | None):
+        """
+        Removes the bodies of an assignment that its header no longer refers to:
+        those of old_version and those saved before the versions right away, and
+        others once they are STALE_BODY_AGE seconds old, as they may belong to a
+        save of another Mímir that has not switched its header yet.
+        """
+
+        now = time()
+        with scandir(self.body_folder(a_id)) as entries:
+            for entry in entries:
+                parts = entry.name.split(".")
+                # Temporary files of write_json_atomic start with a dot
+                if parts[0] == "" or parts[-1] != "json" or len(parts) > 3:
+                    continue
+                body_version = parts[1] if len(parts) == 3 else None
+                if body_version == version:
+                    continue
+                try:
+                    if (
+                        body_version is None
+                        or body_version == old_version
+                        or now - entry.stat().st_mtime > STALE_BODY_AGE
+                    ):
+                        remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def delete_assignment(self, a_id: str):
+        if path.exists(self.assignment_path(a_id)):
+            remove(self.assignment_path(a_id))
+        if path.exists(self.body_folder(a_id)):
+            rmtree(self.body_folder(a_id))
+
+    def read_weeks(self) -> dict | None:
+        return self._read_document("weeks.json")
+
+    def write_weeks(self, weeks: dict):
+        self._write_document("weeks.json", weeks)
+
+    def read_sets(self) -> dict | None:
+        return self._sets.read()
+
+    def write_sets(self, sets: dict):
+        self._sets.write(sets, self.compact)
+
+    def set_headers(self) -> list:
+        return self._sets.headers()
+
+    def read_set(self, set_id: int) -> dict | None:
+        return self._sets.get(set_id)
+
+    def add_set(self, _set: dict) -> int:
+        return self._sets.add(_set, self.compact)
+
+    def write_set(self, _set: dict):
+        self._sets.put(_set, self.compact)
+
+    def delete_set(self, set_id: int):
+        self._sets.delete(set_id, self.compact)
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+    def close(self):
+        try:
+            self._sets.compact(self.compact)
+        except (OSError, ValueError):
+            logging.exception("Unable to compact the assignment set journal.")
+
+    def _read_document(self, name: str) -> dict | None:
+        try:
+            return self._read_file(path.join(self.course_path, name))
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self, file_path: str):
+        with open(file_path, "rb") as json_file:
+            return loads_json(json_file.read())
+
+    def _write_document(self, name: str, data: dict):
+        write_json_atomic(path.join(self.course_path, name), data, self.compact)
+
+
+class SqliteCourseStore:
+    """
+    Course data in a single SQLite database in WAL mode. Assignments, variations
+    and example runs are stored in their own tables, with the fields that are not
+    queried kept as JSON. Every write is a transaction, and transaction() can be
+    used to group several writes into one.
+    """
+
+    KIND = STORE_SQLITE
+    compact = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS assignments (
+            assignment_id TEXT PRIMARY KEY,
+            title TEXT,
+            exp_lecture INTEGER,
+            level INTEGER,
+            revision INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS variations (
+            assignment_id TEXT NOT NULL
+                REFERENCES assignments(assignment_id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            variation_id TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (assignment_id, position)
+        );
+        CREATE TABLE IF NOT EXISTS example_runs (
+            assignment_id TEXT NOT NULL,
+            variation_position INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (assignment_id, variation_position, position),
+            FOREIGN KEY (assignment_id, variation_position)
+                REFERENCES variations(assignment_id, position) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS weeks (
+            lecture_no INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sets (
+            set_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, course_path: str):
+        self.course_path = course_path
+        self.db_path = path.join(course_path, SQLITE_FILE)
+        self._lock = RLock()
+        self._depth = 0
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self._SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except Exception:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.execute("COMMIT")
+
+    def assignment_ids(self) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT assignment_id FROM assignments")
+            return [row[0] for row in rows]
+
+    def version(self, a_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision FROM assignments WHERE assignment_id = ?", (a_id,)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError("Assignment {} is not in the course".format(a_id))
+        return row[0]
+
+    def revisions(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT assignment_id, revision FROM assignments")
+            return dict(rows.fetchall())
+
+    def read_assignment(self, a_id: str) -> dict:
+        assignments = self._read_assignments("WHERE assignment_id = ?", (a_id,))
+        if not assignments:
+            raise FileNotFoundError("Assignment {} is not in the course".format(a_id))
+        return assignments[0]
+
+    def read_header(self, a_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM assignments WHERE assignment_id = ?", (a_id,)
+            ).fetchone()
+            if row is None:
+                raise FileNotFoundError(
+                    "Assignment {} is not in the course".format(a_id)
+                )
+            header = json.loads(row[0])
+            header["variations"] = [
+                json.loads(data)
+                for (data,) in self._conn.execute(
+                    "SELECT json_remove(data, '$.instructions') FROM variations "
+                    "WHERE assignment_id = ? ORDER BY position",
+                    (a_id,),
+                )
+            ]
+        return header
+
+    def read_variation_body(self, a_id: str, position: int) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT json_extract(data, '$.instructions') FROM variations "
+                "WHERE assignment_id = ? AND position = ?",
+                (a_id, position),
+            ).fetchone()
+            if row is None:
+                raise FileNotFoundError(
+                    "Variation {} of {} is not in the course".format(position, a_id)
+                )
+            runs = self._conn.execute(
+                "SELECT data FROM example_runs WHERE assignment_id = ? "
+                "AND variation_position = ? ORDER BY position",
+                (a_id, position),
+            )
+            return {
+                "instructions": row[0],
+                "example_runs": [json.loads(data) for (data,) in runs],
+            }
+
+    def iter_assignments(self):
+        yield from self._read_assignments("", ())
+
+    def write_assignment(self, assignment: dict):
+        a_id = assignment["assignment_id"]
+        header = {key: value for key, value in assignment.items() if key != "variations"}
+        with self.transaction():
+            # Deleting the old rows would cascade to the variations, so upsert
+            self._conn.execute(
+                """INSERT INTO assignments
+                (assignment_id, title, exp_lecture, level, revision, data)
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT(assignment_id) DO UPDATE SET
+                title = excluded.title, exp_lecture = excluded.exp_lecture,
+                level = excluded.level, revision = revision + 1, data = excluded.data""",
+                (
+                    a_id,
+                    assignment.get("title"),
+                    _int_or_none(assignment.get("exp_lecture")),
+                    _int_or_none(assignment.get("level")),
+                    json.dumps(header, ensure_ascii=False),
+                ),
+            )
+            self._conn.execute("DELETE FROM variations WHERE assignment_id = ?", (a_id,))
+            for var_pos, var in enumerate(assignment.get("variations", [])):
+                var_data = {
+                    key: value for key, value in var.items() if key != "example_runs"
+                }
+                self._conn.execute(
+                    "INSERT INTO variations VALUES (?, ?, ?, ?)",
+                    (
+                        a_id,
+                        var_pos,
+                        var.get("variation_id"),
+                        json.dumps(var_data, ensure_ascii=False),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT INTO example_runs VALUES (?, ?, ?, ?)",
+                    [
+                        (a_id, var_pos, run_pos, json.dumps(exrun, ensure_ascii=False))
+                        for run_pos, exrun in enumerate(var.get("example_runs", []))
+                    ],
+                )
+
+    def delete_assignment(self, a_id: str):
+        with self.transaction():
+            self._conn.execute("DELETE FROM assignments WHERE assignment_id = ?", (a_id,))
+
+    def read_weeks(self) -> dict | None:
+        with self._lock:
+            weeks = self._read_document("weeks")
+            if weeks is None:
+                return None
+            rows = self._conn.execute("SELECT data FROM weeks ORDER BY lecture_no")
+            weeks["lectures"] = [json.loads(row[0]) for row in rows]
+        return weeks
+
+    def write_weeks(self, weeks: dict):
+        with self.transaction():
+            self._write_document(
+                "weeks", {key: value for key, value in weeks.items() if key != "lectures"}
+            )
+            self._conn.execute("DELETE FROM weeks")
+            self._conn.executemany(
+                "INSERT INTO weeks VALUES (?, ?)",
+                [
+                    (week["lecture_no"], json.dumps(week, ensure_ascii=False))
+                    for week in weeks.get("lectures", [])
+                ],
+            )
+
+    def read_sets(self) -> dict | None:
+        with self._lock:
+            sets = self._read_document("sets")
+            if sets is None:
+                return None
+            rows = self._conn.execute("SELECT data FROM sets ORDER BY set_id")
+            sets["sets"] = [json.loads(row[0]) for row in rows]
+        return sets
+
+    def write_sets(self, sets: dict):
+        with self.transaction():
+            self._write_document(
+                "sets", {key: value for key, value in sets.items() if key != "sets"}
+            )
+            self._conn.execute("DELETE FROM sets")
+            self._conn.executemany(
+                "INSERT INTO sets VALUES (?, ?)",
+                [
+                    (_set["id"], json.dumps(_set, ensure_ascii=False))
+                    for _set in sets.get("sets", [])
+                ],
+            )
+
+    def set_headers(self) -> list:
+        columns = ", ".join("json_extract(data, '$.{}')".format(key) for key in HEADER_KEYS)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT {} FROM sets ORDER BY set_id".format(columns)
+            ).fetchall()
+        return [dict(zip(HEADER_KEYS, row)) for row in rows]
+
+    def read_set(self, set_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sets WHERE set_id = ?", (set_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_set(self, _set: dict) -> int:
+        with self.transaction():
+            info = self._read_document("sets") or {"maxSetID": 0}
+            (last,) = self._conn.execute("SELECT MAX(set_id) FROM sets").fetchone()
+            _set["id"] = max(info["maxSetID"], last or 0) + 1
+            self.write_set(_set)
+        return _set["id"]
+
+    def write_set(self, _set: dict):
+        with self.transaction():
+            info = self._read_document("sets") or {"maxSetID": 0}
+            if _set["id"] > info["maxSetID"]:
+                info["maxSetID"] = _set["id"]
+                self._write_document("sets", info)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sets VALUES (?, ?)",
+                (_set["id"], json.dumps(_set, ensure_ascii=False)),
+            )
+
+    def delete_set(self, set_id: int):
+        with self.transaction():
+            self._conn.execute("DELETE FROM sets WHERE set_id = ?", (set_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _read_assignments(self, where: str, params: tuple) -> list:
+        with self._lock:
+            assignments = {}
+            for a_id, data in self._conn.execute(
+                "SELECT assignment_id, data FROM assignments " + where, params
+            ):
+                assignments[a_id] = json.loads(data)
+                assignments[a_id]["variations"] = []
+            if not assignments:
+                return []
+            ids = tuple(assignments)
+            marks = ",".join("?" * len(ids)) if where else ""
+            id_filter = "WHERE assignment_id IN ({})".format(marks) if where else ""
+            variations = {}
+            for a_id, var_pos, data in self._conn.execute(
+                "SELECT assignment_id, position, data FROM variations {} "
+                "ORDER BY assignment_id, position".format(id_filter),
+                ids if where else (),
+            ):
+                var = json.loads(data)
+                var["example_runs"] = []
+                variations[(a_id, var_pos)] = var
+                assignments[a_id]["variations"].append(var)
+            for a_id, var_pos, data in self._conn.execute(
+                "SELECT assignment_id, variation_position, data FROM example_runs {} "
+                "ORDER BY assignment_id, variation_position, position".format(id_filter),
+                ids if where else (),
+            ):
+                variations[(a_id, var_pos)]["example_runs"].append(json.loads(data))
+        return list(assignments.values())
+
+    def _read_document(self, name: str) -> dict | None:
+        row = self._conn.execute(
+            "SELECT data FROM documents WHERE name = ?", (name,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_document(self, name: str, data: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?)",
+            (name, json.dumps(data, ensure_ascii=False)),
+        )
+
+
+class LazyAssignment(Mapping):
+    """
+    Read-only view of an assignment that is read from the header of a course store.
+    The instructions and example runs of a variation are read when they are first
+    accessed. Use to_dict() to get the full assignment as a dictionary.
+    """
+
+    def __init__(self, store, header: dict):
+        self._header = header
+        self._header["variations"] = [
+            LazyVariation(store, header["assignment_id"], position, var)
+            for position, var in enumerate(header["variations"])
+        ]
+
+    def __getitem__(self, key):
+        return self._header[key]
+
+    def __iter__(self):
+        return iter(self._header)
+
+    def __len__(self):
+        return len(self._header)
+
+    def to_dict(self) -> dict:
+        full = dict(self._header)
+        full["variations"] = [var.to_dict() for var in self._header["variations"]]
+        return full
+
+
+class LazyVariation(Mapping):
+    """
+    Read-only view of a variation whose BODY_KEYS are read from the store on
+    first access.
+    """
+
+    def __init__(self, store, a_id: str, position: int, stub: dict):
+        self._store = store
+        self._a_id = a_id
+        self._position = position
+        self._stub = stub
+        self._body = None
+
+    def __getitem__(self, key):
+        if key in BODY_KEYS:
+            if self._body is None:
+                self._body = self._store.read_variation_body(self._a_id, self._position)
+            return self._body[key]
+        return self._stub[key]
+
+    def __iter__(self):
+        yield from self._stub
+        yield from BODY_KEYS
+
+    def __len__(self):
+        return len(self._stub) + len(BODY_KEYS)
+
+    def to_dict(self) -> dict:
+        full = dict(self._stub)
+        for key in BODY_KEYS:
+            full[key] = self[key]
+        return full
+
+
+def _int_or_none(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def open_store(course_path: str, kind: str = STORE_JSON, compact=False, sharded=False):
+    """
+    Returns the course store of the given kind for a course folder.
+
+    Params:
+    course_path: path to the course folder
+    kind: STORE_JSON or STORE_SQLITE
+    compact: whether JSON files are written without indentation
+    sharded: whether JSON files are in the sharded layout
+    """
+
+    if kind == STORE_SQLITE:
+        return SqliteCourseStore(course_path)
+    return JsonCourseStore(course_path, compact, sharded)
+
+
+def copy_store(source, target) -> int:
+    """
+    Copies all assignments, weeks and assignment sets from one course store to
+    another in a single transaction of the target. Returns the number of
+    assignments copied.
+
+    Params:
+    source: the store to copy from
+    target: the store to copy to
+    """
+
+    count = 0
+    with target.transaction():
+        for assignment in source.iter_assignments():
+            target.write_assignment(assignment)
+            count += 1
+        weeks = source.read_weeks()
+        if weeks is not None:
+            target.write_weeks(weeks)
+        sets = source.read_sets()
+        if sets is not None:
+            target.write_sets(sets)
+
+    logging.info(
+        "Copied %d assignments from %s store to %s store.",
+        count,
+        source.KIND,
+        target.KIND,
+    )
+    return count
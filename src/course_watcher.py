@@ -0,0 +1,312 @@
+"""
+Mímir Course Watcher
+
+Watches the folder of the open course for changes made by other instances of
+Mímir, for example when several teachers use the same course from a network
+share. Changed files are mapped to the assignment, weeks, sets or course info
+they hold and reported to a callback. inotify is used on local Linux
+filesystems. Elsewhere the folder is polled, as inotify does not see changes
+that other machines make on a network filesystem.
+"""
+
+# pylint: disable=import-error
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+from os import path
+from threading import Event, Thread
+
+from src.common import SHARD_LEVELS, SHARD_WIDTH
+
+CHANGE_ASSIGNMENT = "assignment"
+CHANGE_WEEKS = "weeks"
+CHANGE_SETS = "sets"
+CHANGE_COURSE_INFO = "course_info"
+CHANGE_DATABASE = "database"
+# Changes were lost, everything has to be checked
+CHANGE_ALL = "all"
+
+WATCH_INOTIFY = "inotify"
+WATCH_POLLING = "polling"
+
+_FILES = {
+    "course_info.mcif": CHANGE_COURSE_INFO,
+    "weeks.json": CHANGE_WEEKS,
+    "assignment_sets.json": CHANGE_SETS,
+    "assignment_sets.journal": CHANGE_SETS,
+    "course.db": CHANGE_DATABASE,
+    "course.db-wal": CHANGE_DATABASE,
+}
+_NETWORK_FILESYSTEMS = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "afs",
+    "ceph",
+    "glusterfs",
+    "davfs",
+    "fuse.sshfs",
+    "fuse.rclone",
+}
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+# SQLite keeps its files open, so writes to them are only seen as modifications
+_IN_MASK = (
+    _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+_EVENT = struct.Struct("iIII")
+
+
+def classify(rel_path: str) -> tuple | None:
+    """
+    Returns the change that a changed file means as a (kind, assignment ID)
+    tuple, or None if the file does not matter. The ID is None for other kinds
+    than CHANGE_ASSIGNMENT.
+
+    Params:
+    rel_path: path of the file relative to the course folder
+    """
+
+    parts = rel_path.replace("\\", "/").split("/")
+    name = parts[-1]
+    # Temporary files of atomic writes
+    if name.startswith(".") or name.endswith(".tmp"):
+        return None
+    if len(parts) == 1:
+        kind = _FILES.get(name)
+        return (kind, None) if kind else None
+    if parts[0] != "metadata":
+        return None
+    rest = parts[1:]
+    # Shard folders of the sharded layout, as in metadata/ab/cd/<id>.json
+    while len(rest) > 1 and _is_shard(rest[0]):
+        rest = rest[1:]
+    if rest[0].endswith(".json"):
+        return (CHANGE_ASSIGNMENT, rest[0][:-5])
+    if _is_shard(rest[0]):
+        return None
+    # Variation bodies are in metadata/<id>/
+    return (CHANGE_ASSIGNMENT, rest[0])
+
+
+class CourseWatcher:
+    """
+    Background watcher of a course folder. The callback is called on the watcher
+    thread with a set of the changes of classify, at most every interval seconds.
+    """
+
+    def __init__(self, course_path: str, callback, interval=2.0, kind=None):
+        self.course_path = course_path
+        self.interval = interval
+        self.kind = kind or _default_kind(course_path)
+        self._callback = callback
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logging.info("Watching %s for changes (%s).", self.course_path, self.kind)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        if self.kind == WATCH_INOTIFY:
+            try:
+                self._run_inotify()
+                return
+            except OSError:
+                logging.exception("inotify is not available, polling instead.")
+                self.kind = WATCH_POLLING
+        self._run_polling()
+
+    def _report(self, changes: set):
+        if not changes:
+            return
+        logging.debug("Course folder changes: %s", changes)
+        try:
+            self._callback(changes)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Unable to handle course folder changes!")
+
+    def _run_polling(self):
+        snapshot = self._scan()
+        while not self._stop.wait(self.interval):
+            current = self._scan()
+            changes = {
+                classify(rel_path)
+                for rel_path in set(snapshot) | set(current)
+                if snapshot.get(rel_path) != current.get(rel_path)
+            }
+            changes.discard(None)
+            snapshot = current
+            self._report(changes)
+
+    def _scan(self) -> dict:
+        """
+        Returns the mtime and size of the files that classify knows about. For
+        the variation folders of assignments, the mtime of the folder is used,
+        as replacing a file in it changes it. Shard folders are looked into.
+        """
+
+        found = {}
+        for name in _FILES:
+            _add_stat(found, self.course_path, name)
+        self._scan_folder(path.join(self.course_path, "metadata"), "metadata", found, 0)
+        return found
+
+    def _scan_folder(self, folder: str, rel_dir: str, found: dict, depth: int):
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            rel_path = rel_dir + "/" + entry.name
+            try:
+                if depth < SHARD_LEVELS and _is_shard(entry.name) and entry.is_dir():
+                    self._scan_folder(entry.path, rel_path, found, depth + 1)
+                    continue
+                info = entry.stat()
+            except FileNotFoundError:
+                continue
+            found[rel_path] = (info.st_mtime_ns, info.st_size)
+
+    def _run_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            watches = {}
+
+            def watch(rel_dir: str):
+                full = path.join(self.course_path, rel_dir)
+                wd = libc.inotify_add_watch(fd, os.fsencode(full), _IN_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), "inotify_add_watch failed", full)
+                watches[wd] = rel_dir
+
+            watch("")
+            metadata_path = path.join(self.course_path, "metadata")
+            if path.isdir(metadata_path):
+                # Every folder under metadata: shard folders and variation folders
+                for root, _, _ in os.walk(metadata_path):
+                    watch(path.relpath(root, self.course_path).replace(os.sep, "/"))
+
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if not readable:
+                    continue
+                changes = set()
+                # Collect what arrives in a short while into one report
+                while readable:
+                    changes |= self._read_events(fd, watches, watch)
+                    readable, _, _ = select.select([fd], [], [], 0.2)
+                changes.discard(None)
+                self._report(changes)
+        finally:
+            os.close(fd)
+
+    def _read_events(self, fd: int, watches: dict, watch) -> set:
+        changes = set()
+        try:
+            raw = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return changes
+        offset = 0
+        while offset < len(raw):
+            wd, mask, _, length = _EVENT.unpack_from(raw, offset)
+            offset += _EVENT.size
+            name = raw[offset : offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                changes.add((CHANGE_ALL, None))
+                continue
+            rel_dir = watches.get(wd)
+            if rel_dir is None:
+                continue
+            rel_path = rel_dir + "/" + name if rel_dir else name
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                if rel_path == "metadata" or rel_dir.startswith("metadata"):
+                    changes |= self._watch_new(rel_path, watch)
+            changes.add(classify(rel_path))
+        return changes
+
+    def _watch_new(self, rel_dir: str, watch) -> set:
+        """
+        Watches a new folder and the folders in it. Files may have been written
+        into them before the watches were added, so they are reported as changed.
+        """
+
+        changes = set()
+        for root, _, files in os.walk(path.join(self.course_path, rel_dir)):
+            rel_root = path.relpath(root, self.course_path).replace(os.sep, "/")
+            try:
+                watch(rel_root)
+            except OSError:
+                logging.warning("Unable to watch %s.", rel_root)
+            changes.update(classify(rel_root + "/" + name) for name in files)
+        return changes
+
+
+def _is_shard(name: str) -> bool:
+    return len(name) == SHARD_WIDTH
+
+
+def _add_stat(found: dict, folder: str, name: str):
+    try:
+        info = os.stat(path.join(folder, name))
+    except FileNotFoundError:
+        return
+    found[name] = (info.st_mtime_ns, info.st_size)
+
+
+def _default_kind(course_path: str) -> str:
+    """
+    Returns WATCH_INOTIFY if the course is on a local Linux filesystem.
+    """
+
+    if not sys.platform.startswith("linux"):
+        return WATCH_POLLING
+    return WATCH_POLLING if _filesystem(course_path) in _NETWORK_FILESYSTEMS else WATCH_INOTIFY
+
+
+def _filesystem(folder: str) -> str | None:
+    """
+    Returns the type of the filesystem that folder is on, from /proc/mounts.
+    """
+
+    folder = path.realpath(folder)
+    best = ("", None)
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                inside = folder == mount_point or folder.startswith(
+                    mount_point.rstrip("/") + "/"
+                )
+                if inside and len(mount_point) >= len(best[0]):
+                    best = (mount_point, fields[2])
+    except OSError:
+        return None
+    return best[1]
@@ -59,3 +59,16 @@ class IndexNotOpenError(Exception):
     def __init__(self, msg="No index has been opened") -> None:
         self.message = msg
         super().__init__(self.message)
+
+
+class IndexNotCreatedError(Exception):
+    """
+    Raised if the index could not be created when it is being rebuilt.
+
+    Params:
+    msg: Message to display with exception
+    """
+
+    def __init__(self, msg="Index could not be created") -> None:
+        self.message = msg
+        super().__init__(self.message)
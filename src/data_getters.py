@@ -8,14 +8,22 @@ Functions that get data from somewhere
 
 import logging
 import json
+import sqlite3
 
 from os import path
+from functools import lru_cache
 from dearpygui.dearpygui import get_value
+from whoosh.query import And, Every, NumericRange, Term
+from whoosh.sorting import FieldFacet, Count
 
 from src.constants import (
     ENV,
     RECENTS,
     OPEN_IX,
+    INDEX_QUEUE,
+    ASSIGNMENT_CACHE,
+    OPEN_STORE,
+    EXPANSION_CHAINS,
     OPEN_COURSE_PATH,
     COURSE_INFO,
     DISPLAY_TEXTS,
@@ -23,29 +31,81 @@ from src.constants import (
     WEEK_DATA,
 )
 from src.common import resource_path
+from src.course_store import JsonCourseStore, LazyAssignment, STORE_JSON, open_store
 
 
 def get_assignment_json(json_path: str) -> dict | None:
     """
     Read JSON and use the data to get example code from its file.
     Returns a dictionary with all the assignment data or None if an exception
-    is raised.
+    is raised. Parsed assignments are kept in ASSIGNMENT_CACHE until they change,
+    and the returned dictionary is always a copy that is safe to modify.
 
     Params:
-    json_path: path to the json file to be read
+    json_path: path to the metadata file of the assignment. When the course is
+    stored in another backend, only the assignment ID in the file name is used
     """
 
+    a_id = path.splitext(path.basename(json_path))[0]
+    if OPEN_COURSE_PATH.get():
+        store = get_store()
+    else:
+        store = JsonCourseStore(path.dirname(path.dirname(json_path)))
     try:
-        with open(json_path, "r", encoding="UTF-8") as json_file:
-            raw_data = json_file.read()
-            json_data = json.loads(raw_data)
-    except OSError:
+        version = store.version(a_id)
+        json_data = ASSIGNMENT_CACHE.get(a_id, version)
+        if json_data is not None:
+            return json_data
+        json_data = store.read_assignment(a_id)
+    except (OSError, sqlite3.Error):
         logging.exception("Unable to read JSON file!")
         return None
     else:
+        ASSIGNMENT_CACHE.put(a_id, version, json_data)
         return json_data
 
 
+def get_assignment_lazy(json_path: str) -> LazyAssignment | None:
+    """
+    Reads only the header of an assignment: everything but the instructions and
+    example runs of the variations, which are read when accessed. Use this when
+    the variations themselves are not needed. Returns a read-only LazyAssignment,
+    or None if the assignment cannot be read.
+
+    Params:
+    json_path: path to the metadata file of the assignment, see get_assignment_json
+    """
+
+    a_id = path.splitext(path.basename(json_path))[0]
+    if OPEN_COURSE_PATH.get():
+        store = get_store()
+    else:
+        store = JsonCourseStore(path.dirname(path.dirname(json_path)))
+    try:
+        return LazyAssignment(store, store.read_header(a_id))
+    except (OSError, ValueError, sqlite3.Error):
+        logging.exception("Unable to read assignment header!")
+        return None
+
+
+def get_store():
+    """
+    Returns the storage backend of the open course. Opens it based on the course
+    info if it is not open yet.
+    """
+
+    if OPEN_STORE.get() is None:
+        OPEN_STORE.set(
+            open_store(
+                OPEN_COURSE_PATH.get(),
+                COURSE_INFO.get("storage", STORE_JSON),
+                COURSE_INFO.get("compact_json", False),
+                OPEN_COURSE_PATH.is_sharded(),
+            )
+        )
+    return OPEN_STORE.get()
+
+
 def get_assignment_code(data_path: str, a_id: str) -> str | None:
     """
     Read code file and return its contents, excluding the ID line. Note that function
@@ -59,7 +119,7 @@ def get_assignment_code(data_path: str, a_id: str) -> str | None:
 
     try:
         full_path = path.join(
-            OPEN_COURSE_PATH.get_subdir(assignment_data=True), a_id, data_path
+            OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=a_id), data_path
         )
         with open(full_path, "r", encoding="UTF-8") as code_file:
             code = code_file.read()
@@ -75,7 +135,7 @@ def read_datafile(filename: str, a_id: str) -> str | None:
     """
     try:
         full_path = path.join(
-            OPEN_COURSE_PATH.get_subdir(assignment_data=True), a_id, filename
+            OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=a_id), filename
         )
         with open(full_path, "r", encoding="UTF-8") as _file:
             data = _file.read()
@@ -188,23 +248,135 @@ def get_recents(**args) -> None:
 def get_all_indexed_assignments() -> list:
     """Returns a list of all the documents in the index."""
 
-    ix = OPEN_IX.get()
-
+    INDEX_QUEUE.flush()
     docs = []
-    with ix.searcher() as srcr:
+    with OPEN_IX.searcher() as srcr:
         _all = srcr.documents()
         docs = list(_all)
 
     return docs
 
 
-def get_number_of_docs() -> int:
-    """Returns the number of documents in the course index."""
+def get_candidates(
+    week: int | None = None,
+    position: int | None = None,
+    min_level: int | None = None,
+    max_level: int | None = None,
+    expanding: bool | None = None,
+) -> list:
+    """
+    Returns a list of the indexed assignments that match the given filters.
+    Filtering is done with index queries. Filters that are None are not applied.
+
+    Params:
+    week: the lecture week of the assignment
+    position: an assignment position the assignment can be placed in
+    min_level: the lowest level to include
+    max_level: the highest level to include
+    expanding: whether the assignment is expanding
+    """
+
+    terms = []
+    if week is not None:
+        terms.append(Term("week", week))
+    if position is not None:
+        terms.append(Term("positions", position))
+    if min_level is not None or max_level is not None:
+        terms.append(NumericRange("level", min_level, max_level))
+    if expanding is not None:
+        terms.append(Term("is_expanding", expanding))
+
+    INDEX_QUEUE.flush()
+    docs = []
+    with OPEN_IX.searcher() as srcr:
+        results = srcr.search(And(terms) if terms else Every(), limit=None, scored=False)
+        docs = [hit.fields() for hit in results]
+
+    return docs
+
+
+def get_indexed_documents(a_ids: list) -> list:
+    """
+    Returns the stored fields of the indexed assignments with the given ids, in
+    the same order. Ids that are no longer in the index are skipped.
+
+    Params:
+    a_ids: list of assignment ids
+    """
+
+    docs = []
+    with OPEN_IX.searcher() as srcr:
+        for a_id in a_ids:
+            doc = srcr.document(a_id=a_id)
+            if doc:
+                docs.append(doc)
+
+    return docs
+
+
+def get_chain_graph():
+    """
+    Returns the expansion chain graph of the open course, see ChainGraph. The
+    graph is built from the index the first time it is needed after the index
+    has been opened.
+    """
 
     ix = OPEN_IX.get()
+    if ix and not EXPANSION_CHAINS.is_loaded(ix):
+        INDEX_QUEUE.flush()
+        with OPEN_IX.searcher() as srcr:
+            EXPANSION_CHAINS.load(
+                (
+                    (doc["a_id"], doc.get("previous"), doc.get("next"))
+                    for doc in srcr.documents()
+                ),
+                ix,
+            )
+    return EXPANSION_CHAINS
+
+
+def get_facet_counts() -> dict:
+    """
+    Returns the number of indexed assignments per tag, level and week as
+    {"tags": {tag: count}, "level": {level: count}, "week": {week: count}}.
+    The counts are computed in the index and cached until the index changes.
+    """
 
-    if ix:
-        with ix.searcher() as sr:
+    if not OPEN_IX.get():
+        return {"tags": {}, "level": {}, "week": {}}
+    counts = _facet_counts(OPEN_IX.generation())
+    return {name: dict(values) for name, values in counts.items()}
+
+
+@lru_cache(maxsize=1)
+def _facet_counts(generation: int) -> dict:
+    """
+    Counts the facets of all documents in one search. Cached per index generation.
+
+    Params:
+    generation: the generation of the open index
+    """
+
+    facets = {
+        "tags": FieldFacet("tags", allow_overlap=True),
+        "level": FieldFacet("level"),
+        "week": FieldFacet("week"),
+    }
+    with OPEN_IX.searcher() as srcr:
+        results = srcr.search(
+            Every(), groupedby=facets, maptype=Count, limit=None, scored=False
+        )
+        counts = {name: results.groups(name) for name in facets}
+
+    logging.debug("Facet counts for index generation %d: %s", generation, counts)
+    return counts
+
+
+def get_number_of_docs() -> int:
+    """Returns the number of documents in the course index."""
+
+    if OPEN_IX.get():
+        with OPEN_IX.searcher() as sr:
             no = sr.doc_count()
         return no
     return 0
@@ -218,22 +390,19 @@ def get_week_data() -> dict | None:
     if WEEK_DATA.get():
         return WEEK_DATA.get()
     weeks = None
-    f_path = path.join(OPEN_COURSE_PATH.get(), "weeks.json")
 
     try:
-        with open(f_path, "r", encoding="utf-8") as f:
-            data = f.read()
-            weeks = json.loads(data)
-            WEEK_DATA.set(weeks)
-    except FileNotFoundError:
-        weeks = {
-            "course_id": COURSE_INFO["course_id"],
-            "course_title": COURSE_INFO["course_title"],
-            "lectures": [],
-        }
-        WEEK_DATA.set(weeks)
-    except OSError:
+        weeks = get_store().read_weeks()
+    except (OSError, ValueError, sqlite3.Error):
         logging.exception("Error when reading week data.")
+    else:
+        if weeks is None:
+            weeks = {
+                "course_id": COURSE_INFO["course_id"],
+                "course_title": COURSE_INFO["course_title"],
+                "lectures": [],
+            }
+        WEEK_DATA.set(weeks)
 
     logging.debug("Week data is: %s", weeks)
     return weeks
@@ -273,19 +442,10 @@ def get_header_page(pagenum: int, data: list, perpage=15, week=False) -> list:
 
     headers = []
     if not week:
-        data.sort(key=lambda a: a["position"])
+        data.sort(key=lambda a: (a["week"], a["positions"]))
         _slice = data[start:stop]
         for item in _slice:
-            header = ""
-            header += (
-                DISPLAY_TEXTS["tex_lecture_letter"][LANGUAGE.get()]
-                + item["position"].split(";")[0]
-            )
-            header += DISPLAY_TEXTS["tex_assignment_letter"][LANGUAGE.get()] + "("
-            header += item["position"].split(";")[1] + ")"
-            header += " - " + item["title"]
-            headers.append(header)
-        headers.sort(key=lambda a: a.split(" - ")[0])
+            headers.append(get_assignment_header(item))
     else:
         data.sort(key=lambda a: a["lecture_no"])
         _slice = data[start:stop]
@@ -305,6 +465,22 @@ def get_header_page(pagenum: int, data: list, perpage=15, week=False) -> list:
     return headers
 
 
+def get_assignment_header(item: dict) -> str:
+    """
+    Returns the browse listbox header of an indexed assignment.
+
+    Params:
+    item: the stored fields of the assignment in the index
+    """
+
+    header = ""
+    header += DISPLAY_TEXTS["tex_lecture_letter"][LANGUAGE.get()] + str(item["week"])
+    header += DISPLAY_TEXTS["tex_assignment_letter"][LANGUAGE.get()] + "("
+    header += ",".join([str(pos) for pos in item["positions"]]) + ")"
+    header += " - " + item["title"]
+    return header
+
+
 def get_variation_index(vars: list, _id: str) -> int | None:
     """
     Return the position of the variation that has the letter as its ID.
@@ -355,25 +531,6 @@ def get_period_default(period: int) -> str:
     return DISPLAY_TEXTS[key][LANGUAGE.get()]
 
 
-def get_saved_assignment_sets() -> dict:
-    """
-    Get saved assignment sets from disk
-    """
-
-    _path = path.join(OPEN_COURSE_PATH.get(), "assignment_sets.json")
-    if not path.exists(_path):
-        result = {"maxSetID": 0, "sets": []}
-    else:
-        try:
-            with open(_path, "r", encoding="utf-8") as f:
-                result = json.loads(f.read())
-        except OSError:
-            logging.exception("Could not load saved assignment sets!")
-            result = []
-
-    return result
-
-
 def get_result_sets(set_id: int | None = None):
     """
     Return a list of result sets
@@ -382,30 +539,32 @@ def get_result_sets(set_id: int | None = None):
     set_id: Defaults to None, giving only headers. With non-zero positive ID
     will try to find and return the set with the id. Returns an empty list if set cannot be found.
     """
-    data = get_saved_assignment_sets()
-    if not set_id:
-        headers = []
-        for _set in data["sets"]:
-            t = "{} - ".format(_set["id"])
-            t += "{}/{}".format(_set["year"], _set["period"])
-            t += " - {} - ".format(
-                DISPLAY_TEXTS["ui_week"][LANGUAGE.get()]
-                if _set["type"] == "week"
-                else DISPLAY_TEXTS["ui_full"][LANGUAGE.get()]
-            )
-            t += (
-                _set["name"]
-                if _set["name"]
-                else "[" + DISPLAY_TEXTS["ui_no_name"][LANGUAGE.get()] + "]"
-            )
-            headers.append(t)
-        return headers
-    else:
-        for _set in data["sets"]:
-            if _set["id"] == set_id:
-                return _set
+
+    try:
+        if set_id:
+            return get_store().read_set(set_id) or []
+        sets = get_store().set_headers()
+    except (OSError, ValueError, sqlite3.Error):
+        logging.exception("Could not load saved assignment sets!")
         return []
 
+    headers = []
+    for _set in sets:
+        t = "{} - ".format(_set["id"])
+        t += "{}/{}".format(_set["year"], _set["period"])
+        t += " - {} - ".format(
+            DISPLAY_TEXTS["ui_week"][LANGUAGE.get()]
+            if _set["type"] == "week"
+            else DISPLAY_TEXTS["ui_full"][LANGUAGE.get()]
+        )
+        t += (
+            _set["name"]
+            if _set["name"]
+            else "[" + DISPLAY_TEXTS["ui_no_name"][LANGUAGE.get()] + "]"
+        )
+        headers.append(t)
+    return headers
+
 
 def get_one_week(week_n) -> dict | None:
     """
@@ -7,43 +7,101 @@ Functions for processing data
 # pylint: disable=import-error, unused-argument, consider-using-f-string, invalid-name
 import json
 import logging
-from os import path, mkdir, getcwd, remove
+import re
+import sqlite3
+from os import path, mkdir, makedirs, getcwd, remove
 from ntpath import split, basename
 from tkinter.filedialog import askdirectory
 from hashlib import sha256
-from shutil import copy2, rmtree
+from copy import deepcopy
+from shutil import rmtree
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+from itertools import repeat
 
 from whoosh import index
-from whoosh.qparser import QueryParser
-from dearpygui.dearpygui import get_value, configure_item
+from whoosh.qparser import MultifieldParser, FuzzyTermPlugin
+from whoosh.highlight import ContextFragmenter, UppercaseFormatter
+from dearpygui.dearpygui import (
+    configure_item,
+    does_item_exist,
+    get_item_user_data,
+    get_value,
+)
 
 from src.constants import (
     ENV,
     DISPLAY_TEXTS,
     LANGUAGE,
     OPEN_IX,
+    INDEX_QUEUE,
     COURSE_INFO,
     OPEN_COURSE_PATH,
     UI_ITEM_TAGS,
     RECENTS,
     INDEX_SCHEMA,
+    INDEX_SCHEMA_VERSION,
     WEEK_DATA,
     LATEX_SYMBOLS,
+    IMPORT_PROGRESS,
+    SEARCH_FIELD_BOOSTS,
+    SEARCH_QUEUE,
+    SUMMARY_TAG_COUNT,
+    ASSIGNMENT_CACHE,
+    OPEN_STORE,
+    EXPANSION_CHAINS,
+    COURSE_WATCHER,
+    UI_TASKS,
+    SET_LISTBOX_DATA,
 )
-from src.custom_errors import IndexExistsError, IndexNotOpenError
+from src.custom_errors import IndexExistsError, IndexNotCreatedError, IndexNotOpenError
 from src.data_getters import (
     get_pos_convert,
     read_datafile,
     get_assignment_code,
     get_week_data,
     get_number_of_docs,
+    get_facet_counts,
+    get_chain_graph,
+    get_store,
     get_assignment_json,
-    get_saved_assignment_sets,
-    get_result_sets
+    get_result_sets,
+    get_assignment_header,
+)
+from src.index_tools import index_fields, read_index_document
+from src.course_store import (
+    STORE_JSON,
+    STORE_SQLITE,
+    LAYOUT_FLAT,
+    LAYOUT_SHARDED,
+    JsonCourseStore,
+    open_store,
+    copy_store,
 )
 from src.popups import popup_ok
+from src.common import write_json_atomic, move_assignment_layout
+from src.blob_store import BlobStore, BLOB_DIR, MANIFEST_DIR
+from src.course_watcher import (
+    CourseWatcher,
+    CHANGE_ALL,
+    CHANGE_ASSIGNMENT,
+    CHANGE_COURSE_INFO,
+    CHANGE_DATABASE,
+    CHANGE_SETS,
+    CHANGE_WEEKS,
+)
 from src.window_helper import close_window
 
+# Course info keys that older course info files may not have
+_OPTIONAL_INFO_KEYS = (
+    "index_version",
+    "storage",
+    "compact_json",
+    "watch_changes",
+    "layout",
+    "layout_migration",
+)
+
 ########################################
 
 
@@ -51,7 +109,8 @@ def create_index(force=False, **args):
     """
     Creates an assignment index from schema that is used to store paths to all available
     assingments.
-    Sets the created index as a global constant.
+    Sets the created index as a global constant. Returns -1 if the index could not
+    be created, in which case the old index is left open.
 
     Params:
     force: Force the creation of the index if it already exists.
@@ -65,13 +124,15 @@ def create_index(force=False, **args):
     if index.exists_in(ix_path, name) and not force:
         raise IndexExistsError("Index '%s' already exists in '%s'" % (name, ix_path))
 
+    INDEX_QUEUE.flush()
     try:
         ix = index.create_in(ix_path, INDEX_SCHEMA, name)
     except OSError:
         logging.exception("Unable to save index file.")
-    else:
-        OPEN_IX.set(ix)
-        logging.debug("Index created and set.")
+        return -1
+    OPEN_IX.set(ix)
+    logging.debug("Index created and set.")
+    return 0
 
 
 def open_index(**args):
@@ -81,6 +142,7 @@ def open_index(**args):
 
     ix_path = OPEN_COURSE_PATH.get_subdir(index=True)
     name = COURSE_INFO["course_id"]
+    INDEX_QUEUE.flush()
     try:
         ix = index.open_dir(ix_path, name)
     except (OSError, index.EmptyIndexError):
@@ -90,38 +152,514 @@ def open_index(**args):
     else:
         OPEN_IX.set(ix)
         logging.debug("Index set.")
-        return 0
+
+    if _is_index_outdated(ix):
+        logging.info(
+            "Index schema is older than version %d, migrating.", INDEX_SCHEMA_VERSION
+        )
+        migrate_index()
+    return 0
+
+
+def _is_index_outdated(ix) -> bool:
+    """
+    Returns True if the index was created with an older schema than INDEX_SCHEMA.
+
+    Params:
+    ix: the index to check
+    """
+
+    if COURSE_INFO.get("index_version", 1) < INDEX_SCHEMA_VERSION:
+        return True
+    if ix.schema.names() != INDEX_SCHEMA.names():
+        return True
+    for name in INDEX_SCHEMA.names():
+        if type(ix.schema[name]) is not type(INDEX_SCHEMA[name]):
+            return True
+    return False
+
+
+def migrate_index():
+    """
+    Recreates the course index with the current schema from the metadata files
+    and marks the course as migrated in the course info file. If the index cannot
+    be recreated, the old index is kept and migrated again the next time.
+    """
+
+    try:
+        count = rebuild_index()
+    except IndexNotCreatedError:
+        popup_ok(DISPLAY_TEXTS["ui_error_index_rebuild"][LANGUAGE.get()])
+        return
+
+    COURSE_INFO["index_version"] = INDEX_SCHEMA_VERSION
+    _save_course_file()
+    logging.info("Index migrated, %d assignments reindexed.", count)
 
 
-def add_assignment_to_index(data: dict, expanding: bool):
+def add_assignment_to_index(data: dict, expanding: bool, callback=None):
     """
-    Adds given assignements to the index currently open.
+    Adds given assignements to the index currently open. The change is written
+    in the background by INDEX_QUEUE.
 
     Params:
     data: a dictionary containing assignment data
     expanding: bool whether the assignment is expanding
+    callback: optional function to call with None after the change has been
+    committed, or with the error if writing it failed, see IndexQueue
+    """
+
+    if not OPEN_IX.get():
+        raise IndexNotOpenError
+
+    _queue_index_update(data, expanding, callback)
+
+
+def import_assignments(
+    assignments, batch_size=100, procs=1, limitmb=128, progress=None, write_files=True
+) -> int:
+    """
+    Imports several assignments at once. Writes the metadata file of each assignment
+    and adds all of them to the index with a single writer that is committed once at
+    the end. Files referenced by the assignments are expected to already be in the
+    assignment data folder. The imported assignments are added to the next lists
+    of their previous parts, like save_next does. Progress can be polled from
+    IMPORT_PROGRESS. Returns the number of assignments imported.
+
+    Params:
+    assignments: an iterable of assignment dicts
+    write_files: whether to write the metadata files. If False, the assignments are
+    only indexed
+    batch_size: how many assignments are handled between progress updates. Also used
+    as the job size of the sub-writers when procs > 1
+    procs: number of processes the index writer uses
+    limitmb: memory limit of the index writer (per process) in megabytes
+    progress: optional callable that is given the number of assignments imported so far
     """
 
     if not OPEN_IX.get():
         raise IndexNotOpenError
     ix = OPEN_IX.get()
 
-    positions = f"{data['exp_lecture']};"
-    positions += ",".join([str(item) for item in data["exp_assignment_no"]])
-    tags = ",".join(data["tags"])
-    json_path = data["assignment_id"]  # TODO legacy, should be removed
-
-    writer = ix.writer()
-    writer.add_document(
-        a_id=data["assignment_id"],
-        position=positions,
-        tags=tags,
-        title=data["title"],
-        json_path=json_path,
-        is_expanding=expanding,
-        level=str(data["level"]),
+    if not path.exists(OPEN_COURSE_PATH.get_subdir(metadata=True)):
+        mkdir(OPEN_COURSE_PATH.get_subdir(metadata=True))
+
+    INDEX_QUEUE.flush()
+    if procs > 1:
+        # multisegment avoids merging sub-writer runs, which fails in Whoosh when
+        # a sub-writer receives no documents
+        writer = ix.writer(
+            procs=procs, batchsize=batch_size, limitmb=limitmb, multisegment=True
+        )
+    else:
+        writer = ix.writer(limitmb=limitmb)
+
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
+    sharded = OPEN_COURSE_PATH.is_sharded()
+    done = 0
+    links = {}
+    IMPORT_PROGRESS.start()
+    try:
+        with get_store().transaction():
+            for assignment in assignments:
+                if write_files:
+                    assignment["course_id"] = COURSE_INFO["course_id"]
+                    assignment["course_title"] = COURSE_INFO["course_title"]
+                    if not assignment.get("assignment_id"):
+                        assignment["assignment_id"] = _hash_assignment(assignment)
+                    _write_assignment(assignment)
+                    for last in assignment["previous"]:
+                        links.setdefault(last, []).append(assignment["assignment_id"])
+                writer.update_document(
+                    **index_fields(
+                        assignment, bool(assignment["previous"]), data_path, sharded
+                    )
+                )
+                done += 1
+                if done % batch_size == 0:
+                    IMPORT_PROGRESS.set(done)
+                    if progress:
+                        progress(done)
+        OPEN_IX.commit(writer)
+        EXPANSION_CHAINS.clear()
+    except Exception:
+        writer.cancel()
+        IMPORT_PROGRESS.stop()
+        logging.exception("Error while importing assignments!")
+        raise
+
+    try:
+        _link_previous_parts(links, data_path, sharded)
+    except Exception:
+        IMPORT_PROGRESS.stop()
+        logging.exception("Error while linking imported assignments!")
+        raise
+    IMPORT_PROGRESS.set(done)
+    IMPORT_PROGRESS.stop()
+    if progress and done % batch_size != 0:
+        progress(done)
+    logging.info("Imported %d assignments to file and index.", done)
+    return done
+
+
+def _link_previous_parts(links: dict, data_path: str, sharded: bool):
+    """
+    Adds imported assignments to the next lists of their previous parts and updates
+    the index documents of the changed parts. This is done after the import has
+    been committed, as a previous part may have been imported in the same batch and
+    indexed by a sub-writer already.
+
+    Params:
+    links: the IDs of the imported assignments by the ID of their previous part
+    data_path: path to the assignment data folder of the course, see index_fields
+    sharded: whether the course is in the sharded layout
+    """
+
+    if not links:
+        return
+    store = get_store()
+    changed = []
+    with store.transaction():
+        for last, next_ids in links.items():
+            try:
+                prev = store.read_assignment(last)
+            except FileNotFoundError:
+                logging.warning(
+                    "Previous part %s of imported assignments not found.", last
+                )
+                continue
+            added = [a_id for a_id in next_ids if a_id not in (prev["next"] or [])]
+            if not added:
+                continue
+            prev["next"] = (prev["next"] or []) + added
+            _write_assignment(prev)
+            changed.append(prev)
+    if not changed:
+        return
+
+    writer = OPEN_IX.get().writer()
+    try:
+        for prev in changed:
+            writer.update_document(
+                **index_fields(prev, bool(prev["previous"]), data_path, sharded)
+            )
+        OPEN_IX.commit(writer)
+    except Exception:
+        writer.cancel()
+        raise
+    EXPANSION_CHAINS.clear()
+    logging.info("Linked %d previous parts to imported assignments.", len(changed))
+
+
+def read_metadata_documents(procs=None) -> dict:
+    """
+    Parses all assignment metadata files of the course into index documents in a
+    process pool. Returns a dict of the documents with assignment IDs as keys.
+    Files that cannot be read are included with None, so that they are not taken
+    for deleted assignments. Courses in a database are read in one query instead.
+
+    Params:
+    procs: number of worker processes, defaults to the number of CPUs
+    """
+
+    store = get_store()
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
+    sharded = OPEN_COURSE_PATH.is_sharded()
+    if store.KIND != STORE_JSON:
+        docs = (
+            index_fields(item, bool(item["previous"]), data_path, sharded)
+            for item in store.iter_assignments()
+        )
+        return {doc["a_id"]: doc for doc in docs}
+
+    files = store.assignment_paths()
+    if not files:
+        return {}
+    procs = procs or cpu_count()
+    chunksize = max(1, len(files) // (procs * 4))
+    with ProcessPoolExecutor(max_workers=procs) as executor:
+        docs = executor.map(
+            read_index_document,
+            files,
+            repeat(data_path),
+            repeat(sharded),
+            chunksize=chunksize,
+        )
+        return {
+            doc["a_id"] if doc else path.basename(f_path)[:-5]: doc
+            for f_path, doc in zip(files, docs)
+        }
+
+
+def check_index(documents: dict | None = None) -> dict:
+    """
+    Compares the open index with the metadata files of the course.
+    Returns a dict with lists of orphaned index entries (no metadata file),
+    missing documents (not in index), unreadable metadata files and a dict of
+    mismatched documents with the names of the fields that differ. Index entries
+    of unreadable files are neither orphaned nor mismatched.
+
+    Params:
+    documents: the metadata documents from read_metadata_documents. Read if not given.
+    """
+
+    if not OPEN_IX.get():
+        raise IndexNotOpenError
+    if documents is None:
+        documents = read_metadata_documents()
+
+    INDEX_QUEUE.flush()
+    report = {"orphaned": [], "missing": [], "unreadable": [], "mismatched": {}}
+    indexed = set()
+    with OPEN_IX.searcher() as srcr:
+        for stored in srcr.documents():
+            a_id = stored["a_id"]
+            indexed.add(a_id)
+            if a_id not in documents:
+                report["orphaned"].append(a_id)
+                continue
+            if documents[a_id] is None:
+                continue
+            fields = [
+                key
+                for key, value in documents[a_id].items()
+                if INDEX_SCHEMA[key].stored and stored.get(key) != value
+            ]
+            if fields:
+                report["mismatched"][a_id] = fields
+    for a_id, doc in documents.items():
+        if doc is None:
+            report["unreadable"].append(a_id)
+        elif a_id not in indexed:
+            report["missing"].append(a_id)
+
+    logging.info(
+        "Index check: %d orphaned, %d missing, %d unreadable, %d mismatched.",
+        len(report["orphaned"]),
+        len(report["missing"]),
+        len(report["unreadable"]),
+        len(report["mismatched"]),
     )
-    writer.commit()
+    logging.debug("Index check report: %s", report)
+    return report
+
+
+def rebuild_index(documents: dict | None = None, procs=None) -> int:
+    """
+    Recreates the course index from the metadata files with a single multi-process
+    writer. Returns the number of assignments indexed. The stored fields of the
+    index entries of unreadable metadata files are carried over from the old
+    index, so that the assignments can still be found until their files are fixed.
+    Raises IndexNotCreatedError if the new index could not be created.
+
+    Params:
+    documents: the metadata documents from read_metadata_documents. Read if not given.
+    procs: number of worker processes, defaults to the number of CPUs
+    """
+
+    procs = procs or cpu_count()
+    if documents is None:
+        documents = read_metadata_documents(procs)
+
+    kept = _stored_documents(
+        [a_id for a_id, doc in documents.items() if doc is None]
+    )
+    if create_index(force=True) == -1:
+        raise IndexNotCreatedError
+    ix = OPEN_IX.get()
+    if procs > 1:
+        # multisegment avoids merging sub-writer runs, which fails in Whoosh when
+        # a sub-writer receives no documents
+        writer = ix.writer(procs=procs, multisegment=True)
+    else:
+        writer = ix.writer()
+    try:
+        for doc in documents.values():
+            if doc:
+                writer.add_document(**doc)
+        for doc in kept:
+            writer.add_document(**doc)
+        OPEN_IX.commit(writer)
+    except Exception:
+        writer.cancel()
+        logging.exception("Error while rebuilding index!")
+        raise
+    # The rebuilt index has the current metadata of every assignment
+    INDEX_QUEUE.discard_failed()
+
+    count = len(documents) - len([doc for doc in documents.values() if doc is None])
+    count += len(kept)
+    logging.info(
+        "Index rebuilt with %d assignments, %d kept from the old index.",
+        count,
+        len(kept),
+    )
+    return count
+
+
+def _stored_documents(a_ids: list) -> list:
+    """
+    Returns the stored fields of the given assignments in the open index, limited
+    to the fields of INDEX_SCHEMA. Assignments that are not in the index are left
+    out.
+
+    Params:
+    a_ids: the assignment IDs
+    """
+
+    if not a_ids or not OPEN_IX.get():
+        return []
+    names = set(INDEX_SCHEMA.names())
+    INDEX_QUEUE.flush()
+    with OPEN_IX.searcher() as srcr:
+        stored = [srcr.document(a_id=a_id) for a_id in a_ids]
+    return [
+        {key: value for key, value in doc.items() if key in names}
+        for doc in stored
+        if doc
+    ]
+
+
+def rebuild_course_index(**args):
+    """
+    Checks the course index against the metadata files, rebuilds it and
+    shows a report of what was out of sync.
+    """
+
+    if not OPEN_COURSE_PATH.get() or not COURSE_INFO["course_id"]:
+        popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
+        return
+
+    documents = read_metadata_documents()
+    report = check_index(documents)
+    try:
+        count = rebuild_index(documents)
+    except IndexNotCreatedError:
+        popup_ok(DISPLAY_TEXTS["ui_error_index_rebuild"][LANGUAGE.get()])
+        return
+
+    show_index_summary()
+    popup_ok(
+        DISPLAY_TEXTS["ui_index_rebuilt"][LANGUAGE.get()].format(
+            count,
+            len(report["orphaned"]),
+            len(report["missing"]),
+            len(report["mismatched"]),
+            len(report["unreadable"]),
+        )
+    )
+
+
+def convert_course_storage(**args):
+    """
+    Moves the assignments, weeks and assignment sets of the open course to the
+    other storage backend: from JSON files to a single SQLite database or back.
+    The data in the old backend is left in place.
+    """
+
+    if not OPEN_COURSE_PATH.get() or not COURSE_INFO["course_id"]:
+        popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
+        return
+
+    source = get_store()
+    kind = STORE_JSON if source.KIND == STORE_SQLITE else STORE_SQLITE
+    target = open_store(
+        OPEN_COURSE_PATH.get(),
+        kind,
+        COURSE_INFO.get("compact_json", False),
+        OPEN_COURSE_PATH.is_sharded(),
+    )
+    try:
+        count = copy_store(source, target)
+    except (OSError, ValueError, sqlite3.Error):
+        logging.exception("Unable to convert course storage to %s.", kind)
+        target.close()
+        popup_ok(DISPLAY_TEXTS["ui_error_convert_storage"][LANGUAGE.get()])
+        return
+
+    ASSIGNMENT_CACHE.clear()
+    OPEN_STORE.set(target)
+    COURSE_INFO["storage"] = kind
+    _save_course_file()
+    popup_ok(
+        DISPLAY_TEXTS["ui_storage_converted"][LANGUAGE.get()].format(
+            count, DISPLAY_TEXTS["storage_" + kind][LANGUAGE.get()]
+        )
+    )
+
+
+def change_course_layout(**args):
+    """
+    Moves the assignment files of the open course between the flat layout, where
+    every assignment is directly in metadata and assignment_data, and the sharded
+    layout, where they are in two levels of subfolders named by the start of the
+    ID. The sharded layout keeps folders small on courses with many assignments.
+    """
+
+    if not OPEN_COURSE_PATH.get() or not COURSE_INFO["course_id"]:
+        popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
+        return
+
+    layout = LAYOUT_FLAT if OPEN_COURSE_PATH.is_sharded() else LAYOUT_SHARDED
+    INDEX_QUEUE.flush()
+    COURSE_WATCHER.set(None)
+    # Recorded first, so that an interrupted move is finished on the next open
+    COURSE_INFO["layout_migration"] = layout
+    _save_course_file()
+    try:
+        count = _move_course_layout(layout)
+    except OSError:
+        logging.exception("Unable to change course layout to %s.", layout)
+        popup_ok(DISPLAY_TEXTS["ui_error_change_layout"][LANGUAGE.get()])
+        return
+    finally:
+        start_course_watcher()
+
+    popup_ok(
+        DISPLAY_TEXTS["ui_layout_changed"][LANGUAGE.get()].format(
+            count, DISPLAY_TEXTS["layout_" + layout][LANGUAGE.get()]
+        )
+    )
+
+
+def _move_course_layout(layout: str) -> int:
+    """
+    Moves the metadata files, assignment data folders and blob manifests of the
+    open course into the given layout and records it in the course info. Entries
+    that are already in place are skipped, so this also finishes a move that was
+    interrupted. Returns the number of moved files and folders. Raises OSError.
+
+    Params:
+    layout: LAYOUT_FLAT or LAYOUT_SHARDED
+    """
+
+    sharded = layout == LAYOUT_SHARDED
+    course_path = OPEN_COURSE_PATH.get()
+    metadata_path = OPEN_COURSE_PATH.get_subdir(metadata=True)
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
+    if COURSE_INFO.get("storage", STORE_JSON) == STORE_JSON:
+        # Some of the files may already have been moved
+        a_ids = set(JsonCourseStore(course_path).assignment_ids())
+        a_ids.update(JsonCourseStore(course_path, sharded=True).assignment_ids())
+    else:
+        a_ids = set(get_store().assignment_ids())
+
+    count = move_assignment_layout(metadata_path, a_ids, sharded, ".json")
+    count += move_assignment_layout(metadata_path, a_ids, sharded)
+    count += move_assignment_layout(data_path, a_ids, sharded)
+    count += move_assignment_layout(
+        path.join(data_path, BLOB_DIR, MANIFEST_DIR), a_ids, sharded, ".json"
+    )
+    logging.info("Moved %d assignment files and folders to %s layout.", count, layout)
+
+    COURSE_INFO["layout"] = layout
+    COURSE_INFO.pop("layout_migration", None)
+    _save_course_file()
+    OPEN_COURSE_PATH.set_sharded(sharded)
+    if OPEN_STORE.get() is not None and OPEN_STORE.get().KIND == STORE_JSON:
+        OPEN_STORE.set(None)
+    ASSIGNMENT_CACHE.clear()
+    return count
 
 
 def _save_course_file():
@@ -130,9 +668,7 @@ def _save_course_file():
     """
     f_path = path.join(OPEN_COURSE_PATH.get(), "course_info.mcif")
     try:
-        with open(f_path, "w", encoding="utf-8") as f:
-            to_write = json.dumps(COURSE_INFO, indent=4)
-            f.write(to_write)
+        write_json_atomic(f_path, COURSE_INFO, COURSE_INFO.get("compact_json", False))
     except OSError:
         logging.exception("Unable to save course info file.")
         popup_ok(DISPLAY_TEXTS["ui_error_save_course"][LANGUAGE.get()])
@@ -157,6 +693,9 @@ def save_course_info(**args):
         COURSE_INFO["course_title"] = get_value(UI_ITEM_TAGS["COURSE_TITLE"])
         COURSE_INFO["course_id"] = get_value(UI_ITEM_TAGS["COURSE_ID"])
         COURSE_INFO["course_weeks"] = get_value(UI_ITEM_TAGS["COURSE_WEEKS"])
+        COURSE_INFO["compact_json"] = get_value(UI_ITEM_TAGS["COURSE_COMPACT_JSON"])
+        if OPEN_STORE.get() is not None:
+            OPEN_STORE.get().compact = COURSE_INFO["compact_json"]
         levels = {}
         raw = get_value(UI_ITEM_TAGS["COURSE_LEVELS"]).strip().split("\n")
         if raw[0] != "":
@@ -179,6 +718,11 @@ def save_course_info(**args):
             COURSE_INFO["max_level"] = 0
 
     if new:
+        COURSE_INFO["index_version"] = INDEX_SCHEMA_VERSION
+        COURSE_INFO["storage"] = STORE_JSON
+        COURSE_INFO["compact_json"] = False
+        COURSE_INFO["layout"] = LAYOUT_FLAT
+        COURSE_INFO.pop("layout_migration", None)
         COURSE_INFO["periods"] = {
             "1": "DEFAULT",
             "2": "DEFAULT",
@@ -191,37 +735,51 @@ def save_course_info(**args):
 
     if new:
         configure_item(UI_ITEM_TAGS["COURSE_LEVELS"], default_value="")
-        configure_item(UI_ITEM_TAGS["total_index"], default_value=0)
+        configure_item(UI_ITEM_TAGS["COURSE_COMPACT_JSON"], default_value=False)
+        ASSIGNMENT_CACHE.clear()
+        OPEN_COURSE_PATH.set_sharded(False)
+        OPEN_STORE.set(
+            open_store(OPEN_COURSE_PATH.get(), STORE_JSON, COURSE_INFO["compact_json"])
+        )
         create_index()
+        show_index_summary()
 
 
-def update_index(data: dict, expanding: bool):
+def update_index(data: dict, expanding: bool, callback=None):
     """
-    Updates the index with the data from the updated assignment.
+    Updates the index with the data from the updated assignment. The change is
+    written in the background by INDEX_QUEUE.
 
     Params:
     data: assignment to update
     expanding: bool whether the assignment is expanding
+    callback: optional function to call with None after the change has been
+    committed, or with the error if writing it failed, see IndexQueue
     """
 
-    ix = OPEN_IX.get()
+    _queue_index_update(data, expanding, callback)
 
-    positions = f"{data['exp_lecture']};"
-    positions += ",".join([str(item) for item in data["exp_assignment_no"]])
-    tags = ",".join(data["tags"])
-    json_path = data["assignment_id"]
-
-    writer = ix.writer()
-    writer.update_document(
-        a_id=data["assignment_id"],
-        position=positions,
-        tags=tags,
-        title=data["title"],
-        json_path=json_path,
-        is_expanding=expanding,
-        level=str(data["level"]),
+
+def _queue_index_update(data: dict, expanding: bool, callback=None):
+    """
+    Queues the index document of an assignment and updates its links in the
+    expansion chain graph.
+
+    Params:
+    data: assignment to index
+    expanding: bool whether the assignment is expanding
+    callback: optional function to call with None after the change has been
+    committed, or with the error if writing it failed, see IndexQueue
+    """
+
+    fields = index_fields(
+        data,
+        expanding,
+        OPEN_COURSE_PATH.get_subdir(assignment_data=True),
+        OPEN_COURSE_PATH.is_sharded(),
     )
-    writer.commit()
+    INDEX_QUEUE.update(data["assignment_id"], fields, callback=callback)
+    EXPANSION_CHAINS.update(fields["a_id"], fields["previous"], fields["next"])
 
 
 def format_metadata_json(data: dict):
@@ -287,7 +845,8 @@ def format_metadata_json(data: dict):
 
 def save_next(assignment: dict):
     """
-    Saves information on continuing assignments
+    Saves information on continuing assignments. Only the previous parts that
+    do not yet link to the assignment are read and saved.
 
     Params:
     assignment: a dict containing the assignment information to save
@@ -295,18 +854,35 @@ def save_next(assignment: dict):
     if not assignment["previous"]:
         return
 
+    chains = get_chain_graph()
     for last in assignment["previous"]:
+        if assignment["assignment_id"] in chains.recorded_next(last):
+            continue
         prev = get_assignment_json(
-            path.join(OPEN_COURSE_PATH.get_subdir(metadata=True), last + ".json")
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=last)
         )
+        if not prev:
+            continue
         if not prev["next"]:
             prev["next"] = [assignment["assignment_id"]]
         else:
             if assignment["assignment_id"] not in prev["next"]:
                 prev["next"].append(assignment["assignment_id"])
+        save_assignment_file(prev, False, bool(prev["previous"]))
+
+
+def _hash_assignment(assignment: dict) -> str:
+    """
+    Returns a new assignment ID, the SHA256 hash of the assignment data.
+
+    Params:
+    assignment: assignment data to hash
+    """
 
-    expanding = get_value(UI_ITEM_TAGS["PREVIOUS_PART_CHECKBOX"])
-    save_assignment_file(prev, False, expanding)
+    _bytes = json.dumps(assignment).encode()
+    _hash = sha256(usedforsecurity=False)
+    _hash.update(_bytes)
+    return _hash.hexdigest()
 
 
 def save_assignment_data(assignment: dict, new: bool):
@@ -321,58 +897,20 @@ def save_assignment_data(assignment: dict, new: bool):
     if new:
         assignment["course_id"] = COURSE_INFO["course_id"]
         assignment["course_title"] = COURSE_INFO["course_title"]
-        _bytes = json.dumps(assignment).encode()
-        _hash = sha256(usedforsecurity=False)
-        _hash.update(_bytes)
-        _hex = _hash.hexdigest()
+        _hex = _hash_assignment(assignment)
         assignment["assignment_id"] = _hex
         save_next(assignment)
 
-        basepath = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
-        datapath = path.join(basepath, _hex)
-        if not path.exists(basepath):
-            mkdir(basepath)
-        if not path.exists(datapath):
-            mkdir(datapath)
-        for item in assignment["variations"]:
-            for file in item["codefiles"]:
-                copy2(file, datapath)
-            leafs = [path_leaf(f_path) for f_path in item["codefiles"]]
-            item["codefiles"] = leafs
-            for file in item["datafiles"]:
-                copy2(file, datapath)
-            leafs = [path_leaf(f_path) for f_path in item["datafiles"]]
-            item["datafiles"] = leafs
-            for exrun in item["example_runs"]:
-                for file in exrun["outputfiles"]:
-                    copy2(file, datapath)
-                leafs = [path_leaf(f_path) for f_path in exrun["outputfiles"]]
-                exrun["outputfiles"] = leafs
+        makedirs(
+            OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=_hex), exist_ok=True
+        )
+        _store_assignment_files(assignment)
         expanding = get_value(UI_ITEM_TAGS["PREVIOUS_PART_CHECKBOX"])
     else:
         assignment["course_id"] = COURSE_INFO["course_id"]
         assignment["course_title"] = COURSE_INFO["course_title"]
-        basepath = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
-        datapath = path.join(basepath, assignment["assignment_id"])
         save_next(assignment)
-
-        for item in assignment["variations"]:
-            for file in item["codefiles"]:
-                if split(file)[0]:
-                    copy2(file, datapath)
-            leafs = [path_leaf(f_path) for f_path in item["codefiles"]]
-            item["codefiles"] = leafs
-            for file in item["datafiles"]:
-                if split(file)[0]:
-                    copy2(file, datapath)
-            leafs = [path_leaf(f_path) for f_path in item["datafiles"]]
-            item["datafiles"] = leafs
-            for exrun in item["example_runs"]:
-                for file in exrun["outputfiles"]:
-                    if split(file)[0]:
-                        copy2(file, datapath)
-                leafs = [path_leaf(f_path) for f_path in exrun["outputfiles"]]
-                exrun["outputfiles"] = leafs
+        _store_assignment_files(assignment)
         expanding = get_value(UI_ITEM_TAGS["PREVIOUS_PART_CHECKBOX"])
 
     if not path.exists(OPEN_COURSE_PATH.get_subdir(metadata=True)):
@@ -381,33 +919,149 @@ def save_assignment_data(assignment: dict, new: bool):
     save_assignment_file(assignment, new, expanding)
 
 
+def _store_assignment_files(assignment: dict):
+    """
+    Adds the code, data and output files of an assignment to the blob store and
+    places them in the assignment data folder. Files given with only a name are
+    already in place. Replaces the paths in the assignment with file names.
+
+    Params:
+    assignment: the assignment with the file paths chosen by the user
+    """
+
+    store = _blob_store()
+    a_id = assignment["assignment_id"]
+
+    def _add(files: list) -> list:
+        store.add_files(a_id, [f_path for f_path in files if split(f_path)[0]])
+        return [path_leaf(f_path) for f_path in files]
+
+    for item in assignment["variations"]:
+        item["codefiles"] = _add(item["codefiles"])
+        item["datafiles"] = _add(item["datafiles"])
+        for exrun in item["example_runs"]:
+            exrun["outputfiles"] = _add(exrun["outputfiles"])
+
+
+def clean_assignment_files(**args):
+    """
+    Moves assignment files saved before the blob store into it, so that identical
+    files are kept only once, and removes files that no assignment uses anymore.
+    """
+
+    if not OPEN_COURSE_PATH.get() or not COURSE_INFO["course_id"]:
+        popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
+        return
+
+    store = _blob_store()
+    try:
+        adopted = 0
+        if path.exists(store.data_path):
+            for a_id in get_store().assignment_ids():
+                if path.isdir(store.folder(a_id)):
+                    adopted += store.adopt(a_id)
+        removed, freed = store.collect()
+    except OSError:
+        logging.exception("Error while cleaning up assignment files!")
+        popup_ok(DISPLAY_TEXTS["ui_error_clean_files"][LANGUAGE.get()])
+        return
+
+    popup_ok(
+        DISPLAY_TEXTS["ui_files_cleaned"][LANGUAGE.get()].format(
+            adopted, removed, round(freed / 1024 / 1024, 1)
+        )
+    )
+
+
 def save_assignment_file(assignment: dict, new: bool, expanding: bool):
     """
     I/O operation to save assignment file
     """
 
-    _filepath = path.join(
-        OPEN_COURSE_PATH.get_subdir(metadata=True),
-        assignment["assignment_id"] + ".json",
-    )
-    _json = json.dumps(assignment, indent=4, ensure_ascii=False)
     try:
-        with open(_filepath, "w", encoding="utf-8") as _file:
-            _file.write(_json)
+        _write_assignment(assignment)
         if new:
-            add_assignment_to_index(assignment, expanding)
+            add_assignment_to_index(assignment, expanding, callback=_index_written)
         else:
-            update_index(assignment, expanding)
+            update_index(assignment, expanding, callback=_index_written)
         logging.info(
             "Successfully saved assignment %s to file and index.",
             assignment["assignment_id"],
         )
-        configure_item(UI_ITEM_TAGS["total_index"], default_value=get_number_of_docs())
-    except OSError:
+    except (OSError, sqlite3.Error):
         logging.exception("Error while saving assignment data!")
         popup_ok("Error saving assignment data into a file!")
 
 
+def _index_written(error=None):
+    """
+    Callback of INDEX_QUEUE for changes made in the UI. It is called on the writer
+    thread, so the summary and the error, if writing failed, are shown from the
+    main thread.
+
+    Params:
+    error: the error that writing the changes failed with, or None
+    """
+
+    if error is not None:
+        UI_TASKS.call(popup_ok, DISPLAY_TEXTS["ui_error_index_write"][LANGUAGE.get()])
+    UI_TASKS.call(show_index_summary)
+
+
+def show_index_summary():
+    """
+    Updates the number of indexed assignments and the course summary in the main
+    window.
+    """
+
+    configure_item(UI_ITEM_TAGS["total_index"], default_value=get_number_of_docs())
+
+    counts = get_facet_counts()
+    levels = COURSE_INFO["course_levels"] or {}
+    week_text = "   ".join(
+        "L{}: {}".format(week, count) for week, count in sorted(counts["week"].items())
+    )
+    level_text = "   ".join(
+        "{}: {}".format(
+            levels.get(str(level), levels.get(level, [level]))[0], count
+        )
+        for level, count in sorted(counts["level"].items())
+    )
+    tags = sorted(counts["tags"].items(), key=lambda item: (-item[1], item[0]))
+    tag_text = "   ".join(
+        "{}: {}".format(tag, count) for tag, count in tags[:SUMMARY_TAG_COUNT]
+    )
+
+    configure_item(UI_ITEM_TAGS["SUMMARY_WEEKS"], default_value=week_text or "-")
+    configure_item(UI_ITEM_TAGS["SUMMARY_LEVELS"], default_value=level_text or "-")
+    configure_item(UI_ITEM_TAGS["SUMMARY_TAGS"], default_value=tag_text or "-")
+
+
+def _write_assignment(assignment: dict):
+    """
+    Writes the assignment metadata to the course store. Raises OSError or
+    sqlite3.Error on failure.
+
+    Params:
+    assignment: assignment data to write
+    """
+
+    store = get_store()
+    store.write_assignment(assignment)
+    a_id = assignment["assignment_id"]
+    ASSIGNMENT_CACHE.put(a_id, store.version(a_id), assignment)
+
+
+def _blob_store() -> BlobStore:
+    """
+    Returns the blob store of the assignment data folder of the open course.
+    """
+
+    return BlobStore(
+        OPEN_COURSE_PATH.get_subdir(assignment_data=True), OPEN_COURSE_PATH.is_sharded()
+    )
+
+
 def path_leaf(f_path):
     """Return the filename from a filepath"""
     head, tail = split(f_path)
@@ -504,36 +1158,287 @@ def open_course(**args):
         popup_ok(DISPLAY_TEXTS["ui_error_open_course"][LANGUAGE.get()])
     else:
         _json = json.loads(_data)
+        # Optional keys of the previously open course must not be carried over
+        for key in _OPTIONAL_INFO_KEYS:
+            COURSE_INFO.pop(key, None)
         for key in _json.keys():
             COURSE_INFO[key] = _json[key]
+        ASSIGNMENT_CACHE.clear()
+        OPEN_COURSE_PATH.set_sharded(COURSE_INFO.get("layout") == LAYOUT_SHARDED)
+        OPEN_STORE.set(None)
+        if COURSE_INFO.get("layout_migration"):
+            try:
+                _move_course_layout(COURSE_INFO["layout_migration"])
+            except OSError:
+                logging.exception("Unable to finish changing the course layout.")
+                popup_ok(DISPLAY_TEXTS["ui_error_change_layout"][LANGUAGE.get()])
+                return
+        OPEN_STORE.set(
+            open_store(
+                OPEN_COURSE_PATH.get(),
+                COURSE_INFO.get("storage", STORE_JSON),
+                COURSE_INFO.get("compact_json", False),
+                OPEN_COURSE_PATH.is_sharded(),
+            )
+        )
         if open_index() == -1:
             return
-        configure_item(UI_ITEM_TAGS["COURSE_ID"], default_value=COURSE_INFO["course_id"])
-        configure_item(
-            UI_ITEM_TAGS["COURSE_TITLE"], default_value=COURSE_INFO["course_title"]
+        _show_course_info()
+        show_index_summary()
+        start_course_watcher()
+
+
+def _show_course_info():
+    """
+    Shows the course info of the open course in the main window.
+    """
+
+    configure_item(UI_ITEM_TAGS["COURSE_ID"], default_value=COURSE_INFO["course_id"])
+    configure_item(
+        UI_ITEM_TAGS["COURSE_TITLE"], default_value=COURSE_INFO["course_title"]
+    )
+    configure_item(
+        UI_ITEM_TAGS["COURSE_WEEKS"], default_value=COURSE_INFO["course_weeks"]
+    )
+    configure_item(
+        UI_ITEM_TAGS["COURSE_COMPACT_JSON"],
+        default_value=COURSE_INFO.get("compact_json", False),
+    )
+    configure_item(
+        UI_ITEM_TAGS["WATCH_COURSE"],
+        default_value=COURSE_INFO.get("watch_changes", False),
+    )
+
+    levels = ""
+    data = list(COURSE_INFO["course_levels"].keys())
+    data.sort()
+    for key in data:
+        levels += f"{str(key)}:{COURSE_INFO['course_levels'][key][0]}"
+        if len(COURSE_INFO["course_levels"][key]) == 2:
+            levels += f":{COURSE_INFO['course_levels'][key][1]}"
+        levels += "\n"
+    configure_item(UI_ITEM_TAGS["COURSE_LEVELS"], default_value=levels)
+
+
+def toggle_course_watcher(**args):
+    """
+    Turns watching the course folder for changes made by other users on or off.
+    The choice is saved in the course info.
+    """
+
+    if not OPEN_COURSE_PATH.get() or not COURSE_INFO["course_id"]:
+        configure_item(UI_ITEM_TAGS["WATCH_COURSE"], default_value=False)
+        popup_ok(DISPLAY_TEXTS["popup_nocourse"][LANGUAGE.get()])
+        return
+
+    COURSE_INFO["watch_changes"] = get_value(UI_ITEM_TAGS["WATCH_COURSE"])
+    _save_course_file()
+    start_course_watcher()
+
+
+def start_course_watcher():
+    """
+    Starts watching the open course folder if it is turned on for the course,
+    and stops watching otherwise.
+    """
+
+    if not COURSE_INFO.get("watch_changes"):
+        COURSE_WATCHER.set(None)
+        return
+
+    store = get_store()
+    state = {
+        "course_path": OPEN_COURSE_PATH.get(),
+        "revisions": store.revisions() if store.KIND == STORE_SQLITE else {},
+    }
+    # The changes are applied on the watcher thread, only the UI is refreshed on
+    # the main thread between frames
+    watcher = CourseWatcher(
+        OPEN_COURSE_PATH.get(), lambda changes: apply_course_changes(changes, state)
+    )
+    COURSE_WATCHER.set(watcher)
+    watcher.start()
+
+
+def apply_course_changes(changes: set, state: dict):
+    """
+    Refreshes the parts of the open course that another user has changed. Only
+    the changed assignments are read again and updated in the index, and the
+    week data and course info are reloaded if their files changed, and the list
+    of saved sets is shown again if it is open. Run on the watcher thread, so
+    that reading the changes does not hold up the UI. The course info and the
+    set list are refreshed on the main thread through UI_TASKS. Closing the
+    course stops the watcher, which waits for this to return.
+
+    Params:
+    changes: set of (kind, assignment ID) tuples, see course_watcher.classify
+    state: the watched course path and the assignment revisions of a SQLite
+    course when last checked
+    """
+
+    if state["course_path"] != OPEN_COURSE_PATH.get():
+        return
+    kinds = {kind for kind, _ in changes}
+    store = get_store()
+    if CHANGE_ALL in kinds:
+        ASSIGNMENT_CACHE.clear()
+        WEEK_DATA.set({})
+        UI_TASKS.call(_refresh_course_ui, state, True, True)
+        _resync_index()
+        return
+
+    if CHANGE_COURSE_INFO in kinds or CHANGE_SETS in kinds or CHANGE_DATABASE in kinds:
+        UI_TASKS.call(
+            _refresh_course_ui,
+            state,
+            CHANGE_COURSE_INFO in kinds,
+            CHANGE_SETS in kinds or CHANGE_DATABASE in kinds,
         )
-        configure_item(
-            UI_ITEM_TAGS["COURSE_WEEKS"], default_value=COURSE_INFO["course_weeks"]
+    if CHANGE_WEEKS in kinds or CHANGE_DATABASE in kinds:
+        WEEK_DATA.set({})
+
+    if store.KIND == STORE_SQLITE:
+        # The metadata files of a converted course are not used anymore
+        a_ids = set()
+        if CHANGE_DATABASE in kinds:
+            revisions = store.revisions()
+            old = state["revisions"]
+            a_ids = {
+                a_id
+                for a_id in set(old) | set(revisions)
+                if old.get(a_id) != revisions.get(a_id)
+            }
+            state["revisions"] = revisions
+    else:
+        a_ids = {a_id for kind, a_id in changes if kind == CHANGE_ASSIGNMENT}
+    if a_ids:
+        _refresh_assignments(a_ids)
+
+
+def _refresh_assignments(a_ids: set):
+    """
+    Reads the given assignments again and queues their index documents, or
+    removes them from the index if they have been deleted. Assignments whose
+    current version is in the assignment cache were saved by this instance and
+    are skipped.
+
+    Params:
+    a_ids: IDs of the changed assignments
+    """
+
+    store = get_store()
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
+    sharded = OPEN_COURSE_PATH.is_sharded()
+    documents = {}
+    deleted = []
+    for a_id in a_ids:
+        try:
+            version = store.version(a_id)
+        except FileNotFoundError:
+            deleted.append(a_id)
+            continue
+        except (OSError, sqlite3.Error):
+            logging.exception("Unable to check assignment %s for changes.", a_id)
+            continue
+        if ASSIGNMENT_CACHE.contains(a_id, version):
+            continue
+        data = get_assignment_json(
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=a_id)
         )
-        configure_item(UI_ITEM_TAGS["total_index"], default_value=get_number_of_docs())
+        if not data:
+            continue
+        fields = index_fields(data, bool(data["previous"]), data_path, sharded)
+        documents[a_id] = fields
+        EXPANSION_CHAINS.update(a_id, fields["previous"], fields["next"])
+
+    for a_id in deleted:
+        ASSIGNMENT_CACHE.invalidate(a_id)
+        INDEX_QUEUE.delete(a_id)
+        EXPANSION_CHAINS.remove(a_id)
+    if documents or deleted:
+        INDEX_QUEUE.update_many(documents, callback=_index_written)
+    logging.info(
+        "Refreshed %d changed and %d deleted assignments.", len(documents), len(deleted)
+    )
 
-        levels = ""
-        data = list(COURSE_INFO["course_levels"].keys())
-        data.sort()
-        for key in data:
-            levels += f"{str(key)}:{COURSE_INFO['course_levels'][key][0]}"
-            if len(COURSE_INFO["course_levels"][key]) == 2:
-                levels += f":{COURSE_INFO['course_levels'][key][1]}"
-            levels += "\n"
-        configure_item(UI_ITEM_TAGS["COURSE_LEVELS"], default_value=levels)
+
+def _refresh_course_ui(state: dict, course_info: bool, sets: bool):
+    """
+    Reloads the course info and shows the saved sets again on the main thread
+    after another user has changed them, unless another course has been opened.
+
+    Params:
+    state: the watched course path, see start_course_watcher
+    course_info: whether the course info file changed
+    sets: whether the saved sets changed
+    """
+
+    if state["course_path"] != OPEN_COURSE_PATH.get():
+        return
+    if course_info:
+        _reload_course_info()
+    if sets:
+        _refresh_set_list()
+
+
+def _refresh_set_list():
+    """
+    Shows the saved sets again in the saved sets window, if it is open. The set
+    stores read the changed files themselves, see SetJournal.
+    """
+
+    listbox = UI_ITEM_TAGS["LISTBOX"]
+    if does_item_exist(listbox) and get_item_user_data(listbox) == SET_LISTBOX_DATA:
+        configure_item(listbox, items=get_result_sets())
+
+
+def _reload_course_info():
+    """
+    Reads the course info file again after another user has changed it.
+    """
+
+    f_path = path.join(OPEN_COURSE_PATH.get(), "course_info.mcif")
+    try:
+        with open(f_path, "r", encoding="utf-8") as f:
+            data = json.loads(f.read())
+    except (OSError, ValueError):
+        logging.exception("Unable to reload course info.")
+        return
+
+    # Keys removed from the file must not be left behind
+    COURSE_INFO.clear()
+    COURSE_INFO.update(data)
+    get_store().compact = COURSE_INFO.get("compact_json", False)
+    _show_course_info()
+
+
+def _resync_index():
+    """
+    Brings the index in line with the metadata after changes have been missed.
+    """
+
+    documents = read_metadata_documents()
+    report = check_index(documents)
+    changed = set(report["missing"]) | set(report["mismatched"])
+    for a_id in report["orphaned"]:
+        INDEX_QUEUE.delete(a_id)
+    INDEX_QUEUE.update_many(
+        {a_id: documents[a_id] for a_id in changed}, callback=_index_written
+    )
+    EXPANSION_CHAINS.clear()
 
 
 def close_index() -> None:
     """Closes the open indexes."""
 
-    ix = OPEN_IX.get()
-    if ix:
-        ix.close()
+    COURSE_WATCHER.set(None)
+    SEARCH_QUEUE.cancel()
+    SEARCH_QUEUE.clear()
+    INDEX_QUEUE.stop()
+    OPEN_IX.close()
+    logging.debug("Assignment cache: %s", ASSIGNMENT_CACHE.stats())
+    ASSIGNMENT_CACHE.clear()
+    OPEN_STORE.set(None)
 
     logging.info("Indexes closed.")
 
@@ -571,16 +1476,13 @@ def save_full_week(parent):
     parent: the full week data dict
     """
 
-    f_path = path.join(OPEN_COURSE_PATH.get(), "weeks.json")
     try:
-        with open(f_path, "w", encoding="utf-8") as f:
-            _json = json.dumps(parent, indent=4, ensure_ascii=False)
-            f.write(_json)
-            WEEK_DATA.set(parent)
-    except OSError:
+        get_store().write_weeks(parent)
+        WEEK_DATA.set(parent)
+    except (OSError, sqlite3.Error):
         logging.exception("Error in saving week JSON.")
     else:
-        logging.debug("Week data saved: %s", _json)
+        logging.debug("Week data saved: %s", parent)
 
 
 def year_conversion(data: list, encode: bool) -> list:
@@ -610,26 +1512,77 @@ def year_conversion(data: list, encode: bool) -> list:
     return converted
 
 
-def search_index(query):
+def _incremental_query(query: str) -> str:
+    """
+    Rewrites a partially typed query to be typo-tolerant. Plain words of four or
+    more characters match within one edit, and the last word also matches as a
+    prefix since it may still be incomplete. Words with query syntax are kept as
+    they are.
+
+    Params:
+    query: the query as typed by the user
+    """
+
+    words = query.split()
+    rewritten = []
+    for i, word in enumerate(words):
+        if not re.fullmatch(r"\w+", word) or word in ("AND", "OR", "NOT"):
+            rewritten.append(word)
+            continue
+        fuzzy = "{}~1/2".format(word) if len(word) >= 4 else word
+        if i == len(words) - 1:
+            rewritten.append("({}* OR {})".format(word, fuzzy))
+        else:
+            rewritten.append(fuzzy)
+
+    return " ".join(rewritten)
+
+
+def search_index(query, fields=None, limit=10, incremental=False, highlight=False):
     """
-    Search the assignment index. Defaults to searching from the "title" field
+    Search the assignment index. Defaults to searching from all full-text fields,
+    weighted with SEARCH_FIELD_BOOSTS. With highlight, the results contain
+    highlighted fragments of the matching instructions or title under "highlights".
+    Highlighting reads and tokenizes the instructions of every result, so it should
+    only be asked for where the fragments are shown. Changes still in INDEX_QUEUE
+    are found once they have been committed, a moment later, as the search does
+    not wait for them.
+    Queries for common words match thousands of documents on a large course and
+    take longer, see benchmarks/search_benchmark.py for the latencies.
 
     Params:
     query: String to search the index with
+    fields: list of fields to search from
+    limit: maximum number of results, None for all
+    incremental: a bool whether the query is being typed, see _incremental_query
+    highlight: a bool whether to add the highlighted fragments to the results
     """
 
     ix = OPEN_IX.get()
 
-    qp = QueryParser("title", ix.schema)
+    if not fields:
+        fields = list(SEARCH_FIELD_BOOSTS.keys())
+    boosts = {field: SEARCH_FIELD_BOOSTS.get(field, 1.0) for field in fields}
+    qp = MultifieldParser(fields, ix.schema, fieldboosts=boosts)
+    if incremental:
+        qp.add_plugin(FuzzyTermPlugin())
+        query = _incremental_query(query)
     q = qp.parse(query)
 
-    sr = ix.searcher()
-    results = sr.search(q)
-    logging.debug("Search results: %s", results)
-
-    typed = []
-    for result in results:
-        typed.append(dict(result))
+    with OPEN_IX.searcher() as sr:
+        results = sr.search(q, limit=limit)
+        logging.debug("Search results: %s", results)
+        if not highlight:
+            typed = [dict(result) for result in results]
+        else:
+            results.fragmenter = ContextFragmenter(maxchars=200, surround=40)
+            results.formatter = UppercaseFormatter()
+            typed = []
+            for result in results:
+                item = dict(result)
+                highlights = result.highlights("instructions")
+                item["highlights"] = highlights or result.highlights("title")
+                typed.append(item)
 
     logging.debug("Full result data:\n%s", typed)
 
@@ -648,18 +1601,10 @@ def get_value_from_browse():
         lecture = int(value.split(" - ")[0])
     except ValueError:
         title = value.split(" - ")[1]
-        results = search_index(title)
+        results = search_index(title, fields=["title"], limit=None)
 
         for result in results:
-            header = ""
-            header += (
-                DISPLAY_TEXTS["tex_lecture_letter"][LANGUAGE.get()]
-                + result["position"].split(";")[0]
-            )
-            header += DISPLAY_TEXTS["tex_assignment_letter"][LANGUAGE.get()] + "("
-            header += result["position"].split(";")[1] + ")"
-            header += " - " + result["title"]
-            if header == value:
+            if get_assignment_header(result) == value:
                 return result
     else:
         for week in get_week_data()["lectures"]:
@@ -680,15 +1625,14 @@ def del_prev(s, a, u: dict):
     ind = var["previous"].index(to_del)
     var["previous"].pop(ind)
 
-    prev = get_assignment_json(
-        path.join(OPEN_COURSE_PATH.get_subdir(metadata=True), to_del + ".json")
-    )
-    try:
-        ind = prev["next"].index(to_del)
-        prev["next"].pop(ind)
-    except ValueError:
-        pass
-    save_assignment_data(prev, False)
+    a_id = var.get("assignment_id")
+    if a_id and a_id in get_chain_graph().recorded_next(to_del):
+        prev = get_assignment_json(
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=to_del)
+        )
+        if prev and a_id in prev["next"]:
+            prev["next"].remove(a_id)
+            save_assignment_file(prev, False, bool(prev["previous"]))
     configure_item(UI_ITEM_TAGS["PREVIOUS_PART_LISTBOX"], items=var["previous"])
 
 
@@ -750,30 +1694,32 @@ def del_assignment_files(ID: str) -> bool:
     """
     Delete assignment from disk.
     """
-    data_path = path.join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), ID)
-    meta_path = path.join(OPEN_COURSE_PATH.get_subdir(metadata=True), ID)
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=ID)
 
     try:
         if path.exists(data_path):
             rmtree(data_path)
-        if path.exists(meta_path):
-            rmtree(meta_path)
+        _blob_store().remove_assignment(ID)
+        get_store().delete_assignment(ID)
+        ASSIGNMENT_CACHE.invalidate(ID)
         return True
-    except OSError:
+    except (OSError, sqlite3.Error):
         logging.exception("Unable to delete assignment files!")
         return False
 
 
 def del_assignment_from_index(ID: str) -> bool:
     """
-    Deletes spesified assignment from index.
+    Deletes spesified assignment from index. The deletion is written in the
+    background by INDEX_QUEUE. Returns False if the assignment is not indexed.
+    The queue is not flushed, so that the UI does not wait for the index lock.
     """
-    writer = OPEN_IX.get().writer()
-    res = writer.delete_by_term("a_id", ID)
-    writer.commit()
-    if res:
-        return True
-    return False
+    with OPEN_IX.searcher() as srcr:
+        if srcr.document_number(a_id=ID) is None and not INDEX_QUEUE.is_pending(ID):
+            return False
+    INDEX_QUEUE.delete(ID, callback=_index_written)
+    EXPANSION_CHAINS.remove(ID)
+    return True
 
 
 def format_week_data(data: dict) -> dict:
@@ -805,27 +1751,22 @@ def del_week_data(s, a, u: tuple[dict, int]) -> None:
     save_full_week(parent)
 
 
-def save_new_set(set_UUIDs: dict, sets: list) -> bool:
+def save_new_set(set_UUIDs: dict, sets: list, generation: dict | None = None) -> bool:
     """
     Save assignment set to disk.
 
     Params:
     set_UUIDs: the UUIDs of the set metadata from the result window
     sets: A list of sets to save 
+    generation: the seed and options the set was generated with, if any
     """
 
-    saved = get_saved_assignment_sets()
-    if not saved:
-        popup_ok(DISPLAY_TEXTS["ui_error_load_set"][LANGUAGE.get()])
-        return
-
-    max_set_id = saved["maxSetID"]
     year = get_value(set_UUIDs["year"])
     period = get_value(set_UUIDs["period"])
     name = get_value(set_UUIDs["name"])
 
     set_to_save = {
-        "id": max_set_id + 1,
+        "id": None,
         "year": year,
         "period": period,
         "name": name,
@@ -833,6 +1774,8 @@ def save_new_set(set_UUIDs: dict, sets: list) -> bool:
         "assignments": None,
         "weeks": [],
     }
+    if generation is not None:
+        set_to_save["generation"] = generation
     for _set in sets:
         tempList = []
         for assig in _set:
@@ -845,47 +1788,108 @@ def save_new_set(set_UUIDs: dict, sets: list) -> bool:
         else:
             set_to_save["assignments"] = tempList
 
-    saved["maxSetID"] += 1
-    saved["sets"].append(set_to_save)
-    update_used(set_to_save)
+    if not update_used(set_to_save):
+        return False
 
-    res = save_sets_disk(saved)
-    return res
+    return save_set_change(lambda store: store.add_set(set_to_save))
 
 
-def update_used(_set:dict) -> None:
+def update_used(_set: dict) -> bool:
     """
-    Add used period to the assignment metadata
+    Add used period to the assignment metadata. The changes are grouped per
+    assignment, so that every assignment is written once, and all of them are
+    written in one transaction and one index commit. If a write fails, the
+    assignments that were already written are restored.
+
+    Params:
+    _set: the saved assignment set
     """
 
     period = f"{_set['year']}/{_set['period']}"
     if _set["type"] == "full":
-        data_set = _set["weeks"]
+        data_set = [assig for week in _set["weeks"] for assig in week]
     else:
         data_set = _set["assignments"]
+
+    used = {}
     for assig in data_set:
-        a_data = get_assignment_json(path.join(OPEN_COURSE_PATH.get_subdir(metadata=True), assig["id"]+".json"))
+        used.setdefault(assig["id"], set()).add(assig["variationID"])
+
+    store = get_store()
+    changed = {}
+    originals = {}
+    for a_id, variations in used.items():
+        a_data = get_assignment_json(
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=a_id)
+        )
+        if not a_data:
+            continue
+        original = deepcopy(a_data)
         for var in a_data["variations"]:
-            if assig["variationID"] == var["variation_id"]:
-                if period not in var["used_in"]:
-                    var["used_in"].append(period)
-                    save_assignment_data(a_data, False)
+            if var["variation_id"] in variations and period not in var["used_in"]:
+                var["used_in"].append(period)
+        if a_data != original:
+            changed[a_id] = a_data
+            originals[a_id] = original
+
+    written = []
+    try:
+        with store.transaction():
+            for a_id, a_data in changed.items():
+                _write_assignment(a_data)
+                written.append(a_id)
+    except (OSError, sqlite3.Error):
+        logging.exception("Error while marking assignments used!")
+        _restore_assignments(store, [originals[a_id] for a_id in written])
+        popup_ok(DISPLAY_TEXTS["ui_error_update_used"][LANGUAGE.get()])
+        return False
+
+    data_path = OPEN_COURSE_PATH.get_subdir(assignment_data=True)
+    sharded = OPEN_COURSE_PATH.is_sharded()
+    INDEX_QUEUE.update_many(
+        {
+            a_id: index_fields(a_data, bool(a_data["previous"]), data_path, sharded)
+            for a_id, a_data in changed.items()
+        }
+    )
+    logging.info("Marked %d assignments used in %s.", len(changed), period)
+    return True
 
 
-def save_sets_disk(sets: dict) -> bool:
+def _restore_assignments(store, assignments: list):
     """
-    Save set data dict to disk.
+    Writes back the given assignments after a failed bulk write. A SQLite store
+    has already rolled the transaction back, so only the cache is cleared then.
 
     Params:
-    sets: dictionary containing set information.
+    store: the course store
+    assignments: the assignments as they were before the write
+    """
+
+    for assignment in assignments:
+        ASSIGNMENT_CACHE.invalidate(assignment["assignment_id"])
+        if store.KIND == STORE_SQLITE:
+            continue
+        try:
+            _write_assignment(assignment)
+        except OSError:
+            logging.exception(
+                "Unable to restore assignment %s!", assignment["assignment_id"]
+            )
+
+
+def save_set_change(change) -> bool:
     """
+    Save a change to the assignment sets to disk. Only the changed set is
+    written, see SetJournal.
 
-    _path = OPEN_COURSE_PATH.get_set_path()
+    Params:
+    change: function that makes the change, given the course store
+    """
 
     try:
-        with open(_path, "w", encoding="utf-8") as f:
-            f.write(json.dumps(sets, ensure_ascii=False, indent=4))
-    except OSError:
+        change(get_store())
+    except (OSError, ValueError, sqlite3.Error):
         logging.exception("Could not save assignment sets to disk!")
         popup_ok(DISPLAY_TEXTS["ui_error_save_set"][LANGUAGE.get()])
         return False
@@ -902,8 +1906,6 @@ def update_set(_set:dict, set_UUIDs:dict, assigs:list, window_id:int|str):
     window_id: ID of the window to close
     """
 
-    data = get_saved_assignment_sets()
-
     _set["year"] = get_value(set_UUIDs["year"])
     _set["period"] = get_value(set_UUIDs["period"])
     _set["name"] = get_value(set_UUIDs["name"])
@@ -920,12 +1922,7 @@ def update_set(_set:dict, set_UUIDs:dict, assigs:list, window_id:int|str):
         else:
             _set["assignments"] = tempList
 
-    for i, _sets in enumerate(data["sets"]):
-        if _sets["id"] == _set["id"]:
-            data["sets"][i] = _set
-            break
-
-    save_sets_disk(data)
+    save_set_change(lambda store: store.write_set(_set))
     configure_item(UI_ITEM_TAGS["LISTBOX"], items=get_result_sets())
     close_window(window_id)
     
@@ -969,7 +1966,7 @@ def _resolve_assignment(assig:dict):
     assig: dict from the raw result set
     """
     data = get_assignment_json(
-        path.join(OPEN_COURSE_PATH.get_subdir(metadata=True), assig["id"] + ".json")
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=assig["id"])
     )
     if not data:
         return []
@@ -1024,14 +2021,7 @@ def delete_assignment_set(s, a, u:tuple[int, int|str, int|str]):
     window_id = u[1]
     popup_id = u[2]
 
-    data = get_saved_assignment_sets()
-
-    for i, _sets in enumerate(data["sets"]):
-        if _sets["id"] == set_id:
-            del data["sets"][i]
-            break
-
-    save_sets_disk(data)
+    save_set_change(lambda store: store.delete_set(set_id))
     close_window(popup_id)
     configure_item(UI_ITEM_TAGS["LISTBOX"], items=get_result_sets())
     close_window(window_id)
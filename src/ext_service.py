@@ -135,7 +135,7 @@ def move_images(_set:dict) -> list:
     paths = []
     for assig in _set:
         for image in assig["images"]:
-            i_path = path.join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), assig["a_id"], image)
+            i_path = path.join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=assig["a_id"]), image)
             destination = path.join(dest, image)
             res = copy_file(i_path, destination)
             if res:
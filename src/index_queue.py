@@ -0,0 +1,227 @@
+"""
+Mímir Index Queue
+
+Write-behind queue for the index of the open course. Changes are written in
+batches by a background thread, see IndexQueue. The index is given as the IX
+holder of src/const_class.py.
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+import logging
+from threading import Condition, Thread
+from time import monotonic
+
+from whoosh.index import LockError
+
+# Times a batch is written again while another writer holds the index lock,
+# before it is reported as failed
+LOCK_RETRIES = 3
+# Seconds to wait for the index lock on each try
+LOCK_TIMEOUT = 1.0
+
+
+class IndexQueue:
+    """
+    Write-behind queue for the course index. Updates and deletions are written in
+    batches by a background thread, so callers never wait for a commit. Consecutive
+    changes to the same assignment are coalesced and the index is optimized once
+    the queue has been idle for a while. flush() waits until everything queued so
+    far is committed.
+
+    Callbacks are called on the writer thread with None once their changes have
+    been committed, or with the error if writing them failed. Changes that could
+    not be written are kept and written again with the next change, so a failed
+    write does not leave the index behind the metadata for good. If the
+    index stays locked by another writer, for example another Mímir with the same
+    course open, a batch fails after LOCK_RETRIES tries, so that flush() does not
+    wait for the lock forever.
+    """
+
+    def __init__(self, ix, delay=0.25, optimize_delay=30.0):
+        self._ix = ix
+        self._delay = delay
+        self._optimize_delay = optimize_delay
+        self._pending = {}
+        self._failed = {}
+        self._callbacks = []
+        self._cond = Condition()
+        self._busy = False
+        self._urgent = False
+        self._unoptimized = False
+        self._lock_tries = 0
+        self._running = False
+        self._thread = None
+
+    def update(self, a_id, fields, callback=None):
+        self._put(a_id, fields, callback)
+
+    def delete(self, a_id, callback=None):
+        self._put(a_id, None, callback)
+
+    def update_many(self, documents: dict, callback=None):
+        """
+        Queues the fields of several assignments at once, keyed by assignment ID,
+        so that they are written in the same commit.
+        """
+
+        with self._cond:
+            for a_id, fields in documents.items():
+                self._put(a_id, fields, None)
+            self._put_callback(callback)
+
+    def flush(self):
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                self._cond.wait()
+            self._urgent = False
+
+    def is_pending(self, a_id) -> bool:
+        """
+        Returns True if a change to the assignment is waiting to be written, so
+        the index may not show it yet.
+        """
+
+        with self._cond:
+            return a_id in self._pending or a_id in self._failed
+
+    def stop(self):
+        self.flush()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def failed(self) -> list:
+        """
+        Returns the IDs of the assignments whose changes are waiting to be
+        written again after a failed write.
+        """
+
+        with self._cond:
+            return list(self._failed)
+
+    def discard_failed(self):
+        """
+        Forgets the changes of failed writes, after the index has been rebuilt
+        from the metadata.
+        """
+
+        with self._cond:
+            self._failed = {}
+
+    def _retry_failed(self):
+        # Changes queued after the failure are newer and take precedence
+        if self._failed:
+            self._failed.update(self._pending)
+            self._pending = self._failed
+            self._failed = {}
+
+    def _put(self, a_id, fields, callback):
+        with self._cond:
+            # Only the latest change to an assignment needs to be written
+            self._pending.pop(a_id, None)
+            self._pending[a_id] = fields
+            self._retry_failed()
+            self._put_callback(callback)
+
+    def _put_callback(self, callback):
+        with self._cond:
+            if callback:
+                self._callbacks.append(callback)
+            if not self._running:
+                self._running = True
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        last_write = monotonic()
+        while True:
+            with self._cond:
+                while not self._pending and self._running:
+                    timeout = None
+                    if self._unoptimized:
+                        timeout = self._optimize_delay - (monotonic() - last_write)
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+                if not self._pending and not self._running:
+                    return
+                if self._pending and not self._urgent:
+                    # Give consecutive saves a moment to end up in the same batch
+                    self._cond.wait(self._delay)
+                batch = self._pending
+                callbacks = self._callbacks
+                self._pending = {}
+                self._callbacks = []
+                self._busy = True
+
+            error = None
+            try:
+                if batch:
+                    self._write(batch)
+                    last_write = monotonic()
+                else:
+                    self._optimize()
+                self._lock_tries = 0
+            except LockError as lock_error:
+                self._lock_tries += 1
+                if self._lock_tries >= LOCK_RETRIES:
+                    logging.error("Index is locked, queued index changes not written.")
+                    self._lock_tries = 0
+                    error = lock_error
+                    with self._cond:
+                        for a_id, fields in batch.items():
+                            self._failed.setdefault(a_id, fields)
+                        if not batch:
+                            self._unoptimized = False
+                else:
+                    logging.warning("Index is locked, retrying queued index changes.")
+                    with self._cond:
+                        for a_id, fields in batch.items():
+                            self._pending.setdefault(a_id, fields)
+                        self._callbacks = callbacks + self._callbacks
+                        callbacks = []
+                        self._cond.wait(self._delay)
+            except Exception as write_error:  # pylint: disable=broad-except
+                logging.exception("Unable to write queued index changes!")
+                error = write_error
+                with self._cond:
+                    for a_id, fields in batch.items():
+                        self._failed.setdefault(a_id, fields)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+            for callback in callbacks:
+                try:
+                    callback(error)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Index queue callback failed.")
+
+    def _write(self, batch: dict):
+        writer = self._ix.get().writer(timeout=LOCK_TIMEOUT)
+        try:
+            for a_id, fields in batch.items():
+                if fields is None:
+                    writer.delete_by_term("a_id", a_id)
+                else:
+                    writer.update_document(**fields)
+        except Exception:
+            writer.cancel()
+            raise
+        # Merging is left for when the queue is idle, see _optimize
+        self._ix.commit(writer, merge=False)
+        self._unoptimized = True
+        logging.debug("Committed %d queued index changes.", len(batch))
+
+    def _optimize(self):
+        writer = self._ix.get().writer(timeout=LOCK_TIMEOUT)
+        self._ix.commit(writer, optimize=True)
+        self._unoptimized = False
+        logging.debug("Optimized index.")
@@ -0,0 +1,133 @@
+"""
+Mímir Index Tools
+
+Helpers for building index documents. These do not depend on the UI, so they
+can be run in worker processes.
+"""
+
+# pylint: disable=import-error
+import logging
+from os import path
+
+from src.common import SHARD_LEVELS, assignment_subpath
+from src.course_store import JsonCourseStore
+
+
+def index_fields(
+    data: dict, expanding: bool, data_path: str | None = None, sharded=False
+) -> dict:
+    """
+    Returns the fields of an index document for the given assignment.
+
+    Params:
+    data: a dictionary containing assignment data
+    expanding: bool whether the assignment is expanding
+    data_path: path to the assignment data folder of the course. If given, the
+    contents of the code files are indexed as well
+    sharded: whether the assignment data folder is in the sharded layout
+    """
+
+    folder = None
+    if data_path:
+        subpath = assignment_subpath(data["assignment_id"], sharded)
+        folder = path.join(data_path, subpath)
+    instructions = []
+    code = []
+    datafiles = []
+    examples = []
+    for var in data["variations"]:
+        instructions.append(var["instructions"])
+        datafiles += var["datafiles"]
+        for exrun in var["example_runs"]:
+            examples += exrun["inputs"]
+            examples.append(exrun["output"])
+        if folder:
+            for codefile in var["codefiles"]:
+                code.append(_read_code(path.join(folder, codefile)))
+
+    return {
+        "a_id": data["assignment_id"],
+        "tags": ",".join(data["tags"]),
+        "title": data["title"],
+        "is_expanding": expanding,
+        "level": int(data["level"]),
+        "week": int(data["exp_lecture"]),
+        "positions": [int(item) for item in data["exp_assignment_no"]],
+        "next": list(data["next"]),
+        "previous": list(data["previous"] or []),
+        "variations": [variation_usage(var) for var in data["variations"]],
+        "instructions": "\n\n".join(instructions),
+        "code": "\n".join(code),
+        "datafiles": ",".join([path.basename(item) for item in datafiles]),
+        "examples": "\n".join(examples),
+    }
+
+
+def _read_code(code_path: str) -> str:
+    """
+    Returns the contents of a code file for indexing, or an empty string if the
+    file cannot be read.
+
+    Params:
+    code_path: path to the code file
+    """
+
+    try:
+        with open(code_path, "r", encoding="UTF-8", errors="ignore") as code_file:
+            return code_file.read()
+    except OSError:
+        logging.warning("Unable to read code file %s for indexing.", code_path)
+        return ""
+
+
+def variation_usage(variation: dict) -> dict:
+    """
+    Returns the usage statistics of a variation that are stored in the index.
+    The last use is None if the variation has not been used.
+
+    Params:
+    variation: a variation dictionary of an assignment
+    """
+
+    last = None
+    for item in variation["used_in"]:
+        try:
+            year, period = item.split("/")
+            used = (int(year), period)
+        except ValueError:
+            continue
+        if last is None or used > last:
+            last = used
+
+    return {
+        "variation_id": variation["variation_id"],
+        "used_in": list(variation["used_in"]),
+        "used_count": len(variation["used_in"]),
+        "last_year": last[0] if last else None,
+        "last_period": last[1] if last else None,
+    }
+
+
+def read_index_document(
+    json_path: str, data_path: str | None = None, sharded=False
+) -> dict | None:
+    """
+    Reads an assignment metadata file and returns its index document fields.
+    Returns None if the file cannot be read or parsed.
+
+    Params:
+    json_path: path to the metadata file
+    data_path: path to the assignment data folder of the course, see index_fields
+    sharded: whether the course is in the sharded layout
+    """
+
+    course_path = path.dirname(json_path)
+    for _ in range(SHARD_LEVELS + 1 if sharded else 1):
+        course_path = path.dirname(course_path)
+    store = JsonCourseStore(course_path, sharded=sharded)
+    try:
+        data = store.read_assignment(path.basename(json_path)[:-5])
+        return index_fields(data, bool(data["previous"]), data_path, sharded)
+    except (OSError, ValueError, KeyError, TypeError):
+        logging.exception("Unable to read index document from %s", json_path)
+        return None
@@ -0,0 +1,73 @@
+"""
+Mímir JSON Cache
+
+Bounded LRU cache of parsed assignment files, keyed by assignment ID and the
+version of the file, see JsonCache. These do not depend on the UI.
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+from collections import OrderedDict
+from threading import RLock
+
+
+class JsonCache:
+    """
+    Bounded LRU cache of parsed assignment files by assignment ID. Entries are
+    stored with the version (mtime and size) of the file they were read from, so
+    a file that has been changed outside of Mímir is read again. Data is copied
+    on the way in and out, so callers can modify what they get.
+    """
+
+    def __init__(self, maxsize=512):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, a_id, version):
+        with self._lock:
+            entry = self._entries.get(a_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(a_id)
+            self.hits += 1
+            return _copy_json(entry[1])
+
+    def put(self, a_id, version, data):
+        with self._lock:
+            self._entries[a_id] = (version, _copy_json(data))
+            self._entries.move_to_end(a_id)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def contains(self, a_id, version) -> bool:
+        with self._lock:
+            entry = self._entries.get(a_id)
+            return entry is not None and entry[0] == version
+
+    def invalidate(self, a_id):
+        with self._lock:
+            self._entries.pop(a_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+def _copy_json(data):
+    # Faster than copy.deepcopy for the plain dicts and lists of parsed JSON
+    if isinstance(data, dict):
+        return {key: _copy_json(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy_json(value) for value in data]
+    return data
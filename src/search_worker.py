@@ -0,0 +1,100 @@
+"""
+Mímir Search Worker
+
+Runs search-as-you-type queries of the browse window on a background thread
+with a small cache of recent results, see SearchWorker.
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+import logging
+from collections import OrderedDict
+from threading import Condition, Thread
+from time import monotonic
+
+
+class SearchWorker:
+    """
+    Runs search-as-you-type queries on a background thread. A query is run only
+    after no new query has been submitted for the debounce delay, and results of
+    queries that have been superseded are discarded. The result id lists of recent
+    queries are kept in a small LRU cache, which is keyed with the index
+    generation so that it is never out of date.
+    """
+
+    def __init__(self, ix, delay=0.2, cache_size=64):
+        self._ix = ix
+        self._delay = delay
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cond = Condition()
+        self._pending = None
+        self._latest = 0
+        self._submitted = 0.0
+        self._thread = None
+
+    def submit(self, query, search, callback):
+        """
+        search is called with the query on the worker thread and must return a
+        list of assignment ids. callback is called with the ids of the latest
+        query only. Cached results are returned right away on the calling thread.
+        """
+
+        with self._cond:
+            self._latest += 1
+            self._pending = None
+            ids = self._cache_get((query, self._ix.generation()))
+            if ids is None:
+                self._pending = (self._latest, query, search, callback)
+                self._submitted = monotonic()
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+                return
+        callback(list(ids))
+
+    def cancel(self):
+        with self._cond:
+            self._latest += 1
+            self._pending = None
+
+    def clear(self):
+        with self._cond:
+            self._cache.clear()
+
+    def _cache_get(self, key):
+        ids = self._cache.get(key)
+        if ids is not None:
+            self._cache.move_to_end(key)
+        return ids
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                # Wait until the user has stopped typing
+                wait = self._delay - (monotonic() - self._submitted)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                token, query, search, callback = self._pending
+                self._pending = None
+                generation = self._ix.generation()
+
+            try:
+                ids = tuple(search(query))
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Search for '%s' failed.", query)
+                continue
+
+            with self._cond:
+                self._cache[(query, generation)] = ids
+                self._cache.move_to_end((query, generation))
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+                if token != self._latest:
+                    logging.debug("Discarded stale results for '%s'.", query)
+                    continue
+
+            callback(list(ids))
@@ -0,0 +1,257 @@
+"""
+Mímir Set Journal
+
+Saved assignment sets of a JSON course. The sets are kept in
+assignment_sets.json as before, but changes are appended to
+assignment_sets.journal as JSON lines instead of rewriting the whole file.
+The journal is compacted into assignment_sets.json once it grows long. The sets
+are held in memory by ID, so listing them does not read the files again.
+Several instances can share a course folder, so the files are read, appended
+and compacted while holding assignment_sets.lock.
+"""
+
+# pylint: disable=import-error
+import logging
+import os
+from contextlib import contextmanager
+from copy import deepcopy
+from os import path
+from threading import RLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from src.common import dumps_json, loads_json, write_json_atomic
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+# Number of journaled changes after which the journal is compacted
+COMPACT_AFTER = 64
+HEADER_KEYS = ("id", "year", "period", "type", "name")
+
+
+class SetJournal:
+    """
+    Journaled store of the saved assignment sets. Every change is a put or a
+    delete of one set, so replaying the journal over a snapshot that already
+    contains some of its changes gives the same result. Lines that cannot be
+    read, such as the last line of a write that was cut short, are skipped.
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path[: -len(".json")] + JOURNAL_SUFFIX
+        self.lock_path = snapshot_path[: -len(".json")] + LOCK_SUFFIX
+        self._lock = RLock()
+        self._locked_depth = 0
+        self._sets = {}
+        self._info = None
+        self._ops = 0
+        self._stamp = None
+
+    def headers(self) -> list:
+        """
+        Returns the ID, year, period, type and name of every set, ordered by ID.
+        """
+
+        self._refresh()
+        return [
+            {key: _set.get(key) for key in HEADER_KEYS} for _set in self._sets.values()
+        ]
+
+    def get(self, set_id: int) -> dict | None:
+        self._refresh()
+        _set = self._sets.get(set_id)
+        return deepcopy(_set) if _set is not None else None
+
+    def read(self) -> dict | None:
+        """
+        Returns all sets in the format of assignment_sets.json, or None if no
+        sets have been saved.
+        """
+
+        self._refresh()
+        if self._info is None:
+            return None
+        data = dict(self._info)
+        data["sets"] = deepcopy(list(self._sets.values()))
+        return data
+
+    def write(self, data: dict, compact: bool):
+        """
+        Replaces all sets and clears the journal.
+        """
+
+        with self._locked():
+            write_json_atomic(self.snapshot_path, data, compact)
+            _remove_quietly(self.journal_path)
+            self._load()
+
+    def add(self, _set: dict, compact: bool) -> int:
+        """
+        Saves a new set with the next free ID, which is set to it and returned.
+        """
+
+        # Held until the set is appended, so no other instance takes the same ID
+        with self._locked():
+            self._refresh()
+            info = self._info or {"maxSetID": 0}
+            _set["id"] = max([info["maxSetID"], *self._sets]) + 1
+            self.put(_set, compact)
+        return _set["id"]
+
+    def put(self, _set: dict, compact: bool):
+        with self._locked():
+            self._refresh()
+            self._append({"op": "put", "set": _set}, compact)
+
+    def delete(self, set_id: int, compact: bool):
+        with self._locked():
+            self._refresh()
+            if set_id in self._sets:
+                self._append({"op": "delete", "id": set_id}, compact)
+
+    def compact(self, compact: bool):
+        """
+        Writes the sets into assignment_sets.json and clears the journal.
+        """
+
+        with self._locked():
+            self._refresh()
+            if self._ops:
+                self.write(self.read(), compact)
+
+    def _append(self, operation: dict, compact: bool):
+        line = dumps_json(operation, compact=True) + b"\n"
+        with open(self.journal_path, "ab+") as journal:
+            journal.seek(0, os.SEEK_END)
+            if journal.tell():
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b"\n":
+                    # Ends a line that was cut short, so that it is skipped
+                    # rather than joined with this one
+                    line = b"\n" + line
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+        # Parsing the line back gives a copy that the caller cannot change
+        self._apply(loads_json(line))
+        self._ops += 1
+        self._stamp = self._current_stamp()
+        if self._ops >= COMPACT_AFTER:
+            self.compact(compact)
+
+    def _apply(self, operation: dict):
+        if operation["op"] == "put":
+            _set = operation["set"]
+            in_order = (
+                not self._sets
+                or _set["id"] in self._sets
+                or _set["id"] > next(reversed(self._sets))
+            )
+            self._sets[_set["id"]] = _set
+            if not in_order:
+                self._sets = dict(sorted(self._sets.items()))
+            info = self._info or {"maxSetID": 0}
+            info["maxSetID"] = max(info["maxSetID"], _set["id"])
+            self._info = info
+        elif operation["op"] == "delete":
+            self._sets.pop(operation["id"], None)
+
+    def _refresh(self):
+        # The files may have been changed outside of this process
+        if self._stamp is None or self._stamp != self._current_stamp():
+            with self._locked():
+                self._load()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock file of the sets, so that other instances do not change
+        the files meanwhile. Can be entered again by the thread that holds it.
+        """
+
+        with self._lock:
+            if self._locked_depth:
+                self._locked_depth += 1
+                try:
+                    yield
+                finally:
+                    self._locked_depth -= 1
+                return
+            with _file_lock(self.lock_path):
+                self._locked_depth = 1
+                try:
+                    yield
+                finally:
+                    self._locked_depth = 0
+
+    def _load(self):
+        self._sets = {}
+        self._info = None
+        self._ops = 0
+        if path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as snapshot:
+                data = loads_json(snapshot.read())
+            self._info = {key: value for key, value in data.items() if key != "sets"}
+            self._sets = {_set["id"]: _set for _set in data.get("sets", [])}
+        if path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as journal:
+                raw = journal.read()
+            # A write that was cut short leaves an incomplete line. It is skipped,
+            # and never cut off here, as another instance may still be writing it
+            for line in raw.split(b"\n"):
+                if not line.strip():
+                    continue
+                try:
+                    operation = loads_json(line)
+                except ValueError:
+                    logging.warning("Skipping incomplete line in set journal.")
+                    continue
+                self._apply(operation)
+                self._ops += 1
+        self._sets = dict(sorted(self._sets.items()))
+        self._stamp = self._current_stamp()
+
+    def _current_stamp(self) -> tuple:
+        return tuple(_stat(file_path) for file_path in (self.snapshot_path, self.journal_path))
+
+
+def _stat(file_path: str) -> tuple | None:
+    try:
+        info = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """
+    Holds an exclusive advisory lock on lock_path, waiting for it if needed.
+    """
+
+    with open(lock_path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _remove_quietly(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
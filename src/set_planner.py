@@ -0,0 +1,391 @@
+"""
+Mímir Set Planner
+
+Plans full sets of assignments from a snapshot of the candidate pool of a course.
+The snapshot holds only plain data, so plans can be made in worker processes,
+and every plan is made with random generators seeded from its own seed, so the
+same plan can be made again. Plans are scored on how recently the variations
+were used, how the levels of each week are balanced and how diverse the tags
+are. These do not depend on the UI.
+"""
+
+# pylint: disable=import-error
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count
+
+from src.set_solver import solve_positions
+from src.variation_pool import VariationPool, np
+
+# Weights of the parts of the score of a plan, see score_plan
+SCORE_WEIGHTS = {"recency": 0.5, "balance": 0.25, "diversity": 0.25}
+# Weight of placing an expanding assignment into each of its positions, against
+# a weight of 1 for leaving it out
+EXPANDING_POSITION_WEIGHT = 2
+# Size of the seeds that are picked, so that they fit into a signed 64-bit integer
+SEED_BITS = 63
+
+# The snapshot of a worker process, see rank_plans
+_worker_snapshot = None
+
+
+class CandidateSnapshot:
+    """
+    The candidates of a course, divided by week, with what is needed to plan and
+    score full sets.
+
+    Params:
+    lectures: the lecture weeks as dicts with lecture_no and assignment_count
+    by_week: lists of candidates that are not expanding, by week number
+    expanding: list of expanding candidates
+    next_parts: IDs of the following parts of the expanding candidates
+    period_weights: weights of the periods, see period_weight_table
+    year: the current year, for the recency of usage
+    """
+
+    def __init__(
+        self,
+        lectures: list,
+        by_week: dict,
+        expanding: list,
+        next_parts: dict,
+        period_weights: dict,
+        year: int,
+    ):
+        self.lectures = lectures
+        self.by_week = by_week
+        self.expanding = expanding
+        self.next_parts = next_parts
+        self.period_weights = period_weights
+        self.year = year
+        self._by_id = {item["assignment_id"]: item for item in expanding}
+        for items in by_week.values():
+            self._by_id.update((item["assignment_id"], item) for item in items)
+
+    def candidate(self, a_id: str) -> dict | None:
+        return self._by_id.get(a_id)
+
+
+class GeneratorContext:
+    """
+    The random generators of one generation of sets, both seeded from the same
+    seed, so that the generation can be done again from the seed. rng is a
+    random.Random for positions and following parts and pool_rng the generator
+    for VariationPool.draw. Without NumPy both are the same random.Random.
+
+    Params:
+    seed: the seed, or None to pick an unpredictable one
+    """
+
+    def __init__(self, seed: int | None = None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(SEED_BITS)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.pool_rng = self.rng if np is None else np.random.default_rng(seed)
+
+
+def plan_full_set(
+    snapshot: CandidateSnapshot,
+    context: GeneratorContext | None = None,
+    solve: bool = False,
+) -> list:
+    """
+    Plans a full set: a list of the selected (candidate, variation ID) tuples of
+    each lecture week in order. Expanding assignments are placed first, one per
+    week that has them, with the parts that follow them in their own weeks. The
+    rest of the positions are then filled from the other candidates of each week.
+
+    Params:
+    snapshot: the candidates of the course
+    context: the random generators of the plan
+    solve: fill the positions with the least reused variations, see
+    solve_positions, instead of drawing them by weight
+    """
+
+    context = context or GeneratorContext()
+    expanding = list(snapshot.expanding)
+    exp_positions = {}
+    for lecture in snapshot.lectures:
+        week = int(lecture["lecture_no"])
+        week_expanding = [
+            item for item in expanding if int(item["exp_lecture"]) == week
+        ]
+        if week_expanding:
+            place_expanding(week_expanding, expanding, exp_positions, snapshot, context)
+
+    plan = []
+    for lecture in snapshot.lectures:
+        week = int(lecture["lecture_no"])
+        args = (
+            snapshot.by_week.get(week, []),
+            lecture["assignment_count"],
+            exp_positions.get(str(week), {}),
+            snapshot.period_weights,
+        )
+        if solve:
+            plan.append(solve_positions(*args, snapshot.year, context.pool_rng))
+        else:
+            plan.append(fill_positions(*args, context.pool_rng))
+    return plan
+
+
+def fill_positions(
+    candidates: list,
+    positions: int,
+    reserved: dict,
+    period_weights: dict,
+    pool_rng=None,
+) -> list:
+    """
+    Selects a variation for each position of a week from the candidates of the
+    week. The usage of the candidates is parsed once for all positions. Returns
+    the selected candidates and variation IDs in the order of the positions.
+
+    Params:
+    candidates: candidates of the week
+    positions: the number of assignment positions in the week
+    reserved: selections already made for some positions, with the position
+    numbers as string keys. Positions past the last one are added to the end
+    period_weights: weights of the periods, see period_weight_table
+    pool_rng: generator for VariationPool.draw
+    """
+
+    pool = VariationPool(candidates, period_weights)
+    available = [True] * len(candidates)
+    selected_list = []
+    for i in range(0, positions):
+        if str(i + 1) in reserved:
+            selected_list.append(reserved[str(i + 1)])
+            continue
+        mask = [
+            available[j] and i + 1 in item["exp_assignment_no"]
+            for j, item in enumerate(candidates)
+        ]
+        if not any(mask):
+            continue
+        selected = pool.draw(pool_rng, mask=mask)
+        if selected[0]:
+            available[candidates.index(selected[0])] = False
+            selected_list.append(selected)
+
+    for key in sorted(reserved, key=int):
+        if not 0 < int(key) <= positions:
+            selected_list.append(reserved[key])
+    return selected_list
+
+
+def place_expanding(
+    week_expanding: list,
+    expanding: list,
+    exp_positions: dict,
+    snapshot: CandidateSnapshot,
+    context: GeneratorContext,
+) -> None:
+    """
+    Selects one expanding assignment of a week and places it and the parts that
+    follow it into the exp_positions dict. The assignment may also be left out.
+
+    Params:
+    week_expanding: the expanding candidates of the week
+    expanding: all remaining expanding candidates, placed parts are removed
+    exp_positions: the positions of the placed parts per week
+    snapshot: the candidates of the course
+    context: the random generators of the plan
+    """
+
+    selected = VariationPool(week_expanding, snapshot.period_weights).draw(
+        context.pool_rng
+    )
+    if not selected[0]:
+        return
+    expanding.remove(selected[0])
+
+    pos_n = _choose_position(selected[0], context.rng)
+    if pos_n == -1:
+        return
+    week_positions = exp_positions.setdefault(str(selected[0]["exp_lecture"]), {})
+    week_positions.setdefault(str(pos_n), selected)
+
+    following = snapshot.next_parts.get(selected[0]["assignment_id"])
+    if following:
+        choose_next(
+            expanding, context.rng.choice(following), exp_positions, snapshot, context
+        )
+
+
+def choose_next(
+    filtered: list,
+    next_a: str,
+    exp_positions: dict,
+    snapshot: CandidateSnapshot,
+    context: GeneratorContext,
+) -> None:
+    """
+    Choose the next in line for expanding assignment and place it into the
+    correct spot on the exp_positions dict. The chain is followed in the next
+    parts of the snapshot and the parts are taken from the candidates, so no
+    files are read. Parts that are not candidates anymore end the chain.
+
+    Params:
+    filtered: the remaining expanding candidates, placed parts are removed
+    next_a: ID of the next part
+    exp_positions: the positions of the placed parts per week
+    snapshot: the candidates of the course
+    context: the random generators of the plan
+    """
+
+    candidates = {item["assignment_id"]: item for item in filtered}
+    placed = set()
+    while next_a in candidates and next_a not in placed:
+        item = candidates[next_a]
+        c_position = _choose_position(item, context.rng)
+        if c_position == -1:
+            break
+        week_positions = exp_positions.setdefault(str(item["exp_lecture"]), {})
+        if str(c_position) not in week_positions:
+            week_positions[str(c_position)] = VariationPool(
+                [item], snapshot.period_weights
+            ).draw(context.pool_rng)
+        placed.add(next_a)
+
+        following = snapshot.next_parts.get(next_a)
+        next_a = context.rng.choice(following) if following else None
+
+    if placed:
+        filtered[:] = [a for a in filtered if a["assignment_id"] not in placed]
+
+
+def _choose_position(item: dict, rng: random.Random) -> int:
+    """
+    Returns one of the positions of an expanding assignment, or -1 to leave it out.
+    """
+
+    positions = list(item["exp_assignment_no"])
+    weights = [EXPANDING_POSITION_WEIGHT] * len(positions)
+    positions.append(-1)
+    weights.append(1)
+    return rng.choices(positions, weights=weights)[0]
+
+
+def score_plan(snapshot: CandidateSnapshot, plan: list) -> dict:
+    """
+    Scores a plan. Every part of the score is between 0 and 1, and higher is
+    better. Returns a dict of the parts and their total, weighted by
+    SCORE_WEIGHTS:
+
+    recency: 1 minus the mean reuse of the selected variations, where a variation
+    used this year counts as 1, a year ago as 1/2 and so on, and unused as 0
+    balance: the mean share of the levels available in each week that the
+    selected assignments of the week cover
+    diversity: the mean share of distinct tags among the tags of the selected
+    assignments of each week
+
+    Params:
+    snapshot: the candidates the plan was made from
+    plan: the plan, see plan_full_set
+    """
+
+    reuse = []
+    balance = []
+    diversity = []
+    for lecture, week_plan in zip(snapshot.lectures, plan):
+        if not week_plan:
+            continue
+        week = int(lecture["lecture_no"])
+        available = {item["level"] for item in snapshot.by_week.get(week, [])}
+        available.update(
+            item["level"] for item in snapshot.expanding if item["exp_lecture"] == week
+        )
+        levels = {item["level"] for item, _ in week_plan}
+        available |= levels
+        balance.append(len(levels) / min(len(week_plan), len(available)))
+        tags = [tag for item, _ in week_plan for tag in item["tags"]]
+        if tags:
+            diversity.append(len(set(tags)) / len(tags))
+        for item, variation_id in week_plan:
+            last_year = None
+            for var in item["variations"]:
+                if var["variation_id"] == variation_id:
+                    last_year = var.get("last_year")
+                    break
+            if last_year is None:
+                reuse.append(0.0)
+            else:
+                reuse.append(1 / (1 + max(0, snapshot.year - last_year)))
+
+    score = {
+        "recency": 1 - sum(reuse) / len(reuse) if reuse else 1.0,
+        "balance": sum(balance) / len(balance) if balance else 1.0,
+        "diversity": sum(diversity) / len(diversity) if diversity else 1.0,
+    }
+    score["total"] = sum(SCORE_WEIGHTS[key] * score[key] for key in SCORE_WEIGHTS)
+    return score
+
+
+def rank_plans(
+    snapshot: CandidateSnapshot,
+    count: int,
+    top: int,
+    seed: int | None = None,
+    procs: int | None = None,
+    solve: bool = False,
+) -> list:
+    """
+    Makes count plans in a process pool and returns the top ones by score as
+    (score, seed, plan) tuples, best first. Each plan can be made again with
+    plan_full_set from a GeneratorContext of its seed. The snapshot is sent to
+    each worker once.
+
+    Params:
+    snapshot: the candidates of the course
+    count: the number of plans to make
+    top: the number of plans to return
+    seed: the seed that the seeds of the plans are drawn from
+    procs: number of worker processes, defaults to the number of CPUs
+    solve: make the plans with solve_positions, see plan_full_set
+    """
+
+    seeder = random.Random(seed)
+    seeds = [seeder.getrandbits(SEED_BITS) for _ in range(count)]
+    procs = min(procs or cpu_count() or 1, count)
+    plan_and_score = partial(_plan_and_score, solve=solve)
+    if procs <= 1:
+        _init_worker(snapshot)
+        results = [plan_and_score(plan_seed) for plan_seed in seeds]
+    else:
+        chunksize = max(1, count // (procs * 4))
+        with ProcessPoolExecutor(
+            max_workers=procs, initializer=_init_worker, initargs=(snapshot,)
+        ) as executor:
+            results = list(executor.map(plan_and_score, seeds, chunksize=chunksize))
+
+    results.sort(key=lambda result: result[0]["total"], reverse=True)
+    ranked = []
+    for score, plan_seed, plan_ids in results[:top]:
+        plan = [
+            [(snapshot.candidate(a_id), variation_id) for a_id, variation_id in week]
+            for week in plan_ids
+        ]
+        ranked.append((score, plan_seed, plan))
+    return ranked
+
+
+def _init_worker(snapshot: CandidateSnapshot):
+    global _worker_snapshot  # pylint: disable=global-statement
+    _worker_snapshot = snapshot
+
+
+def _plan_and_score(seed: int, solve: bool = False) -> tuple:
+    """
+    Makes and scores one plan in a worker. Only the IDs of the plan are returned,
+    to keep what is sent back small.
+    """
+
+    plan = plan_full_set(_worker_snapshot, GeneratorContext(seed), solve)
+    plan_ids = [
+        [(item["assignment_id"], variation_id) for item, variation_id in week]
+        for week in plan
+    ]
+    return score_plan(_worker_snapshot, plan), seed, plan_ids
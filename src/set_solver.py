@@ -0,0 +1,175 @@
+"""
+Mímir Set Solver
+
+Selects the variations of a week as an assignment problem between the positions
+of the week and the candidate assignments. The cost of a candidate is the reuse
+of its least reused variation, see VariationPool.recency_costs, and the
+selection with the smallest total cost is found with the Hungarian method. As
+the candidates of a week can only be placed into that week, solving each week
+on its own also gives the smallest cost for a full course. These do not depend
+on the UI.
+"""
+
+# pylint: disable=import-error
+import heapq
+
+from src.variation_pool import VariationPool, default_rng, np
+
+# Cost of a position and candidate that do not fit together
+FORBIDDEN = 1e9
+# Random noise from 0 to this is added to the costs, so that equally good
+# selections are picked at random
+TIE_NOISE = 1e-3
+
+
+def solve_positions(
+    candidates: list,
+    positions: int,
+    reserved: dict,
+    period_weights: dict,
+    year: int,
+    pool_rng=None,
+) -> list:
+    """
+    Selects a variation for each position of a week from the candidates of the
+    week so that the total reuse of the selected variations is as small as
+    possible. Returns the selected candidates and variation IDs in the order of
+    the positions, like fill_positions of the set planner.
+
+    Params:
+    candidates: candidates of the week
+    positions: the number of assignment positions in the week
+    reserved: selections already made for some positions, with the position
+    numbers as string keys. Positions past the last one are added to the end
+    period_weights: weights of the periods, see period_weight_table
+    year: the current year
+    pool_rng: generator for the random noise, as for VariationPool.draw
+    """
+
+    rows = [i for i in range(1, positions + 1) if str(i) not in reserved]
+    best = _cheapest_variations(
+        VariationPool(candidates, period_weights), year, pool_rng or default_rng()
+    )
+
+    # A row needs only its len(rows) cheapest candidates, since the other rows
+    # can take at most len(rows) - 1 of them
+    fitting = {row: [] for row in rows}
+    for j, item in enumerate(candidates):
+        if j not in best:
+            continue
+        for pos in item["exp_assignment_no"]:
+            if pos in fitting:
+                fitting[pos].append(j)
+    columns = set()
+    for row in rows:
+        columns.update(
+            heapq.nsmallest(len(rows), fitting[row], key=lambda j: best[j][0])
+        )
+    columns = sorted(columns)
+
+    matched = {}
+    if rows and columns:
+        cost = []
+        for row in rows:
+            allowed = set(fitting[row])
+            cost.append(
+                [best[j][0] if j in allowed else FORBIDDEN for j in columns]
+                + [FORBIDDEN] * max(0, len(rows) - len(columns))
+            )
+        for r, c in enumerate(_min_cost_assignment(cost)):
+            if cost[r][c] < FORBIDDEN:
+                j = columns[c]
+                matched[rows[r]] = (candidates[j], best[j][1])
+
+    selected_list = []
+    for i in range(1, positions + 1):
+        if str(i) in reserved:
+            selected_list.append(reserved[str(i)])
+        elif i in matched:
+            selected_list.append(matched[i])
+
+    for key in sorted(reserved, key=int):
+        if not 0 < int(key) <= positions:
+            selected_list.append(reserved[key])
+    return selected_list
+
+
+def _cheapest_variations(pool: VariationPool, year: int, rng) -> dict:
+    """
+    Returns the cost and ID of the cheapest variation of each candidate, by the
+    index of the candidate. Candidates without variations are left out.
+    """
+
+    if np is None:
+        costs = [
+            cost + rng.random() * TIE_NOISE for cost in pool.recency_costs(year)
+        ]
+        best = {}
+        for i, owner in enumerate(pool.owners):
+            if owner not in best or costs[i] < best[owner][0]:
+                best[owner] = (costs[i], pool.variations[i][1])
+        return best
+
+    costs = pool.recency_costs(year) + rng.random(len(pool)) * TIE_NOISE
+    order = np.lexsort((costs, pool.owners))
+    owners = pool.owners[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = owners[1:] != owners[:-1]
+    return {
+        int(pool.owners[i]): (float(costs[i]), pool.variations[i][1])
+        for i in order[first]
+    }
+
+
+def _min_cost_assignment(cost: list) -> list:
+    """
+    Returns the column assigned to each row of a cost matrix so that the total
+    cost is the smallest, with the Hungarian method. There must be at least as
+    many columns as rows.
+    """
+
+    n, m = len(cost), len(cost[0])
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    # The row matched to each column, 1-based with 0 for none
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        col0 = 0
+        minv = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            delta = float("inf")
+            col1 = 0
+            costs = cost[row0 - 1]
+            for col in range(1, m + 1):
+                if not used[col]:
+                    reduced = costs[col - 1] - u[row0] - v[col]
+                    if reduced < minv[col]:
+                        minv[col] = reduced
+                        way[col] = col0
+                    if minv[col] < delta:
+                        delta = minv[col]
+                        col1 = col
+            for col in range(m + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    minv[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    assigned = [0] * n
+    for col in range(1, m + 1):
+        if match[col]:
+            assigned[match[col] - 1] = col - 1
+    return assigned
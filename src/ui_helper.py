@@ -15,6 +15,8 @@ from src.constants import (
     UI_ITEM_TAGS,
     OPEN_COURSE_PATH,
     COURSE_INFO,
+    SEARCH_QUEUE,
+    UI_TASKS,
 )
 from src.data_handler import (
     path_leaf,
@@ -31,9 +33,12 @@ from src.data_handler import (
 from src.data_getters import (
     get_header_page,
     get_all_indexed_assignments,
+    get_indexed_documents,
     get_assignment_json,
+    get_assignment_lazy,
     get_variation_index,
     get_period_default,
+    get_chain_graph,
 )
 from src.common import resource_path, round_up
 from src.window_helper import close_window
@@ -279,7 +284,7 @@ def delete_wrapper(old, data, aID):
     Wrapper for deletion function.
     """
 
-    result = delete_files(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), aID, old))
+    result = delete_files(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=aID), old))
     if not result:
         data.append(old)
         popup_ok(DISPLAY_TEXTS["ui_error_delete"][LANGUAGE.get()])
@@ -312,11 +317,11 @@ def remove_selected(s, a, u):
                 final = data["variations"]
                 if aID:
                     to_delete = []
-                    (to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), aID, x)) for x in old["codefiles"])
-                    (to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), aID, x)) for x in old["datafiles"])
+                    (to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=aID), x)) for x in old["codefiles"])
+                    (to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=aID), x)) for x in old["datafiles"])
                     for y in old["example_runs"]:
                         for x in y["outputfiles"]:
-                            to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), aID, x))
+                            to_delete.append(join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=aID), x))
                     delete_files(to_delete)
                 break
     elif i_type == "datafiles":
@@ -348,7 +353,7 @@ def remove_selected(s, a, u):
         index = int(selected.split(" ")[1]) - 1
         old = data["example_runs"].pop(index)
         if aID:
-            to_delete = [join(OPEN_COURSE_PATH.get_subdir(assignment_data=True), aID, x) for x in old["outputfiles"]]
+            to_delete = [join(OPEN_COURSE_PATH.get_subdir(assignment_data=True, a_id=aID), x) for x in old["outputfiles"]]
             result = delete_files(to_delete)
             if not result:
                 popup_ok(DISPLAY_TEXTS["ui_error_delete"][LANGUAGE.get()])
@@ -494,6 +499,7 @@ def clear_search_bar(s, a, u: list):
     u: page number as list
     """
 
+    SEARCH_QUEUE.cancel()
     dpg.configure_item(UI_ITEM_TAGS["SEARCH_BAR"], default_value="")
     u[0] = 1
     headers = get_header_page(1, get_all_indexed_assignments())
@@ -510,6 +516,15 @@ def save_select(s, a, u: tuple[list, int | str | dict | tuple]):
     if u[1] == UI_ITEM_TAGS["PREVIOUS_PART_LISTBOX"]:  # Previous part
         data = u[0][0]
 
+        if data.get("assignment_id") and get_chain_graph().creates_cycle(
+            data["assignment_id"], result["a_id"]
+        ):
+            popup_ok(DISPLAY_TEXTS["ui_error_chain_cycle"][LANGUAGE.get()])
+            return
+        if data["previous"] and result["a_id"] in data["previous"]:
+            close_window(UI_ITEM_TAGS["LIST_WINDOW"])
+            return
+
         if not data["previous"]:
             data["previous"] = [result["a_id"]]
         else:
@@ -525,8 +540,10 @@ def save_select(s, a, u: tuple[list, int | str | dict | tuple]):
 
     else:  # Whatever the fuck this was...
         field_ids = u[1][1]
-        data = get_assignment_json(
-            join(OPEN_COURSE_PATH.get_subdir(metadata=True), result["a_id"] + ".json")
+        # Only the title and variation IDs are needed here, save_result_popup
+        # loads the full assignment
+        data = get_assignment_lazy(
+            OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=result["a_id"])
         )
         u[0].append(data)
         dpg.configure_item(field_ids["title"], default_value=data["title"])
@@ -538,15 +555,49 @@ def save_select(s, a, u: tuple[list, int | str | dict | tuple]):
 
 def assignment_search_wrapper(s, a, u: list):
     """
-    Wrapper for calling search_index with the search query value
+    Wrapper for calling search_index with the search query value. The search is
+    run in the background as the user types, see SearchWorker. The results are
+    shown from the main thread, whether they came from the worker thread or
+    from its cache.
     """
 
     value = dpg.get_value(UI_ITEM_TAGS["SEARCH_BAR"]).strip()
+    if not value:
+        clear_search_bar(None, None, u)
+        return
+
+    SEARCH_QUEUE.submit(
+        value,
+        _search_ids,
+        lambda ids: UI_TASKS.call(_show_search_results, ids, u),
+    )
 
-    results = search_index(value)
 
+def _search_ids(query: str) -> list:
+    """
+    Returns the ids of the assignments matching a partially typed query.
+
+    Params:
+    query: the query as typed by the user
+    """
+
+    return [item["a_id"] for item in search_index(query, incremental=True)]
+
+
+def _show_search_results(ids: list, u: list):
+    """
+    Shows the search results in the assignment listbox. Run on the main thread
+    through UI_TASKS.
+
+    Params:
+    ids: ids of the found assignments
+    u: page number as list
+    """
+
+    if not dpg.does_item_exist(UI_ITEM_TAGS["LISTBOX"]):
+        return
     u[0] = 1
-    headers = get_header_page(u[0], results)
+    headers = get_header_page(u[0], get_indexed_documents(ids))
 
     dpg.configure_item(UI_ITEM_TAGS["LISTBOX"], items=headers)
 
@@ -576,10 +627,7 @@ def save_result_popup(s, a, u: tuple[dict, tuple, list, dict]):
                 break
 
     select[0] = get_assignment_json(
-        join(
-            OPEN_COURSE_PATH.get_subdir(metadata=True),
-            select[0]["assignment_id"] + ".json",
-        )
+        OPEN_COURSE_PATH.get_subdir(metadata=True, a_id=select[0]["assignment_id"])
     )
     for item in select[0]["variations"]:
         if item["variation_id"] == var_value:
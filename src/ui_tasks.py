@@ -0,0 +1,44 @@
+"""
+Mímir UI Tasks
+
+Functions to run on the main thread between frames. DearPyGui items should only
+be changed from the main thread, so the background threads of the index queue,
+the search worker and the course watcher pass their UI updates here, and the
+render loop in main.py runs them before each frame.
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+import logging
+from collections import deque
+from threading import Lock
+
+
+class UiTaskQueue:
+    """
+    Thread-safe queue of functions and their arguments, run in the order they
+    were queued by run_pending on the main thread.
+    """
+
+    def __init__(self):
+        self._tasks = deque()
+        self._lock = Lock()
+
+    def call(self, function, *args):
+        with self._lock:
+            self._tasks.append((function, args))
+
+    def run_pending(self) -> int:
+        """
+        Runs the functions queued so far and returns how many were run.
+        Functions queued while running are left for the next frame.
+        """
+
+        with self._lock:
+            tasks = self._tasks
+            self._tasks = deque()
+        for function, args in tasks:
+            try:
+                function(*args)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("UI task %s failed.", function.__name__)
+        return len(tasks)
@@ -0,0 +1,191 @@
+"""
+Mímir Variation Pool
+
+Usage history of the candidate variations for set generation, parsed once into
+arrays so that the weights of all variations are counted and one of them is
+drawn in a single vectorized step. NumPy is used when it is installed, and the
+same is done in plain Python otherwise. These do not depend on the UI.
+"""
+
+# pylint: disable=import-error
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Random noise from 0 to this is added to the weight of every usage
+WEIGHT_NOISE = 5
+# Weight of the first period of the year, the next ones get one less each
+FIRST_PERIOD_WEIGHT = 3
+
+_fallback_rng = random.Random()
+_numpy_rng = np.random.default_rng() if np is not None else None
+
+
+def period_weight_table(period_keys) -> dict:
+    """
+    Returns the weights of the periods of the year, FIRST_PERIOD_WEIGHT for the
+    first one and one less for each next one.
+
+    Params:
+    period_keys: keys of the periods in the position conversion table
+    """
+
+    return {key: FIRST_PERIOD_WEIGHT - i for i, key in enumerate(sorted(period_keys))}
+
+
+def default_rng():
+    """
+    Returns the random generator that is used when none is given: a NumPy
+    Generator if NumPy is installed and a random.Random otherwise.
+    """
+
+    return _numpy_rng if np is not None else _fallback_rng
+
+
+class VariationPool:
+    """
+    Variations of a list of candidate assignments with their usage history. The
+    weight of a variation is the smallest weight of its usages, where a usage
+    weighs the weight of its period plus random noise minus the number of times
+    the variation has been used, but at least 1. Unused variations weigh 1.
+
+    Params:
+    assignments: candidates in the shape of assignment dictionaries
+    period_weights: weights of the periods, see period_weight_table
+    """
+
+    def __init__(self, assignments: list, period_weights: dict):
+        self.assignments = assignments
+        self.variations = []
+        owners = []
+        counts = []
+        years = []
+        bases = []
+        offsets = [0]
+        for owner, item in enumerate(assignments):
+            for var in item["variations"]:
+                usages = _parse_usage(var["used_in"], period_weights)
+                self.variations.append((item, var["variation_id"]))
+                owners.append(owner)
+                counts.append(len(var["used_in"]))
+                for year, weight in usages:
+                    years.append(year)
+                    bases.append(weight - len(var["used_in"]))
+                offsets.append(len(bases))
+
+        if np is not None:
+            self.owners = np.array(owners, dtype=np.int64)
+            self.counts = np.array(counts, dtype=np.int64)
+            self.years = np.array(years, dtype=np.int64)
+            self.bases = np.array(bases, dtype=np.int64)
+            offsets = np.array(offsets, dtype=np.int64)
+            used = offsets[1:] > offsets[:-1]
+            self._used = np.flatnonzero(used)
+            self._starts = offsets[:-1][used]
+            self._usage_vars = np.repeat(np.arange(len(counts)), np.diff(offsets))
+        else:
+            self.owners = owners
+            self.counts = counts
+            self.years = years
+            self.bases = bases
+            self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.variations)
+
+    def weights(self, rng=None):
+        """
+        Returns the weights of all variations, with new random noise.
+
+        Params:
+        rng: a NumPy Generator, or a random.Random without NumPy
+        """
+
+        rng = rng or default_rng()
+        if np is None:
+            return [self._weight(i, rng) for i in range(len(self.variations))]
+
+        weights = np.ones(len(self.variations), dtype=np.int64)
+        if self._used.size:
+            noisy = self.bases + rng.integers(0, WEIGHT_NOISE + 1, size=self.bases.size)
+            smallest = np.minimum.reduceat(noisy, self._starts)
+            weights[self._used] = np.maximum(smallest, 1)
+        return weights
+
+    def recency_costs(self, year: int):
+        """
+        Returns the reuse cost of every variation: the sum over its usages of
+        1 / (1 + years since the usage). Unused variations cost 0.
+
+        Params:
+        year: the current year
+        """
+
+        if np is None:
+            return [
+                sum(
+                    1 / (1 + max(0, year - used))
+                    for used in self.years[self._offsets[i] : self._offsets[i + 1]]
+                )
+                for i in range(len(self.variations))
+            ]
+        ages = np.maximum(0, year - self.years)
+        return np.bincount(
+            self._usage_vars, weights=1 / (1 + ages), minlength=len(self.variations)
+        )
+
+    def draw(self, rng=None, mask=None) -> tuple[dict, str] | tuple[None, None]:
+        """
+        Draws one variation by weight and returns it as an (assignment, variation
+        ID) tuple, or (None, None) if there is nothing to draw from.
+
+        Params:
+        rng: a NumPy Generator, or a random.Random without NumPy
+        mask: optional list of booleans, one per assignment, of the assignments
+        that can be drawn
+        """
+
+        rng = rng or default_rng()
+        weights = self.weights(rng)
+        if np is None:
+            if mask is not None:
+                weights = [w if mask[o] else 0 for w, o in zip(weights, self.owners)]
+            if not any(weights):
+                return (None, None)
+            return rng.choices(self.variations, weights=weights)[0]
+
+        if mask is not None:
+            weights = weights * np.asarray(mask, dtype=bool)[self.owners]
+        cumulative = np.cumsum(weights)
+        if not cumulative.size or cumulative[-1] <= 0:
+            return (None, None)
+        index = np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right")
+        return self.variations[int(index)]
+
+    def _weight(self, index: int, rng) -> int:
+        start, end = self._offsets[index], self._offsets[index + 1]
+        if start == end:
+            return 1
+        smallest = min(
+            base + rng.randint(0, WEIGHT_NOISE) for base in self.bases[start:end]
+        )
+        return max(smallest, 1)
+
+
+def _parse_usage(used_in: list, period_weights: dict) -> list:
+    """
+    Returns the year and period weight of each usage of a variation. Entries that
+    are not in the year/period format are skipped.
+    """
+
+    usages = []
+    for item in used_in:
+        try:
+            year, period = item.split("/")
+            usages.append((int(year), period_weights[period]))
+        except (ValueError, KeyError):
+            continue
+    return usages
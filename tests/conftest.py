@@ -0,0 +1,27 @@
+"""
+Mímir test fixtures
+
+Run from the repository root with python -m pytest.
+"""
+
+# pylint: disable=import-error
+import pytest
+
+from src import set_planner, set_solver, variation_pool
+
+
+@pytest.fixture(params=["numpy", "fallback"])
+def backend(request, monkeypatch):
+    """
+    Runs a test with NumPy and again with the plain Python fallback that is used
+    when NumPy is not installed.
+    """
+
+    if request.param == "numpy":
+        if variation_pool.np is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        for module in (variation_pool, set_solver, set_planner):
+            monkeypatch.setattr(module, "np", None)
+    return request.param
+
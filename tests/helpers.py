@@ -0,0 +1,29 @@
+"""
+Mímir test helpers
+
+Test data shared by several test files.
+"""
+
+# Assignment IDs are hashes, see _hash_assignment in src/data_handler.py
+A1 = "3fa85f6457174562"
+A2 = "b3fc2c963f66afa6"
+
+
+def candidate(a_id: str, positions: list, used_in=None, week=1, level=1, tags=None):
+    """
+    Returns a candidate with variations A and B. used_in gives the usage of each
+    variation by variation ID, unused if not given.
+    """
+
+    used_in = used_in or {}
+    return {
+        "assignment_id": a_id,
+        "exp_lecture": week,
+        "exp_assignment_no": positions,
+        "level": level,
+        "tags": tags or [],
+        "variations": [
+            {"variation_id": var_id, "used_in": used_in.get(var_id, [])}
+            for var_id in "AB"
+        ],
+    }
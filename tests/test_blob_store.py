@@ -0,0 +1,115 @@
+"""
+Tests for src/blob_store.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+import os
+import stat
+from hashlib import sha256
+
+import pytest
+from helpers import A1, A2
+
+from src.blob_store import BlobStore
+
+
+@pytest.fixture(params=[False, True], ids=["flat", "sharded"])
+def blobs(request, tmp_path) -> BlobStore:
+    return BlobStore(str(tmp_path / "assignment_data"), sharded=request.param)
+
+
+@pytest.fixture
+def source(tmp_path):
+    folder = tmp_path / "source"
+    folder.mkdir()
+
+    def make(name: str, content: bytes) -> str:
+        file_path = folder / name
+        file_path.write_bytes(content)
+        return str(file_path)
+
+    return make
+
+
+def read(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def blob_count(blobs: BlobStore) -> int:
+    return sum(
+        len(files)
+        for root, _, files in os.walk(blobs.blob_path)
+        if not root.startswith(blobs.manifest_path)
+    )
+
+
+def test_put_stores_file_by_hash(blobs, source):
+    digest = blobs.put(source("code.py", b"print(1)\n"))
+    assert digest == sha256(b"print(1)\n").hexdigest()
+    blob = os.path.join(blobs.blob_path, digest[:2], digest)
+    assert read(blob) == b"print(1)\n"
+    assert not os.stat(blob).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    # The same content is stored once
+    assert blobs.put(source("copy.py", b"print(1)\n")) == digest
+    assert blob_count(blobs) == 1
+
+
+def test_changed_blob_is_written_again(blobs, source):
+    digest = blobs.put(source("code.py", b"print(1)\n"))
+    blob = os.path.join(blobs.blob_path, digest[:2], digest)
+    os.chmod(blob, stat.S_IRUSR | stat.S_IWUSR)
+    with open(blob, "wb") as blob_file:
+        blob_file.write(b"corrupted")
+    assert blobs.put(source("code.py", b"print(1)\n")) == digest
+    assert read(blob) == b"print(1)\n"
+
+
+def test_place_replaces_file(blobs, source, tmp_path):
+    digest = blobs.put(source("code.py", b"print(1)\n"))
+    dest = str(tmp_path / "placed.py")
+    with open(dest, "wb") as dest_file:
+        dest_file.write(b"old")
+    blobs.place(digest, dest)
+    assert read(dest) == b"print(1)\n"
+    assert not os.path.exists(dest + ".tmp")
+
+
+def test_add_files_shares_identical_files(blobs, source):
+    code = source("code.py", b"print(1)\n")
+    data = source("data.txt", b"1 2 3\n")
+    assert blobs.add_files(A1, [code, data]) == ["code.py", "data.txt"]
+    assert blobs.add_files(A2, [code]) == ["code.py"]
+    assert blob_count(blobs) == 2
+    assert read(os.path.join(blobs.folder(A2), "code.py")) == b"print(1)\n"
+    assert blobs.read_manifest(A1)["data.txt"] == sha256(b"1 2 3\n").hexdigest()
+    assert sorted(blobs.manifest_ids()) == [A1, A2]
+
+
+def test_collect_removes_unused_blobs(blobs, source):
+    code = source("code.py", b"print(1)\n")
+    data = source("data.txt", b"1 2 3\n")
+    blobs.add_files(A1, [code, data])
+    blobs.add_files(A2, [code])
+
+    assert blobs.collect() == (0, 0)
+    # A file removed from the data folder no longer keeps its blob
+    os.remove(os.path.join(blobs.folder(A1), "data.txt"))
+    assert blobs.collect() == (1, len(b"1 2 3\n"))
+    assert blobs.read_manifest(A1) == {"code.py": sha256(b"print(1)\n").hexdigest()}
+
+    blobs.remove_assignment(A1)
+    blobs.remove_assignment(A2)
+    assert blobs.collect() == (1, len(b"print(1)\n"))
+    assert blob_count(blobs) == 0
+
+
+def test_adopt_moves_existing_files(blobs, source):
+    folder = blobs.folder(A1)
+    os.makedirs(folder)
+    with open(os.path.join(folder, "code.py"), "wb") as code_file:
+        code_file.write(b"print(1)\n")
+    assert blobs.adopt(A1) == 1
+    assert blobs.read_manifest(A1) == {"code.py": sha256(b"print(1)\n").hexdigest()}
+    assert blobs.adopt(A1) == 0
@@ -0,0 +1,198 @@
+"""
+Tests for src/course_store.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+import os
+
+import pytest
+from helpers import A1, A2
+
+from src import course_store
+from src.course_store import (
+    STALE_BODY_AGE,
+    JsonCourseStore,
+    LazyAssignment,
+    SqliteCourseStore,
+    copy_store,
+)
+
+
+def assignment(a_id: str, *instructions) -> dict:
+    return {
+        "assignment_id": a_id,
+        "title": "Assignment " + a_id,
+        "exp_lecture": 2,
+        "level": 3,
+        "variations": [
+            {
+                "variation_id": chr(ord("A") + position),
+                "instructions": text,
+                "example_runs": [{"inputs": [str(position)], "outputs": [text]}],
+                "used_in": [],
+            }
+            for position, text in enumerate(instructions)
+        ],
+    }
+
+
+@pytest.fixture(params=["json", "sharded", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        _store = SqliteCourseStore(str(tmp_path))
+    else:
+        os.makedirs(tmp_path / "metadata")
+        _store = JsonCourseStore(str(tmp_path), sharded=request.param == "sharded")
+    yield _store
+    _store.close()
+
+
+@pytest.fixture
+def json_store(tmp_path) -> JsonCourseStore:
+    os.makedirs(tmp_path / "metadata")
+    return JsonCourseStore(str(tmp_path))
+
+
+def bodies(json_store: JsonCourseStore, a_id: str) -> list:
+    return sorted(os.listdir(json_store.body_folder(a_id)))
+
+
+def test_assignment_round_trip(store):
+    saved = assignment(A1, "first", "second")
+    store.write_assignment(saved)
+    assert store.read_assignment(A1) == saved
+    assert store.assignment_ids() == [A1]
+    assert list(store.iter_assignments()) == [saved]
+
+
+def test_header_leaves_out_bodies(store):
+    store.write_assignment(assignment(A1, "first", "second"))
+    header = store.read_header(A1)
+    assert [var["variation_id"] for var in header["variations"]] == ["A", "B"]
+    for var in header["variations"]:
+        assert "instructions" not in var
+        assert "example_runs" not in var
+    assert store.read_variation_body(A1, 1) == {
+        "instructions": "second",
+        "example_runs": [{"inputs": ["1"], "outputs": ["second"]}],
+    }
+
+
+def test_lazy_assignment_reads_bodies_on_access(store):
+    saved = assignment(A1, "first", "second")
+    store.write_assignment(saved)
+    lazy = LazyAssignment(store, store.read_header(A1))
+    assert lazy["title"] == "Assignment " + A1
+    assert lazy["variations"][1]["instructions"] == "second"
+    assert lazy.to_dict() == saved
+
+
+def test_rewrite_drops_removed_variations(store):
+    store.write_assignment(assignment(A1, "first", "second", "third"))
+    store.write_assignment(assignment(A1, "only"))
+    assert store.read_assignment(A1) == assignment(A1, "only")
+
+
+def test_delete_assignment(store):
+    store.write_assignment(assignment(A1, "first"))
+    store.write_assignment(assignment(A2, "second"))
+    store.delete_assignment(A1)
+    assert store.assignment_ids() == [A2]
+    with pytest.raises(FileNotFoundError):
+        store.read_assignment(A1)
+
+
+def test_version_changes_on_write(store):
+    store.write_assignment(assignment(A1, "first"))
+    before = store.version(A1)
+    store.write_assignment(assignment(A1, "changed"))
+    assert store.version(A1) != before
+
+
+def test_weeks_round_trip(store):
+    assert store.read_weeks() is None
+    weeks = {"lectures": [{"lecture_no": 1, "topics": ["loops"]}]}
+    store.write_weeks(weeks)
+    assert store.read_weeks() == weeks
+
+
+def test_sets(store):
+    first = store.add_set({"name": "first", "year": 2024, "period": 1, "type": 0})
+    second = store.add_set({"name": "second", "year": 2024, "period": 2, "type": 0})
+    assert (first, second) == (1, 2)
+    store.delete_set(first)
+    assert [header["name"] for header in store.set_headers()] == ["second"]
+    # IDs of deleted sets are not given again
+    assert store.add_set({"name": "third"}) == 3
+    assert store.read_set(3)["name"] == "third"
+    assert store.read_set(first) is None
+
+
+def test_copy_store(tmp_path):
+    os.makedirs(tmp_path / "json" / "metadata")
+    source = JsonCourseStore(str(tmp_path / "json"))
+    source.write_assignment(assignment(A1, "first", "second"))
+    source.write_weeks({"lectures": [{"lecture_no": 1}]})
+    source.add_set({"name": "first"})
+    os.makedirs(tmp_path / "sqlite")
+    target = SqliteCourseStore(str(tmp_path / "sqlite"))
+    try:
+        assert copy_store(source, target) == 1
+        assert target.read_assignment(A1) == source.read_assignment(A1)
+        assert target.read_weeks() == source.read_weeks()
+        assert target.read_set(1)["name"] == "first"
+    finally:
+        target.close()
+
+
+def test_old_bodies_are_removed(json_store):
+    json_store.write_assignment(assignment(A1, "first", "second"))
+    assert len(bodies(json_store, A1)) == 2
+    json_store.write_assignment(assignment(A1, "changed"))
+    assert len(bodies(json_store, A1)) == 1
+
+
+def test_bodies_without_version_are_read_and_replaced(json_store):
+    json_store.write_assignment(assignment(A1, "first"))
+    # As saved before the bodies had versions
+    (name,) = bodies(json_store, A1)
+    folder = json_store.body_folder(A1)
+    os.replace(os.path.join(folder, name), os.path.join(folder, "0.json"))
+    header_path = json_store.assignment_path(A1)
+    header = json_store._read_file(header_path)  # pylint: disable=protected-access
+    del header[course_store.BODY_VERSION_KEY]
+    course_store.write_json_atomic(header_path, header, False)
+
+    assert json_store.read_assignment(A1) == assignment(A1, "first")
+    assert json_store.read_variation_body(A1, 0)["instructions"] == "first"
+    json_store.write_assignment(assignment(A1, "changed"))
+    assert "0.json" not in bodies(json_store, A1)
+    assert json_store.read_assignment(A1) == assignment(A1, "changed")
+
+
+def test_crash_before_header_keeps_old_assignment(json_store, monkeypatch):
+    json_store.write_assignment(assignment(A1, "first"))
+    header_path = json_store.assignment_path(A1)
+    write = course_store.write_json_atomic
+
+    def crash_on_header(file_path, data, compact):
+        if file_path == header_path:
+            raise OSError("crashed")
+        write(file_path, data, compact)
+
+    monkeypatch.setattr(course_store, "write_json_atomic", crash_on_header)
+    with pytest.raises(OSError):
+        json_store.write_assignment(assignment(A1, "changed"))
+    monkeypatch.undo()
+
+    assert json_store.read_assignment(A1) == assignment(A1, "first")
+    assert len(bodies(json_store, A1)) == 2
+    # The bodies of the crashed save are removed once they are old enough
+    for name in bodies(json_store, A1):
+        body_path = os.path.join(json_store.body_folder(A1), name)
+        old = os.stat(body_path).st_mtime - STALE_BODY_AGE - 1
+        os.utime(body_path, (old, old))
+    json_store.write_assignment(assignment(A1, "again"))
+    assert len(bodies(json_store, A1)) == 1
+    assert json_store.read_assignment(A1) == assignment(A1, "again")
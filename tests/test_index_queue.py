@@ -0,0 +1,154 @@
+"""
+Tests for src/index_queue.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+from threading import Event
+
+import pytest
+from whoosh.fields import ID, TEXT, Schema
+from whoosh.index import LockError, create_in
+
+from src import index_queue
+from src.const_class import IX
+from src.index_queue import IndexQueue
+
+SCHEMA = Schema(a_id=ID(stored=True, unique=True), title=TEXT(stored=True))
+
+
+@pytest.fixture
+def ix(tmp_path):
+    holder = IX()
+    holder.set(create_in(str(tmp_path), SCHEMA))
+    yield holder
+    holder.close()
+
+
+@pytest.fixture
+def queue(ix):
+    _queue = IndexQueue(ix, delay=0.05, optimize_delay=60.0)
+    yield _queue
+    _queue.stop()
+
+
+def titles(ix) -> dict:
+    with ix.searcher() as searcher:
+        return {
+            fields["a_id"]: fields["title"] for fields in searcher.all_stored_fields()
+        }
+
+
+def document(a_id: str, title: str) -> dict:
+    return {"a_id": a_id, "title": title}
+
+
+class Callback:
+    """
+    Records the errors it is called with. flush() may return before the
+    callbacks have been called, so wait() is used to wait for them.
+    """
+
+    def __init__(self, ix=None):
+        self.errors = []
+        self.titles = None
+        self._ix = ix
+        self._called = Event()
+
+    def __call__(self, error):
+        self.errors.append(error)
+        if self._ix is not None:
+            self.titles = titles(self._ix)
+        self._called.set()
+
+    def wait(self) -> list:
+        assert self._called.wait(5)
+        return self.errors
+
+
+def test_flush_writes_queued_changes(ix, queue):
+    queue.update("a", document("a", "first"))
+    queue.update_many({"b": document("b", "second"), "c": document("c", "third")})
+    queue.flush()
+    assert not queue.is_pending("a")
+    assert titles(ix) == {"a": "first", "b": "second", "c": "third"}
+
+    queue.delete("b")
+    queue.flush()
+    assert titles(ix) == {"a": "first", "c": "third"}
+
+
+def test_changes_are_coalesced(ix, queue, monkeypatch):
+    batches = []
+    write = queue._write  # pylint: disable=protected-access
+
+    def record(batch):
+        batches.append(dict(batch))
+        write(batch)
+
+    monkeypatch.setattr(queue, "_write", record)
+    queue.update("a", document("a", "first"))
+    queue.update("a", document("a", "second"))
+    queue.update("b", document("b", "other"))
+    queue.delete("b")
+    queue.flush()
+    assert batches == [{"a": document("a", "second"), "b": None}]
+    assert titles(ix) == {"a": "second"}
+
+
+def test_callbacks_are_called_after_commit(ix, queue):
+    callback = Callback(ix)
+    queue.update("a", document("a", "first"), callback=callback)
+    assert callback.wait() == [None]
+    assert callback.titles == {"a": "first"}
+
+
+def test_failed_changes_are_written_with_next_change(ix, queue, monkeypatch):
+    write = queue._write  # pylint: disable=protected-access
+
+    def fail(batch):
+        raise OSError("disk full")
+
+    callback = Callback()
+    monkeypatch.setattr(queue, "_write", fail)
+    queue.update("a", document("a", "first"), callback=callback)
+    queue.flush()
+    (error,) = callback.wait()
+    assert isinstance(error, OSError)
+    assert queue.failed() == ["a"]
+    assert queue.is_pending("a")
+
+    monkeypatch.setattr(queue, "_write", write)
+    queue.update("b", document("b", "second"))
+    queue.flush()
+    assert queue.failed() == []
+    assert titles(ix) == {"a": "first", "b": "second"}
+
+
+def test_locked_index_fails_after_retries(ix, queue, monkeypatch):
+    monkeypatch.setattr(index_queue, "LOCK_TIMEOUT", 0.01)
+    callback = Callback()
+    writer = ix.get().writer()
+    try:
+        queue.update("a", document("a", "first"), callback=callback)
+        queue.flush()
+    finally:
+        writer.cancel()
+    (error,) = callback.wait()
+    assert isinstance(error, LockError)
+    assert queue.failed() == ["a"]
+
+    queue.update("b", document("b", "second"))
+    queue.flush()
+    assert titles(ix) == {"a": "first", "b": "second"}
+
+
+def test_discard_failed(ix, queue, monkeypatch):
+    def fail(batch):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(queue, "_write", fail)
+    queue.update("a", document("a", "first"))
+    queue.flush()
+    queue.discard_failed()
+    assert not queue.is_pending("a")
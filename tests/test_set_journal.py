@@ -0,0 +1,97 @@
+"""
+Tests for src/set_journal.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+import os
+
+import pytest
+
+from src import set_journal
+from src.set_journal import SetJournal
+
+
+@pytest.fixture
+def snapshot_path(tmp_path) -> str:
+    return str(tmp_path / "assignment_sets.json")
+
+
+def new_set(name: str) -> dict:
+    return {"name": name, "year": 2024, "period": 1, "type": 0, "weeks": []}
+
+
+def journal_lines(journal: SetJournal) -> int:
+    with open(journal.journal_path, "rb") as journal_file:
+        return len(journal_file.read().splitlines())
+
+
+def test_changes_are_appended_to_journal(snapshot_path):
+    journal = SetJournal(snapshot_path)
+    assert journal.read() is None
+    first = journal.add(new_set("first"), compact=False)
+    journal.add(new_set("second"), compact=False)
+    journal.delete(first, compact=False)
+    assert not os.path.exists(snapshot_path)
+    assert journal_lines(journal) == 3
+    assert [header["name"] for header in journal.headers()] == ["second"]
+
+
+def test_replay_from_files(snapshot_path):
+    journal = SetJournal(snapshot_path)
+    journal.write({"maxSetID": 0, "sets": [dict(new_set("first"), id=1)]}, False)
+    journal.add(new_set("second"), compact=False)
+    changed = dict(new_set("changed"), id=1)
+    journal.put(changed, compact=False)
+
+    replayed = SetJournal(snapshot_path)
+    assert replayed.get(1) == changed
+    assert replayed.read() == journal.read()
+    assert replayed.read()["maxSetID"] == 2
+
+
+def test_replay_skips_incomplete_line(snapshot_path):
+    journal = SetJournal(snapshot_path)
+    journal.add(new_set("first"), compact=False)
+    with open(journal.journal_path, "ab") as journal_file:
+        journal_file.write(b'{"op": "put", "set": {"id": 2, "na')
+
+    replayed = SetJournal(snapshot_path)
+    assert [header["id"] for header in replayed.headers()] == [1]
+    # The next change starts a line of its own
+    assert replayed.add(new_set("second"), compact=False) == 2
+    assert [header["id"] for header in SetJournal(snapshot_path).headers()] == [1, 2]
+
+
+def test_sees_changes_of_other_instances(snapshot_path):
+    journal = SetJournal(snapshot_path)
+    other = SetJournal(snapshot_path)
+    journal.add(new_set("first"), compact=False)
+    assert other.add(new_set("second"), compact=False) == 2
+    assert [header["name"] for header in journal.headers()] == ["first", "second"]
+
+
+def test_compaction(snapshot_path, monkeypatch):
+    monkeypatch.setattr(set_journal, "COMPACT_AFTER", 4)
+    journal = SetJournal(snapshot_path)
+    for i in range(3):
+        journal.add(new_set(str(i)), compact=False)
+    assert journal_lines(journal) == 3
+    expected = journal.read()
+
+    journal.add(new_set("3"), compact=False)
+    assert not os.path.exists(journal.journal_path)
+    expected["sets"].append(journal.get(4))
+    expected["maxSetID"] = 4
+    assert journal.read() == expected
+    assert SetJournal(snapshot_path).read() == expected
+
+
+def test_compact_keeps_deleted_ids_taken(snapshot_path):
+    journal = SetJournal(snapshot_path)
+    journal.add(new_set("first"), compact=False)
+    last = journal.add(new_set("second"), compact=False)
+    journal.delete(last, compact=False)
+    journal.compact(compact=True)
+    assert not os.path.exists(journal.journal_path)
+    assert SetJournal(snapshot_path).add(new_set("third"), compact=False) == 3
@@ -0,0 +1,85 @@
+"""
+Tests for src/set_planner.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+import pytest
+from helpers import candidate
+
+from src.set_planner import (
+    CandidateSnapshot,
+    GeneratorContext,
+    plan_full_set,
+    rank_plans,
+    score_plan,
+)
+from src.variation_pool import period_weight_table
+
+WEEKS = 4
+POSITIONS = 3
+
+
+@pytest.fixture
+def snapshot() -> CandidateSnapshot:
+    by_week = {}
+    for week in range(1, WEEKS + 1):
+        by_week[week] = [
+            candidate(
+                "w%d-%d" % (week, i),
+                [i % POSITIONS + 1, (i + 1) % POSITIONS + 1],
+                {"A": ["20%d/%d" % (15 + i, i % 3 + 1)]} if i % 2 else {},
+                week=week,
+                level=i % 3 + 1,
+                tags=["tag%d" % (i % 4)],
+            )
+            for i in range(6)
+        ]
+    # An expanding assignment in week 1 with its following part in week 2
+    expanding = [
+        candidate("exp1", [1, 2], week=1, level=2),
+        candidate("exp2", [2, 3], week=2, level=3),
+    ]
+    return CandidateSnapshot(
+        [{"lecture_no": w, "assignment_count": POSITIONS} for w in range(1, WEEKS + 1)],
+        by_week,
+        expanding,
+        {"exp1": ["exp2"]},
+        period_weight_table(["1", "2", "3"]),
+        2024,
+    )
+
+
+def ids(plan: list) -> list:
+    return [[(item["assignment_id"], var_id) for item, var_id in week] for week in plan]
+
+
+@pytest.mark.parametrize("solve", [False, True])
+def test_plan_is_replayed_from_seed(backend, snapshot, solve):
+    plans = [
+        ids(plan_full_set(snapshot, GeneratorContext(seed), solve))
+        for seed in (1, 2, 1)
+    ]
+    assert plans[0] == plans[2]
+    assert len(plans[0]) == WEEKS
+    for week, week_plan in enumerate(plans[0], 1):
+        assert len(week_plan) == POSITIONS
+        for a_id, _ in week_plan:
+            assert a_id.startswith("w%d-" % week) or a_id.startswith("exp")
+
+
+@pytest.mark.parametrize("solve", [False, True])
+def test_ranked_plans_are_replayed_from_their_seeds(backend, snapshot, solve):
+    ranked = rank_plans(snapshot, 8, 3, seed=7, procs=1, solve=solve)
+    assert len(ranked) == 3
+    totals = [score["total"] for score, _, _ in ranked]
+    assert totals == sorted(totals, reverse=True)
+    for score, seed, plan in ranked:
+        replayed = plan_full_set(snapshot, GeneratorContext(seed), solve)
+        assert ids(replayed) == ids(plan)
+        assert score_plan(snapshot, replayed) == score
+
+    again = rank_plans(snapshot, 8, 3, seed=7, procs=1, solve=solve)
+    assert [(seed, ids(plan)) for _, seed, plan in again] == [
+        (seed, ids(plan)) for _, seed, plan in ranked
+    ]
@@ -0,0 +1,68 @@
+"""
+Tests for src/set_solver.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+from helpers import candidate
+
+from src.set_planner import GeneratorContext
+from src.set_solver import solve_positions
+from src.variation_pool import period_weight_table
+
+PERIOD_WEIGHTS = period_weight_table(["1", "2", "3"])
+YEAR = 2024
+# Variation B is the least reused of both
+USED = {"A": ["2024/1", "2023/1"], "B": ["2024/2"]}
+OLD_B = {"B": ["2015/1"]}
+
+
+def ids(selected: list) -> list:
+    return [(item["assignment_id"], var_id) for item, var_id in selected]
+
+
+def solve(candidates, positions, reserved=None, seed=1):
+    return solve_positions(
+        candidates,
+        positions,
+        reserved or {},
+        PERIOD_WEIGHTS,
+        YEAR,
+        GeneratorContext(seed).pool_rng,
+    )
+
+
+def test_contended_position(backend):
+    # Filling position 1 first with the unused candidate would leave 2 empty
+    unused = candidate("unused", [1, 2], OLD_B)
+    used = candidate("used", [1], USED)
+    assert ids(solve([unused, used], 2)) == [("used", "B"), ("unused", "A")]
+
+
+def test_least_reused_variation(backend):
+    item = candidate("1", [1], {"A": ["2024/1"], "B": ["2015/1"]})
+    other = candidate("2", [1], USED)
+    assert ids(solve([other, item], 1)) == [("1", "B")]
+
+
+def test_reserved_positions(backend):
+    reserved = {
+        "1": (candidate("r1", [1]), "A"),
+        "5": (candidate("r5", [5]), "B"),
+    }
+    candidates = [candidate("a", [1, 2], OLD_B), candidate("b", [3], USED)]
+    assert ids(solve(candidates, 3, reserved)) == [
+        ("r1", "A"),
+        ("a", "A"),
+        ("b", "B"),
+        ("r5", "B"),
+    ]
+
+
+def test_unfillable_position_is_left_out(backend):
+    assert ids(solve([candidate("a", [2], OLD_B)], 3)) == [("a", "A")]
+
+
+def test_replayed_from_seed(backend):
+    candidates = [candidate(str(i), [i % 3 + 1, 3]) for i in range(12)]
+    assert ids(solve(candidates, 3, seed=5)) == ids(solve(candidates, 3, seed=5))
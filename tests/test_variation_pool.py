@@ -0,0 +1,57 @@
+"""
+Tests for src/variation_pool.py
+"""
+
+# pylint: disable=import-error, missing-function-docstring
+# pylint: disable=redefined-outer-name, unused-argument
+from helpers import candidate
+
+from src.set_planner import GeneratorContext
+from src.variation_pool import VariationPool, period_weight_table
+
+PERIOD_WEIGHTS = period_weight_table(["1", "2", "3"])
+
+
+def test_draw_only_from_masked(backend):
+    items = [candidate(str(i), [1], {"A": ["2020/1"]}) for i in range(4)]
+    pool = VariationPool(items, PERIOD_WEIGHTS)
+    rng = GeneratorContext(3).pool_rng
+    mask = [False, True, False, True]
+    drawn = {pool.draw(rng, mask=mask)[0]["assignment_id"] for _ in range(50)}
+    assert drawn == {"1", "3"}
+
+
+def test_draw_with_empty_mask(backend):
+    pool = VariationPool([candidate("1", [1]), candidate("2", [1])], PERIOD_WEIGHTS)
+    rng = GeneratorContext(3).pool_rng
+    assert pool.draw(rng, mask=[False, False]) == (None, None)
+    assert VariationPool([], PERIOD_WEIGHTS).draw(rng) == (None, None)
+
+
+def test_draw_is_replayed_from_seed(backend):
+    items = [
+        candidate(str(i), [1], {"A": ["2020/%d" % (i % 3 + 1)] * i}) for i in range(10)
+    ]
+    pool = VariationPool(items, PERIOD_WEIGHTS)
+    mask = [i % 2 == 0 for i in range(10)]
+
+    def draws(seed):
+        rng = GeneratorContext(seed).pool_rng
+        return [
+            (item["assignment_id"], var_id)
+            for item, var_id in (pool.draw(rng, mask=mask) for _ in range(20))
+        ]
+
+    assert draws(11) == draws(11)
+
+
+def test_weights_and_costs(backend):
+    items = [candidate("1", [1], {"A": ["2024/1", "2020/3"]})]
+    pool = VariationPool(items, PERIOD_WEIGHTS)
+    weights = list(pool.weights(GeneratorContext(1).pool_rng))
+    # Used twice in periods of weight 3 and 1, noise is at most WEIGHT_NOISE
+    assert 1 <= weights[0] <= 1 - 2 + 5
+    assert weights[1] == 1
+    costs = list(pool.recency_costs(2024))
+    assert costs[0] == 1 + 1 / 5
+    assert costs[1] == 0